@@ -1,19 +1,32 @@
 from flask import Blueprint, request, jsonify
 from services.agent_service import MultiAgentSystem
+from services.job_service import JobService, JobQueueFullError
+from services.task_scheduler import TaskScheduler
+from utils.deadline import Deadline
+from utils.request_params import parse_flag
+from config import Config
 
 agent_bp = Blueprint('agent', __name__)
 # 声明为全局变量，但延迟初始化
 agent_system = None
+job_service = None
+task_scheduler = None
 
 def init_agent_system(ws_handler=None):
     """初始化Agent系统，设置WebSocket处理器"""
-    global agent_system
+    global agent_system, job_service, task_scheduler
     if agent_system is None:
         print("初始化Agent系统...")
         agent_system = MultiAgentSystem(ws_handler)
+        job_service = JobService(agent_system, ws_handler)
+        if Config.TASK_SCHEDULER_ENABLED:
+            task_scheduler = TaskScheduler(agent_system, ws_handler)
     elif ws_handler is not None:
         print("更新Agent系统的WebSocket处理器...")
         agent_system.ws_handler = ws_handler
+        job_service.ws_handler = ws_handler
+        if task_scheduler:
+            task_scheduler.ws_handler = ws_handler
     return agent_system
 
 @agent_bp.route('/analyze', methods=['POST'])
@@ -23,24 +36,53 @@ def analyze_request():
         print("收到前端analyze请求...")
         data = request.get_json()
         message = data.get('message')
+        session_id = data.get('session_id')
         
         if not message:
             return jsonify({'error': '消息不能为空'}), 400
+        # 客户端可以用 timeout（秒）指定整个分析的时间预算
+        deadline = Deadline.from_request(data.get('timeout'), Config.ANALYZE_TIMEOUT)
         
         # 确保agent_system已初始化
         global agent_system
         if agent_system is None:
             init_agent_system()
             
+        # 异步模式：立即返回任务ID，通过 /jobs/<job_id> 查询结果
+        if parse_flag(data.get('async', False), 'async'):
+            job = job_service.submit(message, session_id=session_id, deadline=deadline)
+            print(f"已提交分析任务: {job['job_id']}")
+            return jsonify({'success': True, 'job_id': job['job_id'], 'status': job['status']}), 202
+            
         print(f"处理用户输入: {message[:50]}...")
-        result = agent_system.process_input(message)
+        result = agent_system.process_input(message, session_id=session_id, deadline=deadline)
         print(f"处理结果: {result.get('success')}, 数据包含键: {list(result.keys())}")
         return jsonify(result), 200
         
+    except JobQueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+        
     except Exception as e:
         print(f"处理请求出错: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@agent_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """获取分析任务的状态和部分结果"""
+    try:
+        if job_service is None:
+            init_agent_system()
+            
+        job = job_service.get_job(job_id)
+        if not job:
+            return jsonify({'error': '任务不存在或已过期'}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @agent_bp.route('/tasks', methods=['POST'])
 def create_task():
     """创建新任务"""
@@ -60,6 +102,8 @@ def create_task():
         )
         return jsonify(task), 201
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -158,6 +202,8 @@ def get_task_dependencies(task_id):
     """获取任务的依赖任务"""
     try:
         dependencies = agent_system.get_task_dependencies(task_id)
+        if dependencies is None:
+            return jsonify({'error': '任务不存在'}), 404
         return jsonify({'dependencies': dependencies}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -167,10 +213,38 @@ def get_dependent_tasks(task_id):
     """获取依赖该任务的其他任务"""
     try:
         dependents = agent_system.get_dependent_tasks(task_id)
+        if dependents is None:
+            return jsonify({'error': '任务不存在'}), 404
         return jsonify({'dependents': dependents}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@agent_bp.route('/tasks/<task_id>/dependencies', methods=['POST'])
+def add_task_dependency(task_id):
+    """为任务添加依赖"""
+    try:
+        data = request.get_json()
+        dependency_id = data.get('dependency_id') if data else None
+        if not dependency_id:
+            return jsonify({'error': '依赖任务不能为空'}), 400
+            
+        if not agent_system.add_task_dependency(task_id, dependency_id):
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify({'message': '依赖已添加'}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@agent_bp.route('/tasks/ready', methods=['GET'])
+def get_ready_tasks():
+    """获取依赖已全部完成、可以开始执行的任务"""
+    try:
+        tasks = agent_system.get_ready_tasks()
+        return jsonify({'tasks': tasks}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @agent_bp.route('/agents', methods=['GET'])
 def list_agents():
     """获取所有 Agent 列表"""
@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify
 from services.chat_service import ChatService
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.request_params import parse_flag
+from config import Config
 
 chat_bp = Blueprint('chat', __name__)
 chat_service = ChatService()
@@ -17,10 +20,19 @@ def create_session():
 
 @chat_bp.route('/sessions', methods=['GET'])
 def list_sessions():
-    """获取所有会话列表"""
+    """获取会话列表，支持 ?archived=true|false&limit=&cursor= 筛选和分页"""
     try:
-        sessions = chat_service.list_sessions()
-        return jsonify({'sessions': sessions}), 200
+        archived = request.args.get('archived')
+        if archived is not None:
+            archived = parse_flag(archived, 'archived')
+        page = chat_service.list_sessions_page(
+            archived=archived,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        )
+        return jsonify(page), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -28,7 +40,8 @@ def list_sessions():
 def get_session(session_id):
     """获取指定会话详情"""
     try:
-        session = chat_service.get_session(session_id)
+        limit = request.args.get('limit', type=int)
+        session = chat_service.get_session(session_id, message_limit=limit)
         if not session:
             return jsonify({'error': '会话不存在'}), 404
         return jsonify(session), 200
@@ -42,26 +55,46 @@ def send_message(session_id):
         data = request.get_json()
         message = data.get('message')
         context = data.get('context')
+        delta = parse_flag(data.get('delta', False), 'delta')
         
         if not message:
             return jsonify({'error': '消息不能为空'}), 400
+        # 客户端可以用 timeout（秒）指定本次请求的时间预算
+        deadline = Deadline.from_request(data.get('timeout'), Config.CHAT_TIMEOUT)
             
         response = chat_service.process_message(
             session_id=session_id,
             message=message,
-            context=context
+            context=context,
+            delta=delta,
+            deadline=deadline
         )
         return jsonify(response), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @chat_bp.route('/sessions/<session_id>/messages', methods=['GET'])
 def get_session_history(session_id):
-    """获取指定会话的历史记录"""
+    """获取指定会话的历史记录，支持 ?before=<message_id>&limit= 游标分页"""
     try:
-        history = chat_service.get_session_history(session_id)
-        return jsonify({'history': history}), 200
+        before = request.args.get('before')
+        limit = request.args.get('limit', type=int)
+        page = chat_service.get_history_page(session_id, before=before, limit=limit)
+        if page is None:
+            return jsonify({'history': []}), 200
+        return jsonify({
+            'history': page['messages'],
+            'has_more': page['has_more'],
+            'next_before': page['next_before'],
+            'version': page['version']
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,5 +1,9 @@
+from utils.async_mode import setup_async_mode
+# 必须在导入其他模块之前打猴子补丁，阻塞的网络请求和等待才会让出协程
+async_mode = setup_async_mode()
+
 from flask import Flask, request, jsonify
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
 import os
 import traceback
@@ -7,6 +11,13 @@ import logging
 from datetime import datetime
 
 from services.agent_service import MultiAgentSystem
+from services.job_service import JobService, JobQueueFullError
+from services.task_scheduler import TaskScheduler
+from config import Config
+from utils.baidu_client import get_baidu_client
+from utils.deadline import Deadline
+from utils.model_router import ModelRoute, get_model_router
+from utils.request_params import parse_flag
 from utils.ws_handler import WebSocketHandler
 
 # 初始化Flask应用
@@ -20,10 +31,13 @@ CORS(app, resources={r"/*": {"origins": cors_allowed_origins}}, supports_credent
 # 设置Socket.IO
 socketio = SocketIO(
     app, 
+    async_mode=async_mode,
     cors_allowed_origins=cors_allowed_origins,
     logger=True, 
     engineio_logger=True,
-    cors_credentials=True
+    cors_credentials=True,
+    # 多个工作进程通过消息队列互相转发事件，房间内的客户端连接在哪个进程都能收到
+    message_queue=Config.SOCKETIO_MESSAGE_QUEUE or None
 )
 
 # 初始化WebSocket处理器
@@ -33,6 +47,12 @@ ws_handler.set_socketio(socketio)
 # 创建多Agent系统
 agent_system = MultiAgentSystem(ws_handler)
 
+# 后台分析任务服务
+job_service = JobService(agent_system, ws_handler)
+
+# 按优先级自动执行依赖已完成的任务
+task_scheduler = TaskScheduler(agent_system, ws_handler) if Config.TASK_SCHEDULER_ENABLED else None
+
 # 配置日志
 logging.basicConfig(
     level=os.environ.get("LOG_LEVEL", "INFO"),
@@ -52,28 +72,109 @@ def health_check():
         logger.error(f"健康检查失败: {str(e)}")
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
+@app.route("/api/llm/stats")
+def llm_stats():
+    return jsonify(get_baidu_client().get_stats())
+
+@app.route("/api/llm/routes", methods=["GET"])
+def get_llm_routes():
+    router = get_model_router()
+    return jsonify({"success": True, "default_model": router.default_model, "routes": router.get_routes()})
+
+@app.route("/api/llm/routes/<name>", methods=["PUT"])
+def set_llm_route(name):
+    # 运行时修改流水线阶段或操作使用的模型和采样参数，对之后的调用立即生效
+    # 配置了 STATE_BACKEND_URL 时修改对所有工作进程生效，否则只对处理请求的进程生效
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "请求体必须是 JSON 对象"}), 400
+    try:
+        route = ModelRoute.from_dict(data)
+        get_model_router().set_route(name, route)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "name": name, "route": route.to_dict()})
+
+@app.route("/api/llm/routes/<name>", methods=["DELETE"])
+def delete_llm_route(name):
+    if not get_model_router().remove_route(name):
+        return jsonify({"success": False, "error": "路由不存在"}), 404
+    return jsonify({"success": True})
+
 @app.route("/api/agent/analyze", methods=["POST"])
 def analyze():
     try:
         data = request.get_json()
         user_input = data.get("input", "")
+        # Agent消息只推送给该会话的客户端，未提供时广播
+        session_id = data.get("session_id")
         
         if not user_input:
             return jsonify({"success": False, "error": "请提供用户输入"}), 400
+        # 客户端可以用 timeout（秒）指定整个分析的时间预算，异步任务从提交时开始计时
+        deadline = Deadline.from_request(data.get("timeout"), Config.ANALYZE_TIMEOUT)
+            
+        # 异步模式：立即返回任务ID，通过 /api/agent/jobs/<job_id> 查询结果
+        if parse_flag(data.get("async", False), "async"):
+            job = job_service.submit(user_input, session_id=session_id, deadline=deadline)
+            return jsonify({"success": True, "job_id": job["job_id"], "status": job["status"]}), 202
             
         # 处理用户输入，获取多个Agent的协同分析结果
-        result = agent_system.process_input(user_input)
+        result = agent_system.process_input(user_input, session_id=session_id, deadline=deadline)
         return jsonify(result)
     
+    except JobQueueFullError as e:
+        return jsonify({"success": False, "error": str(e)}), 429
+    
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
     except Exception as e:
         logger.error(f"处理分析请求时出错: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({"success": False, "error": f"处理请求失败: {str(e)}"}), 500
 
+@app.route("/api/agent/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_service.get_job(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "任务不存在或已过期"}), 404
+    return jsonify({"success": True, "job": job})
+
 @socketio.on("connect")
 def handle_connect():
     logger.info("客户端已连接")
-    socketio.emit("connection_status", {"status": "connected"})
+    # 连接时可以通过 ?sessionId= 直接加入会话房间
+    session_id = request.args.get("sessionId")
+    if session_id:
+        join_room(session_id)
+    # 只回复当前客户端，不再广播给所有连接
+    emit("connection_status", {"status": "connected"})
+
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    """加入会话或分析任务的房间，之后只接收该房间的消息"""
+    rooms = _rooms_from(data)
+    for room in rooms:
+        join_room(room)
+    emit("subscribed", {"rooms": rooms})
+
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    rooms = _rooms_from(data)
+    for room in rooms:
+        leave_room(room)
+    emit("unsubscribed", {"rooms": rooms})
+
+def _rooms_from(data) -> list:
+    """会话房间名为会话ID，分析任务房间名为 job:<job_id>"""
+    data = data or {}
+    rooms = []
+    if data.get("sessionId"):
+        rooms.append(data["sessionId"])
+    if data.get("jobId"):
+        rooms.append(f"job:{data['jobId']}")
+    return rooms
 
 @socketio.on("disconnect")
 def handle_disconnect():
@@ -83,10 +184,13 @@ def handle_disconnect():
 def handle_message(data):
     logger.info(f"收到用户消息: {data}")
     # 此处只接收消息，实际处理通过/api/agent/analyze接口完成
-    socketio.emit("message_received", {"status": "received"})
+    emit("message_received", {"status": "received"})
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("DEBUG", "False").lower() == "true"
-    logger.info(f"启动应用，端口: {port}, 调试模式: {debug}")
-    socketio.run(app, host="0.0.0.0", port=port, debug=debug) 
\ No newline at end of file
+    logger.info(f"启动应用，端口: {port}, 调试模式: {debug}, 异步模式: {async_mode}")
+    # 预热百度 API 连接池
+    get_baidu_client().warm_up()
+    # threading 模式使用 Werkzeug 开发服务器，只适合本地开发
+    socketio.run(app, host="0.0.0.0", port=port, debug=debug, allow_unsafe_werkzeug=async_mode == "threading") 
\ No newline at end of file
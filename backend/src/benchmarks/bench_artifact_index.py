@@ -0,0 +1,39 @@
+"""测量制品数量增长时保存和查询代码制品的延迟
+
+用法（在 src 目录下）: python -m benchmarks.bench_artifact_index [制品数] [文件数]
+"""
+import random
+import sys
+import time
+from config import Config
+from services.agent_service import MultiAgentSystem
+
+def measure(func, rounds: int = 200) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    file_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    Config.PERSISTENCE_ENABLED = False
+    system = MultiAgentSystem()
+    paths = [f"src/module_{i}.py" for i in range(file_count)]
+    checkpoints = {total // 100, total // 10, total}
+
+    print(f"{'制品数':>10} {'保存(us)':>10} {'最新版本(us)':>14} {'指定版本(us)':>14}")
+    for count in range(1, total + 1):
+        system.save_code_artifact(random.choice(paths), "print('hello')", "python", "Alex")
+        if count not in checkpoints:
+            continue
+        path = random.choice(paths)
+        versions = [a["version"] for a in system.get_artifact_history(path)]
+        save_us = measure(lambda: system.save_code_artifact(path, "print('hello')", "python", "Alex"))
+        latest_us = measure(lambda: system.get_artifact_version(path))
+        version_us = measure(lambda: system.get_artifact_version(path, random.choice(versions)))
+        print(f"{count:>10} {save_us:>10.1f} {latest_us:>14.1f} {version_us:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""对比 threading、eventlet 和 gevent 模式下并发分析请求的延迟和吞吐量
+
+在本地启动模拟的百度 API（每次调用固定延迟），再分别以不同的异步模式启动服务，
+同时发起多个 /api/agent/analyze 请求，统计全部完成的耗时和延迟分位数。
+未安装的模式会被跳过。
+
+用法（在 src 目录下）: python -m benchmarks.bench_async_mode [并发数] [模型延迟秒数]
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("threading", "eventlet", "gevent")
+
+def serve(mode: str, port: int) -> None:
+    """在子进程中以指定的异步模式启动服务"""
+    from utils.async_mode import setup_async_mode
+    setup_async_mode(mode)
+    import app as server
+    server.socketio.run(server.app, host="127.0.0.1", port=port, log_output=False, allow_unsafe_werkzeug=True)
+
+def start_fake_llm(delay: float):
+    """启动模拟的百度 API，流式接口按 SSE 返回四个分块"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path.startswith("/oauth/2.0/token"):
+                self._send("application/json", json.dumps({"access_token": "bench", "expires_in": 2592000}))
+                return
+            time.sleep(delay)
+            if json.loads(body or b"{}").get("stream"):
+                lines = [
+                    "data: " + json.dumps({"result": f"模拟输出 {i} ", "is_end": i == 3}, ensure_ascii=False)
+                    for i in range(4)
+                ]
+                self._send("text/event-stream", "\n\n".join(lines) + "\n\n")
+            else:
+                self._send("application/json", json.dumps({"result": "模拟输出"}, ensure_ascii=False))
+
+        def _send(self, content_type: str, text: str) -> None:
+            data = text.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_ready(port: int, timeout: float = 30) -> None:
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise Exception(f"服务未能在 {timeout} 秒内启动")
+
+def run_load(port: int, concurrency: int) -> dict:
+    """同时发起 concurrency 个分析请求"""
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    def call(i: int):
+        start = time.perf_counter()
+        try:
+            response = requests.post(
+                f"http://127.0.0.1:{port}/api/agent/analyze",
+                json={"input": f"压测请求 {i}：实现一个待办事项应用"},
+                timeout=600
+            )
+            ok = response.ok and response.json().get("success")
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "elapsed": elapsed,
+        "failed": sum(1 for _, ok in results if not ok),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+        "throughput": concurrency / elapsed
+    }
+
+def bench_mode(mode: str, concurrency: int, llm_url: str, tmp_dir: str) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "ASYNC_MODE": mode,
+        "TEST_MODE": "false",
+        "BAIDU_API_KEY": "bench",
+        "BAIDU_SECRET_KEY": "bench",
+        "BAIDU_API_BASE_URL": llm_url,
+        "BAIDU_TOKEN_CACHE_FILE": os.path.join(tmp_dir, f"token_{mode}.json"),
+        # 每个请求都访问模拟服务，不命中补全缓存
+        "LLM_CACHE_ENABLED": "false",
+        "PERSISTENCE_ENABLED": "false",
+        # 线程模式下连接池也不限制并发，只比较服务模型本身
+        "BAIDU_POOL_SIZE": str(concurrency),
+        "GREEN_CONCURRENCY": str(concurrency)
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_async_mode", "--serve", mode, str(port)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(port)
+        return run_load(port, concurrency)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve(sys.argv[2], int(sys.argv[3]))
+        return
+
+    import importlib.util
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    llm = start_fake_llm(delay)
+    llm_url = f"http://127.0.0.1:{llm.server_address[1]}"
+
+    print(f"并发请求数: {concurrency}，模拟模型延迟: {delay}s，每个请求调用模型 6 次")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in MODES:
+            if mode != "threading" and importlib.util.find_spec(mode) is None:
+                print(f"{mode:>9}: 未安装，跳过")
+                continue
+            result = bench_mode(mode, concurrency, llm_url, tmp_dir)
+            print(
+                f"{mode:>9}: 总耗时 {result['elapsed']:.2f}s，{result['throughput']:.1f} 请求/秒，"
+                f"p50 {result['p50']:.2f}s，p95 {result['p95']:.2f}s，失败 {result['failed']}"
+            )
+    llm.shutdown()
+
+if __name__ == "__main__":
+    main()
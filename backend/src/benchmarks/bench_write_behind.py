@@ -0,0 +1,60 @@
+"""对比逐条提交与后台批量提交的消息写入吞吐量
+
+用法（在 src 目录下）: python -m benchmarks.bench_write_behind [消息数]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from uuid import uuid4
+from storage.database import chat_messages, create_db_engine
+from storage.write_behind import WriteBehindQueue
+
+def make_row(session_id: str, position: int) -> dict:
+    return {
+        "message_id": str(uuid4()),
+        "session_id": session_id,
+        "position": position,
+        "role": "user" if position % 2 == 0 else "assistant",
+        "content": "这是一条用于压测的聊天消息。" * 10,
+        "created_at": datetime.utcnow(),
+        "meta": {}
+    }
+
+def bench_per_row(engine, count: int) -> float:
+    """每条消息单独开启事务并提交"""
+    session_id = str(uuid4())
+    start = time.perf_counter()
+    for i in range(count):
+        with engine.begin() as conn:
+            conn.execute(chat_messages.insert(), [make_row(session_id, i)])
+    return count / (time.perf_counter() - start)
+
+def bench_write_behind(engine, count: int) -> tuple:
+    """消息放入写入队列，由后台线程批量提交，统计入队耗时和全部落盘耗时"""
+    write_queue = WriteBehindQueue(engine)
+    session_id = str(uuid4())
+    start = time.perf_counter()
+    for i in range(count):
+        write_queue.insert(chat_messages, make_row(session_id, i))
+    enqueue_elapsed = time.perf_counter() - start
+    write_queue.flush()
+    total_elapsed = time.perf_counter() - start
+    return count / enqueue_elapsed, count / total_elapsed, write_queue.to_dict()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        per_row = bench_per_row(create_db_engine(f"sqlite:///{os.path.join(tmp_dir, 'per_row.db')}"), count)
+        enqueue_rate, batched, stats = bench_write_behind(
+            create_db_engine(f"sqlite:///{os.path.join(tmp_dir, 'batched.db')}"), count
+        )
+
+    print(f"消息数: {count}")
+    print(f"逐条提交: {per_row:,.0f} 条/秒")
+    print(f"批量提交: {batched:,.0f} 条/秒（{stats['batches']} 个批次，请求线程入队 {enqueue_rate:,.0f} 条/秒）")
+    print(f"提升: {batched / per_row:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,122 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key')
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     
+    # 服务的异步模式：threading、eventlet 或 gevent，协程模式下提高连接池和后台任务的并发上限，
+    # SQLite 读写转到原生线程执行
+    ASYNC_MODE = os.getenv('ASYNC_MODE', 'threading')
+    GREEN_CONCURRENCY = int(os.getenv('GREEN_CONCURRENCY', '500'))
+    
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 持久化配置：写操作进入后台队列，按批次合并提交
+    PERSISTENCE_ENABLED = os.getenv('PERSISTENCE_ENABLED', 'true').lower() == 'true'
+    PERSISTENCE_BATCH_SIZE = int(os.getenv('PERSISTENCE_BATCH_SIZE', '200'))
+    PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '0.05'))  # 秒
+    PERSISTENCE_MAX_QUEUE = int(os.getenv('PERSISTENCE_MAX_QUEUE', '10000'))  # 队列满时写操作等待空位
+    PERSISTENCE_PUT_TIMEOUT = float(os.getenv('PERSISTENCE_PUT_TIMEOUT', '1'))  # 队列满时非消息写操作最多等待的秒数，超时丢弃
+    PERSISTENCE_FLUSH_TIMEOUT = float(os.getenv('PERSISTENCE_FLUSH_TIMEOUT', '5'))  # 按需加载消息前等待写入提交的秒数
+    
+    # 多工作进程部署：共享状态存储（memory://、sqlite:///<路径>、redis://<地址>），为空时只使用进程内状态；
+    # Socket.IO 消息队列地址，多个工作进程通过它互相转发事件
+    STATE_BACKEND_URL = os.getenv('STATE_BACKEND_URL', '')
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    # 变更日志每追加多少条清理一次所有读取方都已读过的部分；读取方超过多少秒没有读取视为已退出
+    CHANGE_FEED_COMPACT_INTERVAL = int(os.getenv('CHANGE_FEED_COMPACT_INTERVAL', '1000'))
+    CHANGE_FEED_READER_TTL = float(os.getenv('CHANGE_FEED_READER_TTL', '3600'))
+    
     # 百度云配置
     BAIDU_API_KEY = os.getenv('BAIDU_API_KEY', '')
     BAIDU_SECRET_KEY = os.getenv('BAIDU_SECRET_KEY', '')
     BAIDU_MODEL_NAME = os.getenv('BAIDU_MODEL_NAME', 'ERNIE-Bot-4')
+    BAIDU_API_BASE_URL = os.getenv('BAIDU_API_BASE_URL', 'https://aip.baidubce.com')
+    
+    # 模型路由：快速模型用于 Mike 的需求分析和总结，强模型用于代码实现；
+    # BAIDU_MODEL_ROUTES 为 JSON，按阶段名或操作名覆盖默认路由，如 {"emma": {"model": "ERNIE-Bot-turbo"}}
+    BAIDU_FAST_MODEL = os.getenv('BAIDU_FAST_MODEL', 'ERNIE-Bot-turbo')
+    BAIDU_STRONG_MODEL = os.getenv('BAIDU_STRONG_MODEL', 'ERNIE-Bot-4')
+    BAIDU_MODEL_ROUTES = os.getenv('BAIDU_MODEL_ROUTES', '')
+    # 通过 /api/llm/routes 修改的路由保存在共享状态存储中，各工作进程每隔多少秒重新读取
+    MODEL_ROUTES_SYNC_INTERVAL = float(os.getenv('MODEL_ROUTES_SYNC_INTERVAL', '5'))
+    
+    # 百度 API 连接池配置
+    BAIDU_POOL_SIZE = int(os.getenv('BAIDU_POOL_SIZE', '10'))
+    BAIDU_POOL_WARMUP = int(os.getenv('BAIDU_POOL_WARMUP', '2'))
+    BAIDU_POOL_TIMEOUT = float(os.getenv('BAIDU_POOL_TIMEOUT', '5'))  # 连接池耗尽时等待空闲连接的最长秒数
+    BAIDU_TCP_KEEPALIVE = os.getenv('BAIDU_TCP_KEEPALIVE', 'true').lower() == 'true'
+    BAIDU_ASYNC_CONCURRENCY = int(os.getenv('BAIDU_ASYNC_CONCURRENCY', '10'))  # 异步客户端批量请求的默认并发数
+    
+    # 百度 API 容错：重试次数及退避间隔、熔断阈值及恢复时间、对冲请求
+    BAIDU_RETRY_MAX_ATTEMPTS = int(os.getenv('BAIDU_RETRY_MAX_ATTEMPTS', '3'))
+    BAIDU_RETRY_BASE_DELAY = float(os.getenv('BAIDU_RETRY_BASE_DELAY', '0.5'))  # 秒
+    BAIDU_RETRY_MAX_DELAY = float(os.getenv('BAIDU_RETRY_MAX_DELAY', '8'))  # 秒
+    BAIDU_BREAKER_FAILURE_THRESHOLD = int(os.getenv('BAIDU_BREAKER_FAILURE_THRESHOLD', '5'))
+    BAIDU_BREAKER_RECOVERY_TIMEOUT = float(os.getenv('BAIDU_BREAKER_RECOVERY_TIMEOUT', '30'))  # 秒
+    BAIDU_HEDGE_ENABLED = os.getenv('BAIDU_HEDGE_ENABLED', 'false').lower() == 'true'
+    BAIDU_HEDGE_PERCENTILE = float(os.getenv('BAIDU_HEDGE_PERCENTILE', '95'))
+    BAIDU_HEDGE_MIN_SAMPLES = int(os.getenv('BAIDU_HEDGE_MIN_SAMPLES', '20'))
+    
+    # 百度 API 单次请求的连接和读取超时，流式请求的读取超时指两个数据块之间的最长间隔
+    BAIDU_CONNECT_TIMEOUT = float(os.getenv('BAIDU_CONNECT_TIMEOUT', '5'))  # 秒
+    BAIDU_READ_TIMEOUT = float(os.getenv('BAIDU_READ_TIMEOUT', '60'))  # 秒
+    
+    # 端到端时间预算：客户端未指定时使用的默认值和允许的上限；剩余时间低于阈值时跳过可选阶段
+    ANALYZE_TIMEOUT = float(os.getenv('ANALYZE_TIMEOUT', '300'))  # 秒
+    CHAT_TIMEOUT = float(os.getenv('CHAT_TIMEOUT', '60'))  # 秒
+    REQUEST_TIMEOUT_MAX = float(os.getenv('REQUEST_TIMEOUT_MAX', '900'))  # 秒
+    PIPELINE_OPTIONAL_MIN_BUDGET = float(os.getenv('PIPELINE_OPTIONAL_MIN_BUDGET', '60'))  # 秒
+    
+    # 百度 API 出站限流：每分钟请求数和 token 数（0 表示不限）、允许突发的秒数、每次请求预留的输出 token 数
+    BAIDU_RATE_LIMIT_RPM = float(os.getenv('BAIDU_RATE_LIMIT_RPM', '0'))
+    BAIDU_RATE_LIMIT_TPM = float(os.getenv('BAIDU_RATE_LIMIT_TPM', '0'))
+    BAIDU_RATE_LIMIT_BURST_SECONDS = float(os.getenv('BAIDU_RATE_LIMIT_BURST_SECONDS', '1'))
+    BAIDU_RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv('BAIDU_RATE_LIMIT_OUTPUT_TOKENS', '800'))
+    
+    # 百度 API 访问令牌缓存，多个工作进程和重启后共用；默认放在当前用户私有的缓存目录，不使用公共临时目录
+    BAIDU_TOKEN_CACHE_FILE = os.getenv(
+        'BAIDU_TOKEN_CACHE_FILE',
+        os.path.join(
+            os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+            'ai-code-team', 'baidu_token_cache.json'
+        )
+    )
+    BAIDU_TOKEN_REFRESH_MARGIN = int(os.getenv('BAIDU_TOKEN_REFRESH_MARGIN', '86400'))  # 过期前多少秒刷新
+    
+    # 模型补全缓存配置
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1000'))
+    LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '3600'))  # 秒
+    LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', '')  # 为空时不使用磁盘缓存
+    
+    # Agent 流水线配置
+    PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', '4'))
+    PROMPT_STAGE_TOKEN_BUDGET = int(os.getenv('PROMPT_STAGE_TOKEN_BUDGET', '3000'))
+    PROMPT_COMPRESSION_MODE = os.getenv('PROMPT_COMPRESSION_MODE', 'extractive')  # extractive 或 summary
+    CONVERSATION_HISTORY_LIMIT = int(os.getenv('CONVERSATION_HISTORY_LIMIT', '500'))  # 内存中保留的对话条数
+    
+    # 异步分析任务配置
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '4'))
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', '100'))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '3600'))  # 秒
+    TASK_SCHEDULER_ENABLED = os.getenv('TASK_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    TASK_SCHEDULER_WORKERS = int(os.getenv('TASK_SCHEDULER_WORKERS', '4'))
+    TASK_CLAIM_TTL = float(os.getenv('TASK_CLAIM_TTL', '600'))  # 任务执行权的租期（秒），也是单个任务的执行时限
+    TASK_TIMINGS_MAX = int(os.getenv('TASK_TIMINGS_MAX', '1000'))  # 调度器保留耗时记录的最大任务数
+    WS_EVENT_QUEUE_ENABLED = os.getenv('WS_EVENT_QUEUE_ENABLED', 'true').lower() == 'true'
+    WS_EVENT_TICK = float(os.getenv('WS_EVENT_TICK', '0.05'))  # 秒
+    WS_EVENT_QUEUE_SIZE = int(os.getenv('WS_EVENT_QUEUE_SIZE', '10000'))
+    
+    # 聊天上下文配置
+    CHAT_WINDOW_TURNS = int(os.getenv('CHAT_WINDOW_TURNS', '6'))  # 原文保留的最近轮数
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '4000'))
+    CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv('CHAT_SUMMARY_TOKEN_BUDGET', '500'))
+    CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_MAX_PAGE_SIZE', '200'))  # 历史记录单页最大消息数
+    CHAT_SESSION_MAX_PAGE_SIZE = int(os.getenv('CHAT_SESSION_MAX_PAGE_SIZE', '100'))  # 会话列表单页最大会话数
+    CHAT_MAX_LOADED_SESSIONS = int(os.getenv('CHAT_MAX_LOADED_SESSIONS', '1000'))  # 消息保留在内存中的最多会话数
+    ARTIFACT_SNAPSHOT_INTERVAL = int(os.getenv('ARTIFACT_SNAPSHOT_INTERVAL', '10'))  # 增量链达到该长度时保存完整快照
+    ARTIFACT_CONTENT_CACHE_SIZE = int(os.getenv('ARTIFACT_CONTENT_CACHE_SIZE', '256'))
+    ARTIFACT_COMPRESSION_LEVEL = int(os.getenv('ARTIFACT_COMPRESSION_LEVEL', '6'))
     
     # JWT 配置
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-jwt-secret')
@@ -1,6 +1,8 @@
 from datetime import datetime
 from typing import Dict, List, Literal, Optional
 from uuid import uuid4
+import weakref
+from storage.blob_store import BlobStore, get_blob_store
 
 class Agent:
     def __init__(self, name: str, role: str, description: str, ws_handler=None):
@@ -12,11 +14,11 @@ class Agent:
         self.current_task = None
         self.ws_handler = ws_handler
         
-    def update_status(self, status: str, data: Dict = None):
-        """更新Agent状态并通过WebSocket广播"""
+    def update_status(self, status: str, data: Dict = None, session_id: str = None):
+        """更新Agent状态并通过WebSocket发送，指定会话时只发送到该会话的房间"""
         self.status = status
         if self.ws_handler:
-            self.ws_handler.emit_agent_status(self.name, status, data)
+            self.ws_handler.emit_agent_status(self.name, status, data, session_id=session_id)
             
     def process(self, input_data: Dict) -> Dict:
         """处理输入数据并返回结果"""
@@ -188,6 +190,21 @@ class Task:
             "dependencies": self.dependencies,
             "artifacts": self.artifacts
         }
+        
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Task':
+        return cls(
+            task_id=data["task_id"],
+            title=data["title"],
+            description=data["description"],
+            assigned_to=data["assigned_to"],
+            status=data.get("status", "pending"),
+            created_at=datetime.fromisoformat(data["created_at"]),
+            deadline=datetime.fromisoformat(data["deadline"]) if data.get("deadline") else None,
+            priority=data.get("priority", 1),
+            dependencies=list(data.get("dependencies") or []),
+            artifacts=list(data.get("artifacts") or [])
+        )
 
 class CodeArtifact:
     def __init__(
@@ -201,11 +218,17 @@ class CodeArtifact:
         version: str = "1.0.0",
         parent_version: str = None,
         commit_message: str = None,
-        metadata: Dict = None
+        metadata: Dict = None,
+        base_hash: str = None,
+        blob_store: BlobStore = None
     ):
         self.artifact_id = artifact_id or str(uuid4())
         self.file_path = file_path
-        self.content = content
+        # 内容保存在按内容寻址的存储中，新版本相对 base_hash 对应的父版本保存增量
+        self.blob_store = blob_store or get_blob_store()
+        self.content_hash = self.blob_store.put(content, base_hash)
+        # 制品被丢弃后释放对内容的引用，没有版本引用的内容由存储回收
+        weakref.finalize(self, self.blob_store.release, self.content_hash).atexit = False
         self.language = language
         self.created_at = created_at or datetime.utcnow()
         self.created_by = created_by
@@ -214,6 +237,10 @@ class CodeArtifact:
         self.commit_message = commit_message
         self.metadata = metadata or {}
         
+    @property
+    def content(self) -> str:
+        return self.blob_store.get(self.content_hash)
+        
     def to_dict(self) -> Dict:
         return {
             "artifact_id": self.artifact_id,
@@ -228,6 +255,24 @@ class CodeArtifact:
             "metadata": self.metadata
         }
         
+    @classmethod
+    def from_dict(cls, data: Dict, base_hash: str = None, blob_store: BlobStore = None) -> 'CodeArtifact':
+        """从 to_dict 的结果还原，base_hash 为父版本的内容哈希"""
+        return cls(
+            artifact_id=data["artifact_id"],
+            file_path=data["file_path"],
+            content=data["content"],
+            language=data["language"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            created_by=data.get("created_by"),
+            version=data["version"],
+            parent_version=data.get("parent_version"),
+            commit_message=data.get("commit_message"),
+            metadata=data.get("metadata") or {},
+            base_hash=base_hash,
+            blob_store=blob_store
+        )
+        
     @staticmethod
     def increment_version(current_version: str) -> str:
         """增加版本号"""
@@ -250,5 +295,7 @@ class CodeArtifact:
             version=self.increment_version(self.version),
             parent_version=self.version,
             commit_message=commit_message,
-            metadata=metadata or {}
+            metadata=metadata or {},
+            base_hash=self.content_hash,
+            blob_store=self.blob_store
         ) 
\ No newline at end of file
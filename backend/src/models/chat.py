@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Dict, Literal, List, Optional
 from uuid import uuid4
+from utils.prompt_budget import estimate_tokens, trim_to_tokens
 
 class ChatSession:
     def __init__(
@@ -12,27 +13,161 @@ class ChatSession:
         self.session_id = session_id or str(uuid4())
         self.title = title or "新对话"
         self.created_at = created_at or datetime.utcnow()
+        self.last_active_at = self.created_at
         self.messages: List[ChatMessage] = []
         self.is_archived = False
+        # 滚动摘要：messages[:summarized_count] 已合并进 summary
+        self.summary = ""
+        self.summarized_count = 0
+        # 会话每次变更时递增，客户端据此判断增量响应是否连续
+        self.version = 0
+        # 消息 ID 到位置的映射，用于按游标分页；位置从会话第一条消息开始计数
+        self._positions: Dict[str, int] = {}
+        # 更早的 message_offset 条消息没有加载到内存，messages 从这个位置开始
+        self.message_offset = 0
+        # 为 False 时只有会话元数据，最近的消息尚未加载
+        self.loaded = True
         
-    def to_dict(self) -> Dict:
+    @property
+    def message_count(self) -> int:
+        """会话的消息总数，包括没有加载到内存的消息"""
+        return self.message_offset + len(self.messages)
+        
+    def to_dict(self, message_limit: int = None) -> Dict:
+        """转换为字典
+        
+        Args:
+            message_limit: 只返回最近的若干条消息，为空时返回全部消息
+        """
+        page = self.get_messages_page(limit=message_limit)
         return {
             "session_id": self.session_id,
             "title": self.title,
             "created_at": self.created_at.isoformat(),
-            "messages": [msg.to_dict() for msg in self.messages],
+            "messages": page["messages"],
+            "message_count": self.message_count,
+            "version": self.version,
             "is_archived": self.is_archived
         }
         
-    def add_message(self, message: 'ChatMessage'):
+    def to_summary_dict(self) -> Dict:
+        """会话列表中使用的摘要信息，不包含消息内容"""
+        return {
+            "session_id": self.session_id,
+            "title": self.title,
+            "created_at": self.created_at.isoformat(),
+            "last_active_at": self.last_active_at.isoformat(),
+            "message_count": self.message_count,
+            "is_archived": self.is_archived
+        }
+        
+    def add_message(self, message: 'ChatMessage', update_title: bool = True):
+        self._positions[message.message_id] = self.message_count
         self.messages.append(message)
+        self.version += 1
+        self.last_active_at = max(self.last_active_at, message.timestamp)
         # 如果是第一条用户消息，根据内容更新会话标题
-        if len(self.messages) == 1 and message.role == "user":
+        if update_title and self.message_count == 1 and message.role == "user":
             self.update_title(message.content)
             
+    def load_messages(self, messages: List['ChatMessage']) -> None:
+        """把从存储加载的更早消息放到已加载消息之前，不改变版本号"""
+        self.message_offset = max(self.message_offset - len(messages), 0)
+        self.messages[:0] = messages
+        self._positions = {msg.message_id: self.message_offset + i for i, msg in enumerate(self.messages)}
+        
+    def unload_messages(self) -> None:
+        """释放内存中的消息，只保留会话元数据，需要时再从存储加载"""
+        self.message_offset = self.message_count
+        self.messages = []
+        self._positions = {}
+        self.loaded = False
+        
+    def position_of(self, message_id: str) -> Optional[int]:
+        """已加载消息的位置，未加载或不存在时返回 None"""
+        return self._positions.get(message_id)
+        
+    def get_messages(self, start: int, end: int) -> List['ChatMessage']:
+        """按位置返回 [start, end) 范围内已加载的消息"""
+        offset = self.message_offset
+        return self.messages[max(start - offset, 0):max(end - offset, 0)]
+            
+    def clear_messages(self):
+        """清空消息和滚动摘要"""
+        self.messages = []
+        self._positions.clear()
+        self.message_offset = 0
+        self.loaded = True
+        self.summary = ""
+        self.summarized_count = 0
+        self.version += 1
+        
+    def get_messages_page(self, before: str = None, limit: int = None) -> Dict:
+        """按游标分页获取消息，从新到旧翻页，每页内按时间正序
+        
+        Args:
+            before: 只返回该消息之前的消息，为空时从最新消息开始
+            limit: 每页消息数，为空时返回游标之前的全部消息
+            
+        Returns:
+            Dict: 当前页消息、是否还有更早的消息以及下一页的游标
+        """
+        if before is None:
+            end = self.message_count
+        elif before in self._positions:
+            end = self._positions[before]
+        else:
+            raise ValueError(f"消息不存在: {before}")
+            
+        # 只能返回已加载的消息，调用方需要先加载所需范围
+        start = max(end - limit, 0) if limit else 0
+        start = max(start, self.message_offset)
+        has_more = start > 0
+        messages = self.get_messages(start, end)
+        return {
+            "messages": [msg.to_dict() for msg in messages],
+            "has_more": has_more,
+            "next_before": messages[0].message_id if has_more and messages else None
+        }
+            
+    def get_context_messages(self, max_tokens: int = None, summary_prefix: str = "之前对话的摘要") -> List[Dict]:
+        """构造发送给模型的上下文：滚动摘要加尚未摘要的消息原文
+        
+        只包含 role 和 content 字段，超出 token 上限时丢弃最早的消息。
+        """
+        messages = self.get_messages(self.summarized_count, self.message_count)
+        context = [{"role": msg.role, "content": msg.content} for msg in messages]
+        summary_tokens = estimate_tokens(self.summary)
+        
+        if max_tokens:
+            total = summary_tokens + sum(estimate_tokens(m["content"]) for m in context)
+            # 至少保留最后一条消息
+            while len(context) > 1 and total > max_tokens:
+                total -= estimate_tokens(context.pop(0)["content"])
+            if len(context) == 1 and total > max_tokens:
+                context[0]["content"] = trim_to_tokens(context[0]["content"], max(max_tokens - summary_tokens, 1))
+                
+        # 模型要求第一条消息由用户发出
+        while len(context) > 1 and context[0]["role"] != "user":
+            context.pop(0)
+            
+        if self.summary and context:
+            context[0]["content"] = f"（{summary_prefix}：{self.summary}）\n\n{context[0]['content']}"
+        return context
+        
+    def get_summary_boundary(self, window_turns: int) -> int:
+        """返回保留最近 window_turns 轮原文时，需要合并进摘要的消息边界"""
+        count = self.message_count
+        boundary = max(count - window_turns * 2, self.message_offset)
+        # 边界对齐到用户消息，保证保留的原文以用户消息开头
+        while boundary < count and self.messages[boundary - self.message_offset].role != "user":
+            boundary += 1
+        return boundary
+        
     def update_title(self, content: str):
         # 取消息的前20个字符作为标题
         self.title = content[:20] + "..." if len(content) > 20 else content
+        self.version += 1
 
 class ChatMessage:
     def __init__(
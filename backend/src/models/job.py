@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
+from uuid import uuid4
+
+class Job:
+    def __init__(
+        self,
+        input_content: str,
+        job_id: str = None,
+        status: Literal["pending", "in_progress", "completed", "failed"] = "pending",
+        created_at: datetime = None,
+        total_stages: int = 0,
+        session_id: str = None
+    ):
+        self.job_id = job_id or str(uuid4())
+        self.input_content = input_content
+        self.status = status
+        self.created_at = created_at or datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.total_stages = total_stages
+        # 推送进度和Agent消息的房间，未指定会话时使用任务自己的房间
+        self.session_id = session_id
+        self.partial_results: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ["completed", "failed"]
+        
+    @property
+    def progress(self) -> float:
+        """已完成阶段的比例"""
+        if self.status == "completed":
+            return 1.0
+        if not self.total_stages:
+            return 0.0
+        return min(len(self.partial_results) / self.total_stages, 1.0)
+        
+    @property
+    def room(self) -> str:
+        return self.session_id or f"job:{self.job_id}"
+        
+    def to_dict(self, include_result: bool = True) -> Dict:
+        """转换为字典
+
+        Args:
+            include_result: 是否包含完整结果，推送进度时不需要
+        """
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "input": self.input_content,
+            "status": self.status,
+            "progress": self.progress,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "partial_results": list(self.partial_results),
+            "result": self.result if include_result else None,
+            "error": self.error
+        }
@@ -1,15 +1,78 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 from models.agent import (
     TeamLeader, ProductManager, Architect, Engineer, DataAnalyst,
     Task, CodeArtifact
 )
-from utils.baidu_client import BaiduClient
+from services.artifact_index import ArtifactVersionIndex
+from services.task_graph import TaskGraph
+from services.pipeline import PipelineStage, PipelineExecutor
+from storage.repositories import AgentRepository
+from storage.state_backend import ChangeFeed, StateBackend, get_state_backend
+from utils.baidu_client import get_baidu_client
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.prompt_budget import PromptBudget, trim_to_tokens
+from config import Config
+from uuid import uuid4
+import threading
 import time
 import logging
 
+# 默认的Agent协作流程，David只依赖Bob的方案，可以与Alex的实现并行；
+# David的性能分析是可选阶段，时间预算不足时跳过
+DEFAULT_PIPELINE_STAGES = [
+    # 团队负责人Mike分析需求
+    PipelineStage(
+        name="mike",
+        agent_name="Mike",
+        prompt_template="你是团队负责人Mike，请分析用户的需求并分配任务给团队成员。用户输入: {input}"
+    ),
+    # 产品经理Emma负责产品需求
+    PipelineStage(
+        name="emma",
+        agent_name="Emma",
+        prompt_template="你是产品经理Emma，根据用户的需求: '{input}'，以及团队负责人Mike的分析: '{mike}'，提出产品角度的建议和计划。",
+        depends_on=["mike"]
+    ),
+    # 架构师Bob负责技术架构
+    PipelineStage(
+        name="bob",
+        agent_name="Bob",
+        prompt_template="你是架构师Bob，根据用户的需求: '{input}'，团队负责人Mike的分析: '{mike}'，以及产品经理Emma的规划: '{emma}'，提出技术架构方案。",
+        depends_on=["mike", "emma"]
+    ),
+    # 工程师Alex负责代码实现
+    PipelineStage(
+        name="alex",
+        agent_name="Alex",
+        prompt_template="你是工程师Alex，根据用户的需求: '{input}'，团队负责人Mike的分析: '{mike}'，产品经理Emma的规划: '{emma}'，以及架构师Bob的方案: '{bob}'，提出具体的代码实现方案。",
+        depends_on=["mike", "emma", "bob"]
+    ),
+    # 数据分析师David负责性能分析
+    PipelineStage(
+        name="david",
+        agent_name="David",
+        prompt_template="你是数据分析师David，根据用户的需求: '{input}'，以及架构师Bob的方案: '{bob}'，提出性能优化和指标监控建议。",
+        depends_on=["bob"],
+        optional=True
+    ),
+    # 最后由Mike做总结
+    PipelineStage(
+        name="summary",
+        agent_name="Mike总结",
+        prompt_template="你是团队负责人Mike，请总结团队各成员（Emma, Bob, Alex, David）对用户需求的处理结果。用户需求: '{input}'，Emma的产品规划: '{emma}'，Bob的架构方案: '{bob}'，Alex的代码实现: '{alex}'，David的性能分析: '{david}'。",
+        depends_on=["emma", "bob", "alex", "david"]
+    )
+]
+
 class MultiAgentSystem:
-    def __init__(self, ws_handler=None):
+    def __init__(
+        self,
+        ws_handler=None,
+        pipeline_stages: List[PipelineStage] = None,
+        repository=None,
+        state_backend: StateBackend = None
+    ):
         self.ws_handler = ws_handler
         self.agents = {
             "Mike": TeamLeader(ws_handler),
@@ -18,20 +81,58 @@ class MultiAgentSystem:
             "Alex": Engineer(ws_handler),
             "David": DataAnalyst(ws_handler)
         }
+        if repository is None and Config.PERSISTENCE_ENABLED:
+            repository = AgentRepository()
+        self.repository = repository
         self.conversation_history = []
+        # 并行阶段会同时追加历史，追加和裁剪需要在锁内完成
+        self._history_lock = threading.Lock()
         self.tasks: Dict[str, Task] = {}
         self.artifacts: Dict[str, CodeArtifact] = {}
-        self.baidu_client = BaiduClient()
+        if repository:
+            self.conversation_history = repository.load_conversation(Config.CONVERSATION_HISTORY_LIMIT)
+            self.tasks = repository.load_tasks()
+            self.artifacts = repository.load_artifacts()
+        # 任务依赖图，维护反向依赖和就绪任务集合
+        self.task_graph = TaskGraph()
+        for task in self.tasks.values():
+            self._add_task_to_graph(task)
+        # 文件路径到版本列表的索引，保存和查询不再遍历全部制品
+        self.artifact_index = ArtifactVersionIndex()
+        for artifact in self.artifacts.values():
+            self._index_artifact(artifact)
+        # 多工作进程共享的任务和制品，未配置时为空；记录每个文件已读取的共享版本数
+        self.state = state_backend or get_state_backend()
+        self._artifact_offsets: Dict[str, int] = {}
+        # 同一文件的读取最新版本、创建新版本和写入索引需要串行执行，否则会产生相同的版本号
+        self._artifact_locks: Dict[str, threading.RLock] = {}
+        self._artifact_locks_lock = threading.Lock()
+        # 依赖图查询只同步变更日志中新出现的任务
+        self._task_changes = ChangeFeed(self.state, "tasks") if self.state else None
+        self.baidu_client = get_baidu_client()
+        self.pipeline_stages = pipeline_stages or DEFAULT_PIPELINE_STAGES
+        self.prompt_budget = PromptBudget(summarize=self._summarize)
         
-    def process_input(self, input_content: str) -> Dict:
+    def process_input(
+        self,
+        input_content: str,
+        on_message: Callable[[Dict], None] = None,
+        session_id: str = None,
+        deadline: Deadline = None
+    ) -> Dict:
         """处理用户输入，获取AI回复
         
         Args:
             input_content: 用户输入内容
+            on_message: 每个阶段完成后的回调，参数为该阶段的回复
+            session_id: WebSocket消息只发送到该会话的房间，为空时广播
+            deadline: 整个分析的截止时间，为空时使用 ANALYZE_TIMEOUT；
+                剩余时间不足时跳过可选阶段，超时后不再开始新的阶段
             
         Returns:
             Dict: 包含成功状态和对话内容的字典
         """
+        deadline = deadline or Deadline(Config.ANALYZE_TIMEOUT)
         try:
             # 创建用户消息
             user_message = {
@@ -41,72 +142,56 @@ class MultiAgentSystem:
             }
             
             # 将用户消息添加到对话历史
-            self.conversation_history.append(user_message)
+            self._append_history(user_message, session_id)
             
             # 通过WebSocket发送用户消息
             self.ws_handler.send_message({
                 "type": "user_message",
-                "message": user_message
+                "message": user_message,
+                "sessionId": session_id
             })
             
-            # 依次获取各个Agent的回复
+            # 按依赖关系执行各个Agent阶段，互不依赖的阶段并行执行
+            pipeline_result = {}
+            prompt_stats = {}
+            budget_report = {"skipped": [], "degraded": []}
+            deadline_exceeded = False
+            executor = PipelineExecutor(self.pipeline_stages, max_workers=Config.PIPELINE_MAX_WORKERS)
             try:
-                # 团队负责人Mike分析需求
-                mike_prompt = f"你是团队负责人Mike，请分析用户的需求并分配任务给团队成员。用户输入: {input_content}"
-                mike_response = self.baidu_client.get_response([
-                    {"role": "user", "content": mike_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("Mike", mike_response)
-                
-                # 产品经理Emma负责产品需求
-                emma_prompt = f"你是产品经理Emma，根据用户的需求: '{input_content}'，以及团队负责人Mike的分析: '{mike_response}'，提出产品角度的建议和计划。"
-                emma_response = self.baidu_client.get_response([
-                    {"role": "user", "content": emma_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("Emma", emma_response)
-                
-                # 架构师Bob负责技术架构
-                bob_prompt = f"你是架构师Bob，根据用户的需求: '{input_content}'，团队负责人Mike的分析: '{mike_response}'，以及产品经理Emma的规划: '{emma_response}'，提出技术架构方案。"
-                bob_response = self.baidu_client.get_response([
-                    {"role": "user", "content": bob_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("Bob", bob_response)
+                pipeline_result = executor.run(
+                    lambda stage, outputs: self._run_stage(
+                        stage, input_content, outputs, on_message, prompt_stats, session_id,
+                        deadline, budget_report
+                    )
+                )
                 
-                # 工程师Alex负责代码实现
-                alex_prompt = f"你是工程师Alex，根据用户的需求: '{input_content}'，团队负责人Mike的分析: '{mike_response}'，产品经理Emma的规划: '{emma_response}'，以及架构师Bob的方案: '{bob_response}'，提出具体的代码实现方案。"
-                alex_response = self.baidu_client.get_response([
-                    {"role": "user", "content": alex_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("Alex", alex_response)
-                
-                # 数据分析师David负责性能分析
-                david_prompt = f"你是数据分析师David，根据用户的需求: '{input_content}'，团队负责人Mike的分析: '{mike_response}'，产品经理Emma的规划: '{emma_response}'，架构师Bob的方案: '{bob_response}'，以及工程师Alex的实现: '{alex_response}'，提出性能优化和指标监控建议。"
-                david_response = self.baidu_client.get_response([
-                    {"role": "user", "content": david_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("David", david_response)
-                
-                # 最后由Mike做总结
-                summary_prompt = f"你是团队负责人Mike，请总结团队各成员（Emma, Bob, Alex, David）对用户需求的处理结果。用户需求: '{input_content}'，Emma的产品规划: '{emma_response}'，Bob的架构方案: '{bob_response}'，Alex的代码实现: '{alex_response}'，David的性能分析: '{david_response}'。"
-                summary_response = self.baidu_client.get_response([
-                    {"role": "user", "content": summary_prompt}
-                ])
-                # 使用单独的消息添加到对话历史
-                self._update_conversation("Mike总结", summary_response)
+            except DeadlineExceeded as e:
+                # 必需阶段超时，已完成阶段的消息已经发出，不再开始新的阶段
+                logging.warning(f"分析超过时间预算: {str(e)}")
+                deadline_exceeded = True
+                self._update_conversation("系统", f"抱歉，分析超过了时间预算，已停止后续阶段。{str(e)}", session_id=session_id)
+                pipeline_result["stage_timings"] = list(executor.timings.values())
                 
             except Exception as e:
                 # 如果AI回复失败，记录错误并使用默认回复
                 logging.error(f"获取AI回复失败: {str(e)}")
                 default_response = "抱歉，AI处理请求时出现错误，请稍后重试。错误详情: " + str(e)
-                self._update_conversation("系统", default_response)
+                self._update_conversation("系统", default_response, session_id=session_id)
+                pipeline_result["stage_timings"] = list(executor.timings.values())
             
-            # 返回成功状态和对话历史
-            return {"success": True, "conversation": self.conversation_history}
+            # 返回成功状态和本会话的对话历史
+            return {
+                "success": True,
+                "conversation": self.get_conversation_history(session_id),
+                "stage_timings": pipeline_result.get("stage_timings", []),
+                "total_ms": pipeline_result.get("total_ms"),
+                "critical_path_ms": pipeline_result.get("critical_path_ms"),
+                "prompt_stats": prompt_stats,
+                "skipped_stages": budget_report["skipped"],
+                "degraded_stages": budget_report["degraded"],
+                "deadline": deadline.to_dict(),
+                "deadline_exceeded": deadline_exceeded
+            }
         
         except Exception as e:
             # 记录并返回错误
@@ -114,20 +199,163 @@ class MultiAgentSystem:
             error_response = {
                 "success": False,
                 "error": f"处理输入时出错: {str(e)}",
-                "conversation": self.conversation_history
+                "conversation": self.get_conversation_history(session_id)
             }
             return error_response
         
-    def _update_conversation(self, agent_name: str, response: str):
+    def _run_stage(
+        self,
+        stage: PipelineStage,
+        input_content: str,
+        outputs: Dict[str, str],
+        on_message: Callable[[Dict], None] = None,
+        prompt_stats: Dict[str, Dict] = None,
+        session_id: str = None,
+        deadline: Deadline = None,
+        budget_report: Dict[str, List] = None
+    ) -> str:
+        """执行流水线中的单个阶段
+        
+        剩余时间低于 PIPELINE_OPTIONAL_MIN_BUDGET 时跳过可选阶段；必需阶段照常执行，
+        但提示词改用抽取式压缩，不再为压缩额外调用模型。
+        """
+        if budget_report is None:
+            budget_report = {"skipped": [], "degraded": []}
+        short = deadline is not None and deadline.remaining() < Config.PIPELINE_OPTIONAL_MIN_BUDGET
+        if stage.optional and short:
+            return self._skip_stage(stage, "budget_low", deadline, on_message, session_id, budget_report)
+            
+        if short and self.prompt_budget.mode != "extractive":
+            prompt, stats = self.prompt_budget.build_prompt(stage, input_content, outputs, mode="extractive")
+            budget_report["degraded"].append({
+                "stage": stage.name,
+                "agent": stage.agent_name,
+                "reason": "budget_low",
+                "remaining": round(deadline.remaining(), 3)
+            })
+        else:
+            prompt, stats = self.prompt_budget.build_prompt(stage, input_content, outputs)
+        if prompt_stats is not None:
+            prompt_stats[stage.name] = stats
+            
+        try:
+            response = self._stream_agent_response(stage.agent_name, prompt, session_id, deadline, stage.name)
+        except DeadlineExceeded:
+            if not stage.optional:
+                raise
+            return self._skip_stage(stage, "deadline_exceeded", deadline, on_message, session_id, budget_report)
+        if on_message:
+            on_message({"stage": stage.name, "agent": stage.agent_name, "content": response})
+        return response
+        
+    def _skip_stage(
+        self,
+        stage: PipelineStage,
+        reason: str,
+        deadline: Deadline,
+        on_message: Callable[[Dict], None],
+        session_id: str,
+        budget_report: Dict[str, List]
+    ) -> str:
+        """跳过可选阶段并通知客户端，返回供后续阶段引用的占位说明"""
+        skipped = {
+            "stage": stage.name,
+            "agent": stage.agent_name,
+            "reason": reason,
+            "remaining": round(deadline.remaining(), 3)
+        }
+        budget_report["skipped"].append(skipped)
+        logging.info(f"时间预算不足，跳过阶段 {stage.name}（剩余 {skipped['remaining']} 秒）")
+        placeholder = f"（{stage.agent_name}的分析因时间预算不足已跳过）"
+        if self.ws_handler:
+            self.ws_handler.emit_agent_status(stage.agent_name, "skipped", skipped, session_id=session_id)
+        # 状态事件可能被合并或丢弃，再以系统消息告知用户
+        self._update_conversation("系统", placeholder, session_id=session_id)
+        if on_message:
+            on_message({"stage": stage.name, "agent": stage.agent_name, "content": placeholder, "skipped": True})
+        return placeholder
+        
+    def _summarize(self, text: str, max_tokens: int) -> str:
+        """调用模型生成摘要，用于压缩前序阶段的输出，失败时抛出异常由调用方回退"""
+        return self.baidu_client.get_completion([
+            {"role": "user", "content": f"请将以下内容压缩为不超过{max_tokens}字的摘要，保留关键结论和数据：\n\n{text}"}
+        ], operation="prompt_summary")
+        
+    def _stream_agent_response(
+        self,
+        agent_name: str,
+        prompt: str,
+        session_id: str = None,
+        deadline: Deadline = None,
+        operation: str = "completion"
+    ) -> str:
+        """流式获取Agent回复，逐块推送增量消息，结束后发送完整消息
+        
+        Args:
+            agent_name: 代理名称
+            prompt: 发送给模型的提示词
+            session_id: 接收消息的会话
+            deadline: 所属分析的截止时间，到期时抛出 DeadlineExceeded
+            operation: 路由名，流水线阶段传阶段名，决定使用的模型和采样参数
+            
+        Returns:
+            str: 完整的AI响应内容
+        """
+        message_id = str(uuid4())
+        chunks = []
+        
+        try:
+            for seq, chunk in enumerate(self.baidu_client.stream_response([
+                {"role": "user", "content": prompt}
+            ], deadline=deadline, operation=operation)):
+                chunks.append(chunk)
+                if self.ws_handler:
+                    self.ws_handler.emit_agent_response_delta(agent_name, message_id, seq, chunk, session_id=session_id)
+            response = "".join(chunks)
+        except DeadlineExceeded as e:
+            # 已推送的增量需要结束，客户端收到同一消息ID的错误事件后丢弃未完成的消息
+            if chunks and self.ws_handler:
+                self.ws_handler.send_message({
+                    "type": "error",
+                    "message": {"content": f"回复因超过时间预算而中断: {str(e)}", "code": "AGENT_RESPONSE_FAILED"},
+                    "messageId": message_id,
+                    "sessionId": session_id
+                })
+            raise
+        except Exception as e:
+            # 中途失败时丢弃已输出的片段，单独发送错误事件，完整消息只包含错误说明
+            response = f"抱歉，AI响应生成过程中遇到了错误。错误信息: {str(e)}"
+            if self.ws_handler:
+                self.ws_handler.send_message({
+                    "type": "error",
+                    "message": {"content": response, "code": "AGENT_RESPONSE_FAILED"},
+                    "messageId": message_id,
+                    "sessionId": session_id
+                })
+                
+        # 完整消息作为最终事件，携带相同的消息ID
+        self._update_conversation(agent_name, response, message_id, session_id)
+        return response
+        
+    def _update_conversation(
+        self,
+        agent_name: str,
+        response: str,
+        message_id: str = None,
+        session_id: str = None
+    ):
         """更新对话历史并通过WebSocket发送消息
         
         Args:
             agent_name: 代理名称
             response: AI响应内容
+            message_id: 消息ID，流式输出时与增量消息的ID一致
+            session_id: 接收消息的会话
         """
         try:
             # 创建AI消息对象
             ai_message = {
+                "id": message_id or str(uuid4()),
                 "role": "assistant",
                 "agent": agent_name,
                 "content": response,
@@ -135,12 +363,13 @@ class MultiAgentSystem:
             }
             
             # 添加到对话历史
-            self.conversation_history.append(ai_message)
+            self._append_history(ai_message, session_id)
             
             # 通过WebSocket发送AI消息
             self.ws_handler.send_message({
                 "type": "ai_message",
-                "message": ai_message
+                "message": ai_message,
+                "sessionId": session_id
             })
             
             logging.info(f"发送{agent_name}的消息成功")
@@ -156,15 +385,40 @@ class MultiAgentSystem:
                     "content": f"发送{agent_name}消息时出错: {str(e)}",
                     "timestamp": int(time.time() * 1000)
                 }
-                self.conversation_history.append(error_message)
+                self._append_history(error_message, session_id)
                 self.ws_handler.send_message({
                     "type": "error",
-                    "message": error_message
+                    "message": error_message,
+                    "sessionId": session_id
                 })
             except Exception as send_error:
                 logging.error(f"发送错误消息时出错: {str(send_error)}")
                 # 此处不再递归调用，避免潜在的无限递归
         
+    def get_conversation_history(self, session_id: str = None) -> List[Dict]:
+        """指定会话的对话历史快照，返回后其他请求继续追加也不会影响调用方持有的列表
+        
+        Args:
+            session_id: 会话ID，为空时只返回未绑定会话的记录（这些消息本来就广播给所有客户端）
+        """
+        with self._history_lock:
+            return [m for m in self.conversation_history if m.get("session_id") == session_id]
+            
+    def _append_history(self, message: Dict, session_id: str = None) -> None:
+        """追加对话历史并持久化，内存中只保留最近的记录
+        
+        记录带上所属会话，查询历史时不会返回其他会话的消息。
+        """
+        if session_id:
+            message = dict(message, session_id=session_id)
+        with self._history_lock:
+            self.conversation_history.append(message)
+            if len(self.conversation_history) > Config.CONVERSATION_HISTORY_LIMIT:
+                del self.conversation_history[:-Config.CONVERSATION_HISTORY_LIMIT]
+            # 在锁内入队，持久化的顺序与内存中的顺序一致
+            if self.repository:
+                self.repository.append_conversation(message)
+            
     def create_task(
         self,
         title: str,
@@ -173,7 +427,7 @@ class MultiAgentSystem:
         priority: int = 1,
         dependencies: List[str] = None
     ) -> Dict:
-        """创建新任务"""
+        """创建新任务，依赖的任务不存在时抛出 ValueError"""
         task = Task(
             title=title,
             description=description,
@@ -181,7 +435,16 @@ class MultiAgentSystem:
             priority=priority,
             dependencies=dependencies
         )
+        # 先保存任务再加入依赖图，就绪回调触发时任务已可查询
         self.tasks[task.task_id] = task
+        try:
+            self.task_graph.add_task(task.task_id, task.dependencies, task.status)
+        except ValueError:
+            del self.tasks[task.task_id]
+            raise
+        if self.repository:
+            self.repository.save_task(task)
+        self._publish_task(task)
         
         # 更新被分配 Agent 的状态
         agent = self.agents.get(assigned_to)
@@ -192,7 +455,7 @@ class MultiAgentSystem:
         
     def get_task(self, task_id: str) -> Optional[Dict]:
         """获取任务详情"""
-        task = self.tasks.get(task_id)
+        task = self._sync_task(task_id)
         return task.to_dict() if task else None
         
     def update_task_status(
@@ -202,14 +465,22 @@ class MultiAgentSystem:
         artifacts: List[Dict] = None
     ) -> bool:
         """更新任务状态"""
-        if task_id not in self.tasks:
+        task = self._sync_task(task_id)
+        if not task:
             return False
             
-        task = self.tasks[task_id]
         task.status = status
+        self.task_graph.set_status(task_id, status)
         
         if artifacts:
             task.artifacts.extend(artifacts)
+        if self.repository:
+            self.repository.save_task(task)
+        if self.state:
+            if status == "pending":
+                # 任务重新打开后允许再次被领取
+                self.state.delete("task_claims", task_id)
+            self._publish_task(task)
             
         # 更新 Agent 状态
         agent = self.agents.get(task.assigned_to)
@@ -221,6 +492,186 @@ class MultiAgentSystem:
                 
         return True
         
+    def add_task_dependency(self, task_id: str, dependency_id: str) -> bool:
+        """为已有任务添加依赖，会形成环时抛出 ValueError"""
+        task = self._sync_task(task_id)
+        if not task:
+            return False
+        self._sync_task(dependency_id)
+        self.task_graph.add_dependency(task_id, dependency_id)
+        if dependency_id not in task.dependencies:
+            task.dependencies.append(dependency_id)
+            if self.repository:
+                self.repository.save_task(task)
+            self._publish_task(task)
+        return True
+        
+    def get_task_dependencies(self, task_id: str) -> Optional[List[Dict]]:
+        """获取任务依赖的任务，任务不存在时返回 None"""
+        if not self._sync_task(task_id):
+            return None
+        return [self.tasks[dep].to_dict() for dep in self.task_graph.dependencies(task_id)]
+        
+    def get_dependent_tasks(self, task_id: str) -> Optional[List[Dict]]:
+        """获取依赖该任务的任务，任务不存在时返回 None"""
+        self._sync_all_tasks()
+        if task_id not in self.task_graph:
+            return None
+        return [self.tasks[dep].to_dict() for dep in self.task_graph.dependents(task_id)]
+        
+    def get_ready_tasks(self) -> List[Dict]:
+        """获取依赖已全部完成、可以开始执行的任务"""
+        self._sync_all_tasks()
+        return [self.tasks[task_id].to_dict() for task_id in self.task_graph.ready()]
+        
+    def get_task_order(self) -> List[str]:
+        """按依赖关系排序的任务ID"""
+        self._sync_all_tasks()
+        return self.task_graph.topological_order()
+        
+    def execute_task(self, task_id: str) -> str:
+        """由被分配的Agent执行任务，前置任务的结果作为上下文，返回执行结果"""
+        task = self.tasks[task_id]
+        agent = self.agents.get(task.assigned_to)
+        if not agent:
+            raise Exception(f"未知的Agent: {task.assigned_to}")
+            
+        dependencies = [self.tasks[dep] for dep in self.task_graph.dependencies(task_id)]
+        # 前置任务结果平分一半的提示词预算
+        share = Config.PROMPT_STAGE_TOKEN_BUDGET // 2 // max(len(dependencies), 1)
+        context = "\n\n".join(
+            f"【{dep.title}】\n{trim_to_tokens(self._get_task_result(dep), share)}"
+            for dep in dependencies
+        )
+        prompt = (
+            f"你是{agent.role} {agent.name}，{agent.description}。请完成以下任务：\n"
+            f"标题：{task.title}\n描述：{task.description}"
+        )
+        if context:
+            prompt += f"\n\n前置任务的结果：\n{context}"
+        # 执行时间不超过执行权的租期，租期过期前任务一定已经结束
+        return self.baidu_client.get_completion(
+            [{"role": "user", "content": prompt}],
+            deadline=Deadline(Config.TASK_CLAIM_TTL),
+            operation=self._route_name(task.assigned_to)
+        )
+        
+    def _route_name(self, agent_name: str) -> str:
+        """任务按执行者所在的流水线阶段路由，如 Alex 对应 alex 阶段的模型"""
+        for stage in self.pipeline_stages:
+            if stage.agent_name == agent_name:
+                return stage.name
+        return agent_name.lower()
+        
+    @staticmethod
+    def _get_task_result(task: Task) -> str:
+        results = [a.get("content", "") for a in task.artifacts if a.get("type") == "result"]
+        return results[-1] if results else ""
+        
+    def claim_task(self, task_id: str) -> bool:
+        """领取任务执行权，多个工作进程同时调度同一任务时只有一个能领取成功
+        
+        执行权有 TASK_CLAIM_TTL 的租期，持有者异常退出后，过期的执行权可以被重新领取。
+        """
+        if not self.state:
+            return True
+        claim = {"claimed_at": datetime.utcnow().isoformat(), "expires_at": time.time() + Config.TASK_CLAIM_TTL}
+        if self.state.add("task_claims", task_id, claim):
+            return True
+        current = self.state.get("task_claims", task_id)
+        if current is None:
+            # 持有者刚刚释放
+            return self.state.add("task_claims", task_id, claim)
+        if current.get("expires_at", 0) > time.time():
+            return False
+        # 多个工作进程同时接管同一个过期的执行权时，只有先写入接管记录的一个成功
+        if not self.state.add("task_claim_takeovers", f"{task_id}:{current.get('expires_at', 0)}", claim):
+            return False
+        self.state.put("task_claims", task_id, claim)
+        return True
+        
+    def recover_stale_tasks(self) -> List[str]:
+        """把执行中断的任务重新置为待执行，依赖它们的任务不会一直等待
+        
+        未配置共享状态时，启动时处于执行中的任务都是上次进程退出时中断的；
+        配置共享状态时，只恢复执行权已过期的任务，其他工作进程正在执行的任务不受影响。
+        调度器启动时调用。
+        
+        Returns:
+            List[str]: 恢复的任务ID
+        """
+        self._sync_all_tasks()
+        recovered = []
+        for task in list(self.tasks.values()):
+            if task.status != "in_progress":
+                continue
+            if self.state and not self.claim_task(task.task_id):
+                continue
+            # 置为待执行时同时释放刚领取的执行权
+            self.update_task_status(task.task_id, "pending")
+            recovered.append(task.task_id)
+        if recovered:
+            logging.warning(f"已恢复执行中断的任务: {recovered}")
+        return recovered
+        
+    def _publish_task(self, task: Task) -> None:
+        if self.state:
+            self.state.put("tasks", task.task_id, task.to_dict())
+            self._task_changes.publish(task.task_id)
+            
+    def _sync_task(self, task_id: str) -> Optional[Task]:
+        """按共享状态更新本地任务，其他工作进程创建的任务连同其依赖一起加入依赖图"""
+        if not self.state:
+            return self.tasks.get(task_id)
+        data = self.state.get("tasks", task_id)
+        if data is None:
+            return self.tasks.get(task_id)
+        return self._apply_shared_task(data)
+        
+    def _sync_all_tasks(self) -> None:
+        """首次读取全部共享任务，之后只读取其他工作进程变更过的任务"""
+        if not self.state:
+            return
+        changed = self._task_changes.poll()
+        if changed is not None:
+            for task_id in changed:
+                self._sync_task(task_id)
+            return
+        shared = self.state.items("tasks")
+        for data in shared.values():
+            self._apply_shared_task(data, shared)
+            
+    def _apply_shared_task(self, data: Dict, shared: Dict[str, Dict] = None) -> Task:
+        task = self.tasks.get(data["task_id"])
+        if task is None:
+            for dep in data.get("dependencies") or []:
+                if dep not in self.tasks:
+                    dep_data = shared.get(dep) if shared is not None else self.state.get("tasks", dep)
+                    if dep_data:
+                        self._apply_shared_task(dep_data, shared)
+            task = Task.from_dict(data)
+            self.tasks[task.task_id] = task
+            self._add_task_to_graph(task)
+            return task
+            
+        for dep in data.get("dependencies") or []:
+            if dep not in task.dependencies and (dep in self.tasks or self._sync_task(dep)):
+                task.dependencies.append(dep)
+                self.task_graph.add_dependency(task.task_id, dep)
+        if len(data.get("artifacts") or []) > len(task.artifacts):
+            task.artifacts = list(data["artifacts"])
+        if data["status"] != task.status:
+            task.status = data["status"]
+            self.task_graph.set_status(task.task_id, task.status)
+        return task
+        
+    def _add_task_to_graph(self, task: Task) -> None:
+        """把已保存的任务加入依赖图，依赖缺失的任务忽略缺失的依赖"""
+        dependencies = [dep for dep in task.dependencies if dep in self.task_graph]
+        if len(dependencies) != len(task.dependencies):
+            logging.warning(f"任务 {task.task_id} 的部分依赖不存在，已忽略")
+        self.task_graph.add_task(task.task_id, dependencies, task.status)
+        
     def save_code_artifact(
         self,
         file_path: str,
@@ -230,61 +681,93 @@ class MultiAgentSystem:
         commit_message: str = None,
         metadata: Dict = None
     ) -> Dict:
-        """保存代码制品"""
-        # 检查是否已存在该文件路径的制品
-        existing_artifact = None
-        for artifact in self.artifacts.values():
-            if artifact.file_path == file_path:
-                existing_artifact = artifact
-                break
+        """保存代码制品，已存在同一文件路径时在最新版本的基础上创建新版本"""
+        with self._artifact_lock(file_path):
+            self._sync_artifacts(file_path)
+            latest_id = self.artifact_index.latest(file_path)
+            if latest_id:
+                # 创建新版本
+                new_artifact = self.artifacts[latest_id].create_new_version(
+                    content=content,
+                    commit_message=commit_message or f"Update by {created_by}",
+                    created_by=created_by,
+                    metadata=metadata
+                )
+            else:
+                # 创建新制品
+                new_artifact = CodeArtifact(
+                    file_path=file_path,
+                    content=content,
+                    language=language,
+                    created_by=created_by,
+                    commit_message=commit_message or f"Initial commit by {created_by}",
+                    metadata=metadata
+                )
                 
-        if existing_artifact:
-            # 创建新版本
-            new_artifact = existing_artifact.create_new_version(
-                content=content,
-                commit_message=commit_message or f"Update by {created_by}",
-                created_by=created_by,
-                metadata=metadata
-            )
-        else:
-            # 创建新制品
-            new_artifact = CodeArtifact(
-                file_path=file_path,
-                content=content,
-                language=language,
-                created_by=created_by,
-                commit_message=commit_message or f"Initial commit by {created_by}",
-                metadata=metadata
-            )
-            
-        self.artifacts[new_artifact.artifact_id] = new_artifact
-        return new_artifact.to_dict()
+            self.artifacts[new_artifact.artifact_id] = new_artifact
+            self._index_artifact(new_artifact)
+            if self.repository:
+                self.repository.save_artifact(new_artifact)
+            if self.state:
+                self.state.append("artifact_history", file_path, new_artifact.to_dict())
+            return new_artifact.to_dict()
         
     def get_artifact_history(self, file_path: str) -> List[Dict]:
-        """获取制品的版本历史"""
-        history = []
-        for artifact in self.artifacts.values():
-            if artifact.file_path == file_path:
-                history.append(artifact.to_dict())
-        return sorted(history, key=lambda x: x['created_at'])
+        """获取制品的版本历史，按版本号从旧到新排列"""
+        self._sync_artifacts(file_path)
+        return [self.artifacts[artifact_id].to_dict() for artifact_id in self.artifact_index.history(file_path)]
         
     def get_artifact_version(self, file_path: str, version: str = None) -> Optional[Dict]:
-        """获取制品的特定版本"""
-        if version:
-            for artifact in self.artifacts.values():
-                if artifact.file_path == file_path and artifact.version == version:
-                    return artifact.to_dict()
-        else:
-            # 返回最新版本
-            latest_version = None
-            latest_artifact = None
-            for artifact in self.artifacts.values():
-                if artifact.file_path == file_path:
-                    if not latest_version or artifact.version > latest_version:
-                        latest_version = artifact.version
-                        latest_artifact = artifact
-            return latest_artifact.to_dict() if latest_artifact else None
-        return None
+        """获取制品的特定版本，未指定版本时返回最新版本"""
+        self._sync_artifacts(file_path)
+        try:
+            if version:
+                artifact_id = self.artifact_index.find(file_path, version)
+            else:
+                artifact_id = self.artifact_index.latest(file_path)
+        except ValueError:
+            return None
+        return self.artifacts[artifact_id].to_dict() if artifact_id else None
+        
+    def _artifact_lock(self, file_path: str) -> threading.RLock:
+        """获取文件路径对应的锁，不同文件的保存互不阻塞"""
+        with self._artifact_locks_lock:
+            lock = self._artifact_locks.get(file_path)
+            if lock is None:
+                lock = self._artifact_locks[file_path] = threading.RLock()
+            return lock
+            
+    def _sync_artifacts(self, file_path: str) -> None:
+        """读取其他工作进程新保存的版本，本进程保存过的版本按ID跳过"""
+        if not self.state:
+            return
+        with self._artifact_lock(file_path):
+            offset = self._artifact_offsets.get(file_path, 0)
+            items = self.state.get_list("artifact_history", file_path, offset)
+            for data in items:
+                if data["artifact_id"] in self.artifacts:
+                    continue
+                parent_id = None
+                if data.get("parent_version"):
+                    try:
+                        parent_id = self.artifact_index.find(file_path, data["parent_version"])
+                    except ValueError:
+                        parent_id = None
+                artifact = CodeArtifact.from_dict(
+                    data,
+                    base_hash=self.artifacts[parent_id].content_hash if parent_id else None
+                )
+                self.artifacts[artifact.artifact_id] = artifact
+                self._index_artifact(artifact)
+            self._artifact_offsets[file_path] = offset + len(items)
+        
+    def _index_artifact(self, artifact: CodeArtifact) -> None:
+        self.artifact_index.add(
+            artifact.file_path,
+            artifact.version,
+            artifact.created_at.timestamp(),
+            artifact.artifact_id
+        )
         
     def get_agent(self, agent_id: str) -> Optional[Dict]:
         """获取 Agent 信息"""
@@ -0,0 +1,56 @@
+from bisect import bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+import threading
+
+# 排序键：(版本号各段数值, 创建时间戳, 制品ID)，版本号相同时以后创建的为准
+VersionKey = Tuple[Tuple[int, ...], float, str]
+
+def parse_version(version: str) -> Tuple[int, ...]:
+    """把版本号解析为整数元组，按数值比较，1.0.10 大于 1.0.9"""
+    try:
+        return tuple(int(part) for part in version.split('.'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"无效的版本号: {version}")
+
+class ArtifactVersionIndex:
+    """按文件路径维护的制品版本索引
+
+    每个文件路径对应一个按版本号排序的列表，
+    最新版本直接取列表末尾，查找指定版本使用二分查找。
+    读取和插入都在锁内进行，读取时不会看到插入到一半的列表。
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, List[VersionKey]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._versions
+
+    def add(self, file_path: str, version: str, created_at: float, artifact_id: str) -> None:
+        key = (parse_version(version), created_at, artifact_id)
+        with self._lock:
+            insort(self._versions.setdefault(file_path, []), key)
+
+    def latest(self, file_path: str) -> Optional[str]:
+        """返回最新版本的制品ID"""
+        with self._lock:
+            versions = self._versions.get(file_path)
+            return versions[-1][2] if versions else None
+
+    def find(self, file_path: str, version: str) -> Optional[str]:
+        """返回指定版本的制品ID"""
+        parsed = parse_version(version)
+        with self._lock:
+            versions = self._versions.get(file_path)
+            if not versions:
+                return None
+            index = bisect_right(versions, (parsed, float('inf'), '')) - 1
+            if index >= 0 and versions[index][0] == parsed:
+                return versions[index][2]
+        return None
+
+    def history(self, file_path: str) -> List[str]:
+        """按版本号从旧到新返回制品ID"""
+        with self._lock:
+            return [artifact_id for _, _, artifact_id in self._versions.get(file_path, [])]
@@ -1,58 +1,150 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from models.chat import ChatMessage, ChatSession
-from utils.baidu_client import BaiduClient
+from services.session_index import SessionIndex
+from storage.repositories import ChatRepository
+from storage.state_backend import ChangeFeed, StateBackend, get_state_backend
+from utils.baidu_client import get_baidu_client
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.prompt_budget import trim_to_tokens
+from config import Config
+from datetime import datetime
+import threading
+import logging
 
 class ChatService:
-    def __init__(self):
-        self.baidu_client = BaiduClient()
-        self.sessions: Dict[str, ChatSession] = {}
+    def __init__(self, repository=None, state_backend: StateBackend = None):
+        """初始化聊天服务
+        
+        Args:
+            repository: 持久化仓库，为空且启用持久化时使用默认数据库
+            state_backend: 多个工作进程共享的状态存储，为空时读取 STATE_BACKEND_URL，
+                未配置时会话只保存在本进程内
+        """
+        self.baidu_client = get_baidu_client()
+        if repository is None and Config.PERSISTENCE_ENABLED:
+            repository = ChatRepository()
+        self.repository = repository
+        self.state = state_backend or get_state_backend()
+        # 本进程已同步的会话清空次数，与共享状态不一致时重新加载全部消息
+        self._epochs: Dict[str, int] = {}
+        # 会话列表只同步变更日志中新出现的会话，消息按共享列表的顺序同步
+        self._session_changes = ChangeFeed(self.state, "sessions") if self.state else None
+        self._sync_lock = threading.Lock()
+        # 启动时只加载会话元数据，消息在会话被访问时按需加载
+        self.sessions: Dict[str, ChatSession] = repository.load_sessions() if repository else {}
+        # 已加载消息的会话按访问顺序排列，超过 CHAT_MAX_LOADED_SESSIONS 时释放最久未访问会话的消息
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()
+        self._loaded_lock = threading.Lock()
+        # 按最后活跃时间和归档状态维护的索引，列表查询不再遍历全部会话
+        self.session_index = SessionIndex()
+        for session in self.sessions.values():
+            self._index_session(session)
+        # 会话摘要在后台单线程更新，不占用请求处理时间
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+        self._summary_lock = threading.Lock()
+        self._summarizing = set()
         
     def create_session(self, title: str = None) -> Dict:
         """创建新的聊天会话"""
         session = ChatSession(title=title)
         self.sessions[session.session_id] = session
+        self._epochs[session.session_id] = 0
+        self._index_session(session)
+        self._save_session(session)
         return session.to_dict()
         
-    def get_session(self, session_id: str) -> Optional[Dict]:
-        """获取指定会话"""
-        session = self.sessions.get(session_id)
-        return session.to_dict() if session else None
+    def get_session(self, session_id: str, message_limit: int = None) -> Optional[Dict]:
+        """获取指定会话，message_limit 不为空时只包含最近的若干条消息"""
+        session = self._get_session(session_id)
+        if not session:
+            return None
+        limit = self._clamp_limit(message_limit)
+        self._load_page(session, None, limit)
+        return session.to_dict(limit)
         
-    def list_sessions(self) -> List[Dict]:
-        """获取所有会话列表"""
-        return [
-            {
-                "session_id": session.session_id,
-                "title": session.title,
-                "created_at": session.created_at.isoformat(),
-                "message_count": len(session.messages),
-                "is_archived": session.is_archived
-            }
-            for session in self.sessions.values()
-        ]
+    def list_sessions(self, archived: Optional[bool] = None) -> List[Dict]:
+        """获取会话列表，按最后活跃时间倒序"""
+        return self.list_sessions_page(archived=archived)["sessions"]
+        
+    def list_sessions_page(
+        self,
+        archived: Optional[bool] = None,
+        limit: int = None,
+        cursor: str = None
+    ) -> Dict:
+        """分页获取会话列表，按最后活跃时间倒序
+        
+        Args:
+            archived: 按归档状态筛选，为空时返回全部会话
+            limit: 每页会话数，不超过 CHAT_SESSION_MAX_PAGE_SIZE
+            cursor: 上一页返回的 next_cursor
+        """
+        if limit is not None:
+            limit = max(1, min(limit, Config.CHAT_SESSION_MAX_PAGE_SIZE))
+        self._sync_all_sessions()
+        session_ids, next_cursor = self.session_index.page(archived, limit, cursor)
+        sessions = [self.sessions.get(session_id) for session_id in session_ids]
+        return {
+            "sessions": [session.to_summary_dict() for session in sessions if session],
+            "next_cursor": next_cursor,
+            "total": self.session_index.count(archived)
+        }
         
     def archive_session(self, session_id: str) -> bool:
         """归档会话"""
-        if session_id in self.sessions:
+        if self._get_session(session_id, load=False):
             self.sessions[session_id].is_archived = True
+            self.sessions[session_id].version += 1
+            self._index_session(self.sessions[session_id])
+            self._save_session(self.sessions[session_id])
             return True
         return False
         
     def delete_session(self, session_id: str) -> bool:
         """删除会话"""
-        if session_id in self.sessions:
+        if self._get_session(session_id, load=False):
             del self.sessions[session_id]
+            self._epochs.pop(session_id, None)
+            with self._loaded_lock:
+                self._loaded.pop(session_id, None)
+            self.session_index.remove(session_id)
+            if self.repository:
+                self.repository.delete_session(session_id)
+            if self.state:
+                self.state.delete("sessions", session_id)
+                self.state.delete_list("session_messages", session_id)
+                self._session_changes.publish(session_id)
             return True
         return False
         
-    def process_message(self, session_id: str, message: str, context: Optional[Dict] = None) -> Dict:
-        """处理用户消息并返回 AI 响应"""
+    def process_message(
+        self,
+        session_id: str,
+        message: str,
+        context: Optional[Dict] = None,
+        delta: bool = False,
+        deadline: Deadline = None
+    ) -> Dict:
+        """处理用户消息并返回 AI 响应
+        
+        Args:
+            session_id: 会话ID
+            message: 用户消息
+            context: 附加到用户消息的元数据
+            delta: 为 True 时只返回本轮新增的消息和会话版本号，不返回完整会话
+            deadline: 本次请求的截止时间，为空时使用 CHAT_TIMEOUT，超时抛出 DeadlineExceeded
+        """
+        deadline = deadline or Deadline(Config.CHAT_TIMEOUT)
         try:
             # 获取或创建会话
-            session = self.sessions.get(session_id)
+            session = self._get_session(session_id)
             if not session:
                 session = ChatSession(session_id=session_id)
                 self.sessions[session_id] = session
+                self._epochs[session_id] = 0
+                self._index_session(session)
             
             # 创建新的聊天消息
             user_message = ChatMessage(
@@ -61,11 +153,20 @@ class ChatService:
                 session_id=session_id,
                 metadata=context
             )
-            session.add_message(user_message)
+            self._add_message(session, user_message)
+            self._index_session(session)
+            # 处理期间其他请求可能释放了会话消息，构造上下文前重新确认已加载
+            self._ensure_loaded(session)
             
-            # 获取 AI 响应
-            messages_for_api = [msg.to_dict() for msg in session.messages]
-            ai_response = self.baidu_client.get_completion(messages=messages_for_api)
+            # 获取 AI 响应，只发送滚动摘要和最近的消息
+            messages_for_api = session.get_context_messages(Config.CHAT_CONTEXT_TOKEN_BUDGET)
+            # 用户正在等待回复，限流排队时优先于后台的流水线阶段和摘要
+            ai_response = self.baidu_client.get_completion(
+                messages=messages_for_api,
+                deadline=deadline,
+                priority="interactive",
+                operation="chat"
+            )
             
             # 保存 AI 响应
             ai_message = ChatMessage(
@@ -73,37 +174,290 @@ class ChatService:
                 content=ai_response,
                 session_id=session_id
             )
-            session.add_message(ai_message)
+            self._add_message(session, ai_message)
+            self._index_session(session)
+            self._schedule_summary(session)
             
-            return {
+            response = {
                 "message_id": ai_message.message_id,
                 "content": ai_response,
-                "role": "assistant",
-                "session": session.to_dict()
+                "role": "assistant"
             }
+            if delta:
+                response["messages"] = [user_message.to_dict(), ai_message.to_dict()]
+                response["version"] = session.version
+            else:
+                self._load_page(session, None, None)
+                response["session"] = session.to_dict()
+            return response
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             raise Exception(f"处理消息时出错: {str(e)}")
             
+    def _schedule_summary(self, session: ChatSession) -> None:
+        """当有消息移出最近窗口时，在后台把它们合并进会话摘要"""
+        if session.get_summary_boundary(Config.CHAT_WINDOW_TURNS) <= session.summarized_count:
+            return
+        with self._summary_lock:
+            if session.session_id in self._summarizing:
+                return
+            self._summarizing.add(session.session_id)
+        self._summary_executor.submit(self._update_summary, session)
+        
+    def _update_summary(self, session: ChatSession) -> None:
+        """增量更新会话摘要：已有摘要加上新移出窗口的消息"""
+        updated = False
+        try:
+            start = session.summarized_count
+            boundary = session.get_summary_boundary(Config.CHAT_WINDOW_TURNS)
+            if boundary <= start:
+                return
+                
+            dialogue = "\n".join(
+                f"{'用户' if msg.role == 'user' else '助手'}: {msg.content}"
+                for msg in session.get_messages(start, boundary)
+            )
+            prompt = (
+                f"请更新对话摘要，保留用户的需求、约束和已得出的结论，不超过{Config.CHAT_SUMMARY_TOKEN_BUDGET}字。\n\n"
+                f"已有摘要：{session.summary or '无'}\n\n新增对话：\n{dialogue}"
+            )
+            summary = self.baidu_client.get_completion([{"role": "user", "content": prompt}], operation="chat_summary")
+            
+            # 摘要期间会话可能已被清空，此时丢弃结果
+            if session.summarized_count == start and session.message_count >= boundary:
+                session.summary = trim_to_tokens(summary, Config.CHAT_SUMMARY_TOKEN_BUDGET)
+                session.summarized_count = boundary
+                self._save_session(session)
+                updated = True
+        except Exception as e:
+            logging.error(f"更新会话 {session.session_id} 摘要失败: {str(e)}")
+        finally:
+            with self._summary_lock:
+                self._summarizing.discard(session.session_id)
+                
+        # 摘要期间又有消息移出窗口时继续合并
+        if updated:
+            self._schedule_summary(session)
+                
     def get_session_history(self, session_id: str) -> List[Dict]:
         """获取指定会话的历史记录"""
-        session = self.sessions.get(session_id)
+        session = self._get_session(session_id)
         if not session:
             return []
+        self._load_page(session, None, None)
         return [msg.to_dict() for msg in session.messages]
         
+    def get_history_page(self, session_id: str, before: str = None, limit: int = None) -> Optional[Dict]:
+        """按游标分页获取历史记录，会话不存在时返回 None
+        
+        Args:
+            session_id: 会话ID
+            before: 只返回该消息之前的消息
+            limit: 每页消息数，不超过 CHAT_HISTORY_MAX_PAGE_SIZE
+        """
+        session = self._get_session(session_id)
+        if not session:
+            return None
+        limit = self._clamp_limit(limit)
+        self._load_page(session, before, limit)
+        page = session.get_messages_page(before, limit)
+        page["version"] = session.version
+        return page
+        
+    @staticmethod
+    def _clamp_limit(limit: Optional[int]) -> Optional[int]:
+        if limit is None:
+            return None
+        return max(1, min(limit, Config.CHAT_HISTORY_MAX_PAGE_SIZE))
+        
     def clear_session_history(self, session_id: str) -> bool:
         """清空指定会话的历史记录"""
-        session = self.sessions.get(session_id)
+        session = self._get_session(session_id)
         if session:
-            session.messages.clear()
+            session.clear_messages()
+            if self.repository:
+                self.repository.clear_messages(session_id)
+            if self.state:
+                self.state.delete_list("session_messages", session_id)
+                self._epochs[session_id] = self._epochs.get(session_id, 0) + 1
+            self._save_session(session)
             return True
         return False
         
     def update_session_title(self, session_id: str, title: str) -> bool:
         """更新会话标题"""
-        session = self.sessions.get(session_id)
+        session = self._get_session(session_id, load=False)
         if session:
             session.title = title
+            session.version += 1
+            self._save_session(session)
             return True
-        return False 
\ No newline at end of file
+        return False
+        
+    def _index_session(self, session: ChatSession) -> None:
+        """会话活跃时间或归档状态变化后更新列表索引"""
+        self.session_index.update(
+            session.session_id,
+            session.last_active_at.timestamp(),
+            session.is_archived
+        )
+        
+    def _save_session(self, session: ChatSession) -> None:
+        """持久化会话元数据，写入在后台批量提交；配置了共享状态时同时发布给其他工作进程"""
+        if self.repository:
+            self.repository.save_session(session)
+        if self.state:
+            self.state.put("sessions", session.session_id, {
+                "title": session.title,
+                "created_at": session.created_at.isoformat(),
+                "last_active_at": session.last_active_at.isoformat(),
+                "is_archived": session.is_archived,
+                "summary": session.summary,
+                "summarized_count": session.summarized_count,
+                "message_count": session.message_count,
+                "version": session.version,
+                "epoch": self._epochs.get(session.session_id, 0)
+            })
+            self._session_changes.publish(session.session_id)
+            
+    def _add_message(self, session: ChatSession, message: ChatMessage) -> None:
+        """追加并持久化新消息，首条消息会更新标题，因此同时保存会话
+        
+        配置了共享状态时先追加到共享列表，再按共享列表的顺序同步到本地，
+        多个工作进程同时追加时各进程看到的消息顺序一致，不会重复或遗漏。
+        """
+        if self.state:
+            self.state.append("session_messages", session.session_id, message.to_dict())
+            self._sync_messages(session)
+            if session.position_of(message.message_id) == 0 and message.role == "user":
+                session.update_title(message.content)
+        else:
+            session.add_message(message)
+        if self.repository:
+            self.repository.save_message(message, session.position_of(message.message_id))
+        self._save_session(session)
+        
+    def _sync_messages(self, session: ChatSession) -> None:
+        """从共享列表读取本地还没有的消息，本地消息数即已读取的共享列表位置"""
+        with self._sync_lock:
+            for data in self.state.get_list("session_messages", session.session_id, session.message_count):
+                session.add_message(ChatMessage.from_dict(data), update_title=False)
+        
+    def _get_session(self, session_id: str, load: bool = True) -> Optional[ChatSession]:
+        """获取会话，配置了共享状态时先同步其他工作进程的修改
+        
+        Args:
+            session_id: 会话ID
+            load: 为 True 时确保最近的消息已加载到内存
+        """
+        if not self.state:
+            session = self.sessions.get(session_id)
+        else:
+            session = self._sync_session(session_id, self.state.get("sessions", session_id))
+        if session and load:
+            self._ensure_loaded(session)
+        return session
+        
+    def _ensure_loaded(self, session: ChatSession) -> None:
+        """加载会话上下文所需的消息，并释放最久未访问会话的消息"""
+        if not session.loaded:
+            # 上下文需要摘要之后的全部消息，另外预先加载最近一页供历史查询使用
+            recent = session.message_count - Config.CHAT_HISTORY_MAX_PAGE_SIZE
+            self._load_older(session, max(min(session.summarized_count, recent), 0))
+            session.loaded = True
+        # 没有持久化存储时释放的消息无法再加载，全部保留在内存中
+        if not (self.repository or self.state):
+            return
+        with self._loaded_lock:
+            self._loaded[session.session_id] = None
+            self._loaded.move_to_end(session.session_id)
+            evicted = []
+            while len(self._loaded) > Config.CHAT_MAX_LOADED_SESSIONS:
+                evicted.append(self._loaded.popitem(last=False)[0])
+        for session_id in evicted:
+            with self._summary_lock:
+                # 正在更新摘要的会话仍需要原文，下次访问时再重新计入
+                if session_id in self._summarizing:
+                    continue
+            evicted_session = self.sessions.get(session_id)
+            if evicted_session:
+                evicted_session.unload_messages()
+                
+    def _load_page(self, session: ChatSession, before: Optional[str], limit: Optional[int]) -> None:
+        """确保分页查询需要的更早消息已加载"""
+        if not session.message_offset:
+            return
+        end = session.message_count if before is None else session.position_of(before)
+        if end is None:
+            # 游标不在已加载的范围内，加载全部更早的消息后再查找
+            self._load_older(session, 0)
+            return
+        self._load_older(session, max(end - limit, 0) if limit else 0)
+        
+    def _load_older(self, session: ChatSession, start: int) -> None:
+        """从共享状态或数据库加载 start 到已加载消息之间的更早消息"""
+        end = session.message_offset
+        if start >= end:
+            return
+        if self.state:
+            data = self.state.get_list("session_messages", session.session_id, start, end)
+            messages = [ChatMessage.from_dict(item) for item in data]
+        elif self.repository:
+            messages = self.repository.load_messages(session.session_id, start, end)
+        else:
+            return
+        session.load_messages(messages)
+        
+    def _sync_all_sessions(self) -> None:
+        """列表查询前同步共享状态中的会话，首次读取全部会话，之后只读取变更过的会话"""
+        if not self.state:
+            return
+        changed = self._session_changes.poll()
+        if changed is not None:
+            for session_id in changed:
+                self._sync_session(session_id, self.state.get("sessions", session_id))
+            return
+        shared = self.state.items("sessions")
+        for session_id in list(self.sessions):
+            if session_id not in shared:
+                self._sync_session(session_id, None)
+        for session_id, meta in shared.items():
+            self._sync_session(session_id, meta)
+            
+    def _sync_session(self, session_id: str, meta: Optional[Dict]) -> Optional[ChatSession]:
+        """按共享状态更新本地会话，只读取本地缺少的消息"""
+        session = self.sessions.get(session_id)
+        if meta is None:
+            # 曾经同步过但共享状态中已不存在，说明已被其他工作进程删除
+            if session and session_id in self._epochs:
+                del self.sessions[session_id]
+                del self._epochs[session_id]
+                self.session_index.remove(session_id)
+                return None
+            return session
+            
+        if session and meta["epoch"] == self._epochs.get(session_id) and meta["version"] == session.version:
+            return session
+        if session is None or meta["epoch"] != self._epochs.get(session_id):
+            session = ChatSession(
+                session_id=session_id,
+                title=meta["title"],
+                created_at=datetime.fromisoformat(meta["created_at"])
+            )
+            # 只同步元数据，消息在会话被访问时按需加载
+            session.message_offset = meta["message_count"]
+            session.loaded = False
+        self._sync_messages(session)
+        session.title = meta["title"]
+        session.is_archived = meta["is_archived"]
+        session.summary = meta["summary"]
+        session.summarized_count = meta["summarized_count"]
+        session.last_active_at = datetime.fromisoformat(meta["last_active_at"])
+        session.version = meta["version"]
+        
+        self.sessions[session_id] = session
+        self._epochs[session_id] = meta["epoch"]
+        self._index_session(session)
+        return session 
\ No newline at end of file
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from models.job import Job
+from storage.state_backend import StateBackend, get_state_backend
+from config import Config
+from utils.async_mode import concurrency_limit
+from utils.deadline import Deadline
+import threading
+import logging
+
+class JobQueueFullError(Exception):
+    """等待执行的任务过多"""
+
+class JobService:
+    """在后台线程池中执行Agent分析，提交后立即返回任务ID"""
+    
+    def __init__(
+        self,
+        agent_system,
+        ws_handler=None,
+        max_workers: int = None,
+        max_pending: int = None,
+        result_ttl: int = None,
+        state_backend: StateBackend = None
+    ):
+        """初始化任务服务
+        
+        Args:
+            agent_system: 执行分析的MultiAgentSystem
+            ws_handler: WebSocket处理器，用于推送任务进度
+            max_workers: 同时执行的最大任务数
+            max_pending: 未完成任务的最大数量，超过时拒绝提交
+            result_ttl: 已完成任务结果的保留秒数
+            state_backend: 共享状态存储，配置后任务状态对所有工作进程可见
+        """
+        self.agent_system = agent_system
+        self.ws_handler = ws_handler
+        self.max_pending = max_pending or Config.JOB_MAX_PENDING
+        self.result_ttl = result_ttl if result_ttl is not None else Config.JOB_RESULT_TTL
+        self.jobs: Dict[str, Job] = {}
+        self.state = state_backend or get_state_backend()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or concurrency_limit(Config.JOB_MAX_WORKERS),
+            thread_name_prefix="analyze-job"
+        )
+        
+    def submit(self, input_content: str, session_id: str = None, deadline: Deadline = None) -> Dict:
+        """提交分析任务，立即返回任务信息
+        
+        进度和Agent消息只发送到会话房间，未指定会话时发送到 job:<job_id> 房间。
+        截止时间从提交时开始计算，排队等待的时间也计入时间预算。
+        """
+        deadline = deadline or Deadline(Config.ANALYZE_TIMEOUT)
+        with self._lock:
+            self._purge_expired()
+            unfinished = sum(1 for job in self.jobs.values() if not job.is_finished)
+            if unfinished >= self.max_pending:
+                raise JobQueueFullError(f"等待执行的任务过多({unfinished})，请稍后重试")
+                
+            job = Job(
+                input_content=input_content,
+                total_stages=len(self.agent_system.pipeline_stages),
+                session_id=session_id
+            )
+            self.jobs[job.job_id] = job
+            snapshot = job.to_dict()
+            
+        self._emit_progress(job)
+        self._executor.submit(self._run, job, deadline)
+        return snapshot
+        
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """获取任务状态及已产生的部分结果
+        
+        任务不在本进程时从共享状态读取，轮询请求可以落在任意工作进程上。
+        """
+        with self._lock:
+            self._purge_expired()
+            job = self.jobs.get(job_id)
+            if job:
+                return job.to_dict()
+        return self.state.get("jobs", job_id) if self.state else None
+            
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭后台线程池"""
+        self._executor.shutdown(wait=wait)
+        
+    def _run(self, job: Job, deadline: Deadline = None) -> None:
+        """在后台线程中执行分析"""
+        job.status = "in_progress"
+        job.started_at = datetime.utcnow()
+        self._emit_progress(job)
+        
+        def on_message(message: Dict) -> None:
+            job.partial_results.append(message)
+            self._emit_progress(job)
+            
+        try:
+            result = self.agent_system.process_input(
+                job.input_content,
+                on_message=on_message,
+                session_id=job.room,
+                deadline=deadline
+            )
+            # process_input 返回的是对话历史的快照，不会随其他请求继续增长
+            job.result = result
+            if result.get("success"):
+                job.status = "completed"
+            else:
+                job.status = "failed"
+                job.error = result.get("error")
+        except Exception as e:
+            logging.error(f"执行分析任务 {job.job_id} 时出错: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            self._emit_progress(job)
+            
+    def _emit_progress(self, job: Job) -> None:
+        """通过task_update事件推送任务进度，同时更新共享状态中的任务
+
+        完整结果只在任务结束时写入一次，阶段进度只更新状态和部分结果。
+        """
+        if self.state:
+            self.state.put("jobs", job.job_id, job.to_dict(include_result=job.is_finished))
+        if not self.ws_handler:
+            return
+        self.ws_handler.emit_task_update({
+            "id": job.job_id,
+            "job_id": job.job_id,
+            "status": job.status,
+            "progress": job.progress,
+            "description": job.input_content[:50],
+            "error": job.error
+        }, session_id=job.room)
+        
+    def _purge_expired(self) -> None:
+        """清理超过保留时间的已完成任务，调用方需持有锁"""
+        deadline = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.is_finished and job.finished_at and job.finished_at < deadline
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+            if self.state:
+                self.state.delete("jobs", job_id)
@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from string import Formatter
+from typing import Callable, Dict, List
+import time
+
+class PipelineStage:
+    """流水线中的一个阶段，由某个Agent根据其依赖阶段的输出生成回复"""
+
+    def __init__(
+        self,
+        name: str,
+        agent_name: str,
+        prompt_template: str,
+        depends_on: List[str] = None,
+        optional: bool = False
+    ):
+        """初始化流水线阶段
+
+        Args:
+            name: 阶段名称，在提示词模板中以 {name} 引用该阶段的输出
+            agent_name: 发送消息时使用的代理名称
+            prompt_template: 提示词模板，可引用 {input} 与依赖阶段的输出
+            depends_on: 依赖的阶段名称列表
+            optional: 是否为可选阶段，时间预算不足时跳过，依赖它的阶段使用占位说明
+        """
+        self.name = name
+        self.agent_name = agent_name
+        self.prompt_template = prompt_template
+        self.depends_on = depends_on or []
+        self.optional = optional
+
+        # 模板只能引用用户输入和已声明的依赖，避免读取尚未完成的阶段
+        fields = {field for _, field, _, _ in Formatter().parse(prompt_template) if field}
+        undeclared = fields - set(self.depends_on) - {"input"}
+        if undeclared:
+            raise ValueError(f"阶段 {name} 的提示词引用了未声明的依赖: {', '.join(sorted(undeclared))}")
+
+    def build_prompt(self, input_content: str, outputs: Dict[str, str]) -> str:
+        """根据用户输入和依赖阶段的输出构造提示词"""
+        return self.prompt_template.format(
+            input=input_content,
+            **{name: outputs[name] for name in self.depends_on}
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "agent_name": self.agent_name,
+            "depends_on": self.depends_on,
+            "optional": self.optional
+        }
+
+class PipelineExecutor:
+    """按依赖关系执行流水线，每个阶段在其依赖全部完成后立即开始"""
+
+    def __init__(self, stages: List[PipelineStage], max_workers: int = 4):
+        """初始化执行器
+
+        Args:
+            stages: 流水线阶段列表
+            max_workers: 同时执行的最大阶段数
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        self.order = self._topological_order(stages)
+        self.timings: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _topological_order(stages: List[PipelineStage]) -> List[str]:
+        """校验依赖并返回拓扑顺序，存在未知依赖或环时抛出异常"""
+        names = {stage.name for stage in stages}
+        if len(names) != len(stages):
+            raise ValueError("流水线中存在重复的阶段名称")
+
+        pending = {}
+        for stage in stages:
+            unknown = set(stage.depends_on) - names
+            if unknown:
+                raise ValueError(f"阶段 {stage.name} 依赖了不存在的阶段: {', '.join(sorted(unknown))}")
+            pending[stage.name] = set(stage.depends_on)
+
+        order = []
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"流水线存在循环依赖: {', '.join(sorted(pending))}")
+            for name in ready:
+                order.append(name)
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    def run(self, run_stage: Callable[[PipelineStage, Dict[str, str]], str]) -> Dict:
+        """执行流水线
+
+        Args:
+            run_stage: 执行单个阶段的函数，参数为阶段和已完成阶段的输出
+
+        Returns:
+            Dict: 包含各阶段输出、耗时、总耗时和关键路径耗时的字典
+        """
+        outputs: Dict[str, str] = {}
+        remaining = {name: set(self.stages[name].depends_on) for name in self.order}
+        self.timings = {}
+        start = time.perf_counter()
+
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        def execute(stage: PipelineStage) -> str:
+            self.timings[stage.name]["start_ms"] = elapsed_ms()
+            return run_stage(stage, dict(outputs))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as pool:
+            running = {}
+
+            def submit_ready():
+                for name in [n for n, deps in remaining.items() if not deps]:
+                    del remaining[name]
+                    stage = self.stages[name]
+                    self.timings[name] = {
+                        "stage": name,
+                        "agent": stage.agent_name,
+                        "depends_on": stage.depends_on,
+                        "ready_ms": elapsed_ms()
+                    }
+                    running[pool.submit(execute, stage)] = name
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    timing = self.timings[name]
+                    timing["end_ms"] = elapsed_ms()
+                    timing["duration_ms"] = round(timing["end_ms"] - timing.get("start_ms", timing["ready_ms"]), 1)
+
+                    error = future.exception()
+                    if error:
+                        # 不再调度新阶段，等待已开始的阶段结束后抛出
+                        timing["error"] = str(error)
+                        remaining.clear()
+                        wait(running)
+                        raise error
+
+                    outputs[name] = future.result()
+                    for deps in remaining.values():
+                        deps.discard(name)
+                submit_ready()
+
+        return {
+            "outputs": outputs,
+            "stage_timings": [self.timings[name] for name in self.order],
+            "total_ms": elapsed_ms(),
+            "critical_path_ms": self._critical_path_ms()
+        }
+
+    def _critical_path_ms(self) -> float:
+        """按各阶段实际耗时计算依赖图上的最长路径"""
+        finish: Dict[str, float] = {}
+        for name in self.order:
+            stage = self.stages[name]
+            earliest = max((finish[dep] for dep in stage.depends_on), default=0.0)
+            finish[name] = earliest + self.timings[name].get("duration_ms", 0.0)
+        return round(max(finish.values(), default=0.0), 1)
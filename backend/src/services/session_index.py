@@ -0,0 +1,90 @@
+from bisect import bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+import threading
+
+# 排序键：(-最后活跃时间戳, 会话ID)，按最后活跃时间倒序，时间相同时按会话ID排序
+SortKey = Tuple[float, str]
+
+class SessionIndex:
+    """会话二级索引
+
+    按归档状态分别维护以最后活跃时间倒序排列的有序列表，
+    分页时用二分查找定位游标，不需要遍历全部会话。
+    """
+
+    def __init__(self):
+        self._keys: Dict[str, Tuple[SortKey, bool]] = {}
+        # None 为全部会话，True/False 为按归档状态筛选
+        self._lists: Dict[Optional[bool], List[SortKey]] = {None: [], True: [], False: []}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def count(self, archived: Optional[bool] = None) -> int:
+        """按归档状态统计会话数，为空时统计全部会话"""
+        with self._lock:
+            return len(self._lists[archived])
+
+    def update(self, session_id: str, last_active: float, is_archived: bool) -> None:
+        """添加会话或更新会话的排序位置"""
+        key = (-last_active, session_id)
+        with self._lock:
+            old = self._keys.get(session_id)
+            if old == (key, is_archived):
+                return
+            if old:
+                self._remove(session_id, *old)
+            self._keys[session_id] = (key, is_archived)
+            insort(self._lists[None], key)
+            insort(self._lists[is_archived], key)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            old = self._keys.pop(session_id, None)
+            if old:
+                self._remove(session_id, *old)
+
+    def page(
+        self,
+        archived: Optional[bool] = None,
+        limit: int = None,
+        cursor: str = None
+    ) -> Tuple[List[str], Optional[str]]:
+        """按最后活跃时间倒序分页
+
+        Args:
+            archived: 按归档状态筛选，为空时返回全部会话
+            limit: 每页会话数，为空时返回游标之后的全部会话
+            cursor: 上一页返回的游标
+
+        Returns:
+            Tuple[List[str], Optional[str]]: 当前页的会话ID和下一页的游标
+        """
+        with self._lock:
+            keys = self._lists[archived]
+            start = bisect_right(keys, self._decode_cursor(cursor)) if cursor else 0
+            end = min(start + limit, len(keys)) if limit else len(keys)
+            page = keys[start:end]
+        next_cursor = self._encode_cursor(page[-1]) if page and end < len(keys) else None
+        return [session_id for _, session_id in page], next_cursor
+
+    def _remove(self, session_id: str, key: SortKey, is_archived: bool) -> None:
+        """从有序列表中删除，调用方需持有锁"""
+        for archived in (None, is_archived):
+            keys = self._lists[archived]
+            index = bisect_right(keys, key) - 1
+            if index >= 0 and keys[index] == key:
+                del keys[index]
+
+    @staticmethod
+    def _encode_cursor(key: SortKey) -> str:
+        return f"{-key[0]!r}:{key[1]}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> SortKey:
+        try:
+            timestamp, session_id = cursor.split(":", 1)
+            return (-float(timestamp), session_id)
+        except ValueError:
+            raise ValueError(f"无效的分页游标: {cursor}")
@@ -0,0 +1,133 @@
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import threading
+
+class TaskGraph:
+    """任务依赖图
+
+    同时维护正向（依赖）和反向（被依赖）邻接表，以及每个任务尚未完成的依赖数，
+    依赖全部完成的待执行任务保存在就绪集合中，任务状态变化时只更新相邻任务。
+    """
+
+    def __init__(self, on_ready: Optional[Callable[[str], None]] = None):
+        """初始化依赖图
+
+        Args:
+            on_ready: 任务进入就绪集合时的回调，参数为任务ID，在持有图的锁时调用
+        """
+        self.on_ready = on_ready
+        self._dependencies: Dict[str, Set[str]] = {}
+        self._dependents: Dict[str, Set[str]] = {}
+        self._status: Dict[str, str] = {}
+        self._unfinished: Dict[str, int] = {}
+        self._ready: Set[str] = set()
+        self._lock = threading.RLock()
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._status
+
+    def add_task(self, task_id: str, dependencies: Iterable[str] = (), status: str = "pending") -> None:
+        """添加任务，依赖的任务必须已经存在"""
+        dependencies = set(dependencies or ())
+        with self._lock:
+            if task_id in self._status:
+                raise ValueError(f"任务已存在: {task_id}")
+            if task_id in dependencies:
+                raise ValueError(f"任务不能依赖自身: {task_id}")
+            missing = [dep for dep in dependencies if dep not in self._status]
+            if missing:
+                raise ValueError(f"依赖的任务不存在: {', '.join(sorted(missing))}")
+
+            self._dependencies[task_id] = dependencies
+            self._dependents[task_id] = set()
+            self._status[task_id] = status
+            self._unfinished[task_id] = sum(1 for dep in dependencies if self._status[dep] != "completed")
+            for dep in dependencies:
+                self._dependents[dep].add(task_id)
+            self._update_ready(task_id)
+
+    def add_dependency(self, task_id: str, dependency_id: str) -> None:
+        """为已有任务添加依赖，形成环时拒绝"""
+        with self._lock:
+            for tid in (task_id, dependency_id):
+                if tid not in self._status:
+                    raise ValueError(f"任务不存在: {tid}")
+            if dependency_id in self._dependencies[task_id]:
+                return
+            if self._reaches(dependency_id, task_id):
+                raise ValueError(f"添加依赖会形成环: {task_id} -> {dependency_id}")
+
+            self._dependencies[task_id].add(dependency_id)
+            self._dependents[dependency_id].add(task_id)
+            if self._status[dependency_id] != "completed":
+                self._unfinished[task_id] += 1
+            self._update_ready(task_id)
+
+    def set_status(self, task_id: str, status: str) -> None:
+        """更新任务状态，任务完成或重新打开时调整其后继任务的就绪状态"""
+        with self._lock:
+            old_status = self._status[task_id]
+            self._status[task_id] = status
+            was_completed = old_status == "completed"
+            is_completed = status == "completed"
+            if was_completed != is_completed:
+                delta = -1 if is_completed else 1
+                for dependent in self._dependents[task_id]:
+                    self._unfinished[dependent] += delta
+                    self._update_ready(dependent)
+            self._update_ready(task_id)
+
+    def dependencies(self, task_id: str) -> List[str]:
+        with self._lock:
+            return list(self._dependencies[task_id])
+
+    def dependents(self, task_id: str) -> List[str]:
+        with self._lock:
+            return list(self._dependents[task_id])
+
+    def ready(self) -> List[str]:
+        """依赖已全部完成的待执行任务"""
+        with self._lock:
+            return list(self._ready)
+
+    def is_ready(self, task_id: str) -> bool:
+        return task_id in self._ready
+
+    def topological_order(self) -> List[str]:
+        """按依赖关系排序，被依赖的任务排在前面"""
+        with self._lock:
+            in_degree = {task_id: len(deps) for task_id, deps in self._dependencies.items()}
+            queue = deque(task_id for task_id, degree in in_degree.items() if degree == 0)
+            order = []
+            while queue:
+                task_id = queue.popleft()
+                order.append(task_id)
+                for dependent in self._dependents[task_id]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        queue.append(dependent)
+            return order
+
+    def _update_ready(self, task_id: str) -> None:
+        """调用方需持有锁"""
+        if self._status[task_id] == "pending" and self._unfinished[task_id] == 0:
+            if task_id not in self._ready:
+                self._ready.add(task_id)
+                if self.on_ready:
+                    self.on_ready(task_id)
+        else:
+            self._ready.discard(task_id)
+
+    def _reaches(self, start: str, target: str) -> bool:
+        """沿依赖方向判断 start 是否（间接）依赖 target，调用方需持有锁"""
+        stack = [start]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current == target:
+                return True
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(self._dependencies[current])
+        return False
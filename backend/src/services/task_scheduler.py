@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from config import Config
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+class TaskScheduler:
+    """按优先级调度并执行任务
+
+    依赖全部完成的任务进入优先队列，按 (优先级, 截止时间) 排序：
+    priority 数值越大越先执行，优先级相同时截止时间早的先执行，没有截止时间的排在最后。
+    任务交给被分配的Agent在有界线程池中执行，完成后依赖它的任务自动进入队列。
+    """
+
+    def __init__(self, agent_system, ws_handler=None, max_workers: int = None):
+        """初始化调度器
+
+        Args:
+            agent_system: 保存任务和依赖图的MultiAgentSystem
+            ws_handler: WebSocket处理器，用于推送task_update事件
+            max_workers: 同时执行的最大任务数
+        """
+        self.agent_system = agent_system
+        self.ws_handler = ws_handler
+        self.max_workers = max_workers or Config.TASK_SCHEDULER_WORKERS
+        self._queue: List[tuple] = []
+        self._queued = set()
+        self._seq = itertools.count()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task-scheduler")
+        # 任务ID -> 入队、开始、结束时间及等待和执行耗时，只保留最近的 TASK_TIMINGS_MAX 个任务
+        self.timings: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {"completed": 0, "failed": 0}
+
+        agent_system.task_graph.on_ready = self.enqueue
+        # 上次执行中断的任务重新置为待执行，恢复为就绪时通过 on_ready 入队
+        agent_system.recover_stale_tasks()
+        for task_id in agent_system.task_graph.ready():
+            self.enqueue(task_id)
+
+    def enqueue(self, task_id: str) -> None:
+        """把就绪任务放入优先队列"""
+        task = self.agent_system.tasks.get(task_id)
+        if task is None:
+            return
+        deadline = task.deadline.timestamp() if task.deadline else float('inf')
+        with self._lock:
+            if task_id in self._queued:
+                return
+            self._queued.add(task_id)
+            heapq.heappush(self._queue, (-task.priority, deadline, next(self._seq), task_id))
+            self.timings.pop(task_id, None)
+            self._record_locked(task_id, enqueued_at=time.time())
+        self._dispatch()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """等待队列清空且没有正在执行的任务"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queue and not self._running, timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.agent_system.task_graph.on_ready = None
+        self._executor.shutdown(wait=wait)
+
+    def get_timing(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            timing = self.timings.get(task_id)
+            return dict(timing) if timing else None
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "queued": len(self._queue),
+                "running": self._running,
+                "max_workers": self.max_workers
+            }
+
+    def _dispatch(self) -> None:
+        """在有空闲工作线程时取出优先级最高的任务执行"""
+        while True:
+            with self._lock:
+                if self._running >= self.max_workers or not self._queue:
+                    return
+                _, _, _, task_id = heapq.heappop(self._queue)
+                self._running += 1
+            self._executor.submit(self._run, task_id)
+
+    def _run(self, task_id: str) -> None:
+        started_at = time.time()
+        task = self.agent_system.tasks[task_id]
+        if not self.agent_system.claim_task(task_id):
+            # 已由其他工作进程领取执行
+            with self._idle:
+                self._queued.discard(task_id)
+                self._running -= 1
+                self._idle.notify_all()
+            self._dispatch()
+            return
+        status, error, artifacts = "completed", None, None
+        try:
+            self.agent_system.update_task_status(task_id, "in_progress")
+            self._record(task_id, started_at=started_at)
+            self._emit_update(task_id, "in_progress")
+            result = self.agent_system.execute_task(task_id)
+            artifacts = [{"type": "result", "agent": task.assigned_to, "content": result}]
+        except Exception as e:
+            status, error = "failed", str(e)
+            logging.error(f"任务 {task_id} 执行失败: {error}")
+
+        finished_at = time.time()
+        self._record(task_id, finished_at=finished_at, execution_ms=round((finished_at - started_at) * 1000, 2))
+        with self._lock:
+            self.stats[status] += 1
+            self._queued.discard(task_id)
+        try:
+            # 任务完成时依赖图会把后继任务加入队列
+            self.agent_system.update_task_status(task_id, status, artifacts)
+            self._emit_update(task_id, status, error)
+        finally:
+            with self._idle:
+                self._running -= 1
+                self._idle.notify_all()
+            self._dispatch()
+
+    def _record(self, task_id: str, **values) -> None:
+        with self._lock:
+            self._record_locked(task_id, **values)
+            
+    def _record_locked(self, task_id: str, **values) -> None:
+        """记录任务耗时，超过 TASK_TIMINGS_MAX 时丢弃最早入队的任务，调用方需持有锁"""
+        timing = self.timings.setdefault(task_id, {})
+        timing.update(values)
+        if "started_at" in values and "enqueued_at" in timing:
+            timing["queue_wait_ms"] = round((values["started_at"] - timing["enqueued_at"]) * 1000, 2)
+        while len(self.timings) > Config.TASK_TIMINGS_MAX:
+            self.timings.popitem(last=False)
+
+    def _emit_update(self, task_id: str, status: str, error: str = None) -> None:
+        """通过task_update事件推送任务状态和耗时"""
+        if not self.ws_handler:
+            return
+        task = self.agent_system.tasks[task_id]
+        timing = self.get_timing(task_id) or {}
+        self.ws_handler.emit_task_update({
+            "id": task_id,
+            "task_id": task_id,
+            "title": task.title,
+            "assigned_to": task.assigned_to,
+            "status": status,
+            "priority": task.priority,
+            "queue_wait_ms": timing.get("queue_wait_ms"),
+            "execution_ms": timing.get("execution_ms"),
+            "error": error
+        })
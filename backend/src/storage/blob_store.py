@@ -0,0 +1,223 @@
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Union
+from config import Config
+
+class BlobStore:
+    """按内容寻址的代码内容存储
+
+    内容以 SHA-256 为键去重并用 zlib 压缩；新版本相对父版本只保存按行计算的增量，
+    增量链每隔 snapshot_interval 个版本保存一次完整快照，限制还原时需要回放的增量数；
+    最近读写的内容保存在解压后的 LRU 缓存中。
+    内容按引用计数回收，不再被任何制品版本引用时释放。
+    """
+
+    def __init__(
+        self,
+        snapshot_interval: int = None,
+        cache_size: int = None,
+        compression_level: int = None
+    ):
+        """初始化存储
+
+        Args:
+            snapshot_interval: 增量链的最大长度，达到后保存完整快照
+            cache_size: 解压后内容的 LRU 缓存条目数
+            compression_level: zlib 压缩级别
+        """
+        self.snapshot_interval = snapshot_interval or Config.ARTIFACT_SNAPSHOT_INTERVAL
+        self.cache_size = cache_size if cache_size is not None else Config.ARTIFACT_CONTENT_CACHE_SIZE
+        self.compression_level = compression_level or Config.ARTIFACT_COMPRESSION_LEVEL
+        # 内容哈希 -> (基准哈希, 增量链深度, 压缩数据)，基准哈希为空表示完整快照
+        self._blobs: Dict[str, tuple] = {}
+        # 内容哈希 -> 引用数，包括制品的引用和以它为基准的增量的引用
+        self._refs: Dict[str, int] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "snapshots": 0,
+            "deltas": 0,
+            "dedup_hits": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "collected": 0
+        }
+
+    @staticmethod
+    def hash_content(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def put(self, content: str, base_hash: str = None) -> str:
+        """保存内容并返回内容哈希，每次调用都为该内容增加一个引用
+
+        Args:
+            content: 文件内容
+            base_hash: 父版本的内容哈希，不为空时尝试保存为相对父版本的增量
+        """
+        content_hash = self.hash_content(content)
+        base_content = None
+        with self._lock:
+            if self._retain_existing(content_hash, content):
+                return content_hash
+            base = self._blobs.get(base_hash) if base_hash else None
+            if base and base[1] + 1 < self.snapshot_interval:
+                base_content = self._get_locked(base_hash)
+
+        # 压缩和按行比较耗时较长，在锁外计算，不阻塞其他版本的读写
+        snapshot = self._compress(content)
+        delta = None
+        if base_content is not None:
+            delta = self._compress(json.dumps(self._diff(base_content, content), ensure_ascii=False))
+
+        with self._lock:
+            # 计算期间其他线程可能已保存相同内容
+            if self._retain_existing(content_hash, content):
+                return content_hash
+            blob = (None, 0, snapshot)
+            # 父版本可能在计算期间被回收；增量不比快照小时（例如整个文件被重写）直接保存快照
+            base = self._blobs.get(base_hash) if delta is not None else None
+            if base and base[1] + 1 < self.snapshot_interval and len(delta) < len(snapshot):
+                blob = (base_hash, base[1] + 1, delta)
+                self._refs[base_hash] += 1
+
+            self._blobs[content_hash] = blob
+            self._refs[content_hash] = 1
+            self.stats["deltas" if blob[0] else "snapshots"] += 1
+            self.stats["raw_bytes"] += len(content.encode('utf-8'))
+            self.stats["stored_bytes"] += len(blob[2])
+            self._cache_put(content_hash, content)
+            return content_hash
+
+    def release(self, content_hash: str) -> None:
+        """释放 put 增加的一个引用
+
+        没有引用的内容被回收；作为其他增量基准的内容由依赖它的增量持有引用，
+        回收增量时一并释放它的基准。
+        """
+        with self._lock:
+            current = content_hash
+            while current is not None and current in self._refs:
+                self._refs[current] -= 1
+                if self._refs[current] > 0:
+                    break
+                del self._refs[current]
+                self._cache.pop(current, None)
+                current = self._blobs.pop(current)[0]
+                self.stats["collected"] += 1
+
+    def get(self, content_hash: str) -> str:
+        """按内容哈希读取内容"""
+        with self._lock:
+            return self._get_locked(content_hash)
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._blobs
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            raw = self.stats["raw_bytes"]
+            return {
+                **self.stats,
+                "blobs": len(self._blobs),
+                "cache_size": len(self._cache),
+                "compression_ratio": round(self.stats["stored_bytes"] / raw, 4) if raw else 0.0
+            }
+
+    def _retain_existing(self, content_hash: str, content: str) -> bool:
+        """内容已保存时增加引用并返回 True，调用方需持有锁"""
+        if content_hash not in self._blobs:
+            return False
+        self._refs[content_hash] += 1
+        self.stats["dedup_hits"] += 1
+        self._cache_put(content_hash, content)
+        return True
+
+    def _get_locked(self, content_hash: str) -> str:
+        """读取内容，调用方需持有锁"""
+        cached = self._cache.get(content_hash)
+        if cached is not None:
+            self._cache.move_to_end(content_hash)
+            self.stats["cache_hits"] += 1
+            return cached
+        self.stats["cache_misses"] += 1
+
+        if content_hash not in self._blobs:
+            raise KeyError(f"内容不存在: {content_hash}")
+
+        # 沿增量链回溯到完整快照或已缓存的版本，再依次回放增量
+        chain: List[str] = []
+        current = content_hash
+        content: Optional[str] = None
+        while True:
+            if current != content_hash and current in self._cache:
+                content = self._cache[current]
+                break
+            base_hash, _, data = self._blobs[current]
+            if base_hash is None:
+                content = self._decompress(data)
+                break
+            chain.append(current)
+            current = base_hash
+
+        for blob_hash in reversed(chain):
+            content = self._patch(content, json.loads(self._decompress(self._blobs[blob_hash][2])))
+        self._cache_put(content_hash, content)
+        return content
+
+    def _cache_put(self, content_hash: str, content: str) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[content_hash] = content
+        self._cache.move_to_end(content_hash)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _compress(self, text: str) -> bytes:
+        return zlib.compress(text.encode('utf-8'), self.compression_level)
+
+    @staticmethod
+    def _decompress(data: bytes) -> str:
+        return zlib.decompress(data).decode('utf-8')
+
+    @staticmethod
+    def _diff(base: str, content: str) -> List[Union[List[int], str]]:
+        """按行计算增量：[起始行, 结束行] 表示复制父版本的行，字符串表示新增的内容"""
+        base_lines = base.splitlines(keepends=True)
+        lines = content.splitlines(keepends=True)
+        ops: List[Union[List[int], str]] = []
+        matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append([i1, i2])
+            elif j2 > j1:
+                ops.append(''.join(lines[j1:j2]))
+        return ops
+
+    @staticmethod
+    def _patch(base: str, ops: List[Union[List[int], str]]) -> str:
+        base_lines = base.splitlines(keepends=True)
+        parts = []
+        for op in ops:
+            if isinstance(op, str):
+                parts.append(op)
+            else:
+                parts.extend(base_lines[op[0]:op[1]])
+        return ''.join(parts)
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """获取进程内共享的内容存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore()
+    return _store
@@ -0,0 +1,125 @@
+import threading
+from typing import Optional
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Index, Integer, JSON, MetaData,
+    String, Table, Text, create_engine, event, inspect, text
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from config import Config
+from utils.async_mode import is_cooperative
+
+metadata = MetaData()
+
+chat_sessions = Table(
+    "chat_sessions", metadata,
+    Column("session_id", String(64), primary_key=True),
+    Column("title", String(255), nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("is_archived", Boolean, nullable=False, default=False, index=True),
+    Column("summary", Text, nullable=False, default=""),
+    Column("summarized_count", Integer, nullable=False, default=0),
+    Column("last_active_at", DateTime, index=True),
+    Column("version", Integer)
+)
+
+chat_messages = Table(
+    "chat_messages", metadata,
+    Column("message_id", String(64), primary_key=True),
+    Column("session_id", String(64), nullable=False, index=True),
+    Column("position", Integer, nullable=False),
+    Column("role", String(32), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("meta", JSON, nullable=False, default=dict),
+    Index("ix_chat_messages_session_position", "session_id", "position")
+)
+
+tasks = Table(
+    "tasks", metadata,
+    Column("task_id", String(64), primary_key=True),
+    Column("title", String(255), nullable=False),
+    Column("description", Text, nullable=False),
+    Column("assigned_to", String(64), nullable=False, index=True),
+    Column("status", String(32), nullable=False, index=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("deadline", DateTime),
+    Column("priority", Integer, nullable=False, default=1),
+    Column("dependencies", JSON, nullable=False, default=list),
+    Column("artifacts", JSON, nullable=False, default=list)
+)
+
+code_artifacts = Table(
+    "code_artifacts", metadata,
+    Column("artifact_id", String(64), primary_key=True),
+    Column("file_path", String(1024), nullable=False, index=True),
+    Column("content", Text, nullable=False),
+    Column("language", String(64)),
+    Column("created_at", DateTime, nullable=False, index=True),
+    Column("created_by", String(64)),
+    Column("version", String(32), nullable=False),
+    Column("parent_version", String(32)),
+    Column("commit_message", Text),
+    Column("meta", JSON, nullable=False, default=dict),
+    Index("ix_code_artifacts_file_path_created_at", "file_path", "created_at")
+)
+
+conversation_history = Table(
+    "conversation_history", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("message_id", String(64)),
+    Column("role", String(32), nullable=False),
+    Column("agent", String(64)),
+    Column("content", Text, nullable=False),
+    Column("created_at", BigInteger, nullable=False, index=True),  # 毫秒时间戳
+    Column("session_id", String(64), index=True)
+)
+
+def create_db_engine(url: str = None) -> Engine:
+    """创建数据库引擎并建表
+
+    SQLite 使用 WAL 模式和 synchronous=NORMAL，写入批次提交时不必每次都等待 fsync。
+    """
+    url = url or Config.SQLALCHEMY_DATABASE_URI
+    options = {}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if is_cooperative():
+            # 协程模式下 SQLite 读写转到原生线程执行，不使用连接池，避免在原生线程中等待协程锁
+            options["poolclass"] = NullPool
+    engine = create_engine(url, **options)
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+    metadata.create_all(engine)
+    _add_missing_columns(engine)
+    return engine
+
+def _add_missing_columns(engine: Engine) -> None:
+    """为已有的表补上后来新增的可空列，旧数据库不需要手动迁移"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> Engine:
+    """获取进程内共享的数据库引擎"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+    return _engine
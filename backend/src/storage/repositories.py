@@ -0,0 +1,210 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from models.agent import Task, CodeArtifact
+from models.chat import ChatMessage, ChatSession
+from storage.database import (
+    chat_sessions, chat_messages, tasks, code_artifacts, conversation_history, get_engine
+)
+from storage.write_behind import WriteBehindQueue, get_write_queue
+from config import Config
+from utils.async_mode import run_blocking
+
+class ChatRepository:
+    """聊天会话与消息的持久化，写操作经由后台批量写入队列"""
+    
+    def __init__(self, engine: Engine = None, write_queue: WriteBehindQueue = None):
+        self.engine = engine or get_engine()
+        self.write_queue = write_queue or get_write_queue(self.engine)
+        
+    def save_session(self, session: ChatSession) -> None:
+        self.write_queue.upsert(chat_sessions, {
+            "session_id": session.session_id,
+            "title": session.title,
+            "created_at": session.created_at,
+            "is_archived": session.is_archived,
+            "summary": session.summary,
+            "summarized_count": session.summarized_count,
+            "last_active_at": session.last_active_at,
+            "version": session.version
+        })
+        
+    def save_message(self, message: ChatMessage, position: int) -> None:
+        # 消息不能丢失，否则位置出现空缺，按位置加载的历史会错位
+        self.write_queue.upsert(chat_messages, {
+            "message_id": message.message_id,
+            "session_id": message.session_id,
+            "position": position,
+            "role": message.role,
+            "content": message.content,
+            "created_at": message.timestamp,
+            "meta": message.metadata
+        }, durable=True)
+        
+    def clear_messages(self, session_id: str) -> None:
+        self.write_queue.delete(chat_messages, durable=True, session_id=session_id)
+        
+    def delete_session(self, session_id: str) -> None:
+        self.write_queue.delete(chat_messages, durable=True, session_id=session_id)
+        self.write_queue.delete(chat_sessions, session_id=session_id)
+        
+    def load_sessions(self) -> Dict[str, ChatSession]:
+        """加载全部会话的元数据，消息通过 load_messages 按需加载"""
+        sessions: Dict[str, ChatSession] = {}
+        with self.engine.connect() as conn:
+            # 下一条消息的位置按已保存的最大位置计算，与 load_messages 读取的位置一致
+            counts = dict(conn.execute(
+                select(chat_messages.c.session_id, func.max(chat_messages.c.position) + 1)
+                .group_by(chat_messages.c.session_id)
+            ).fetchall())
+            for row in conn.execute(select(chat_sessions).order_by(chat_sessions.c.created_at)):
+                session = ChatSession(
+                    session_id=row.session_id,
+                    title=row.title,
+                    created_at=row.created_at
+                )
+                session.is_archived = row.is_archived
+                session.summary = row.summary
+                session.summarized_count = row.summarized_count
+                # 旧数据库没有这两列时为空，沿用创建时间和初始版本
+                session.last_active_at = row.last_active_at or row.created_at
+                session.version = row.version or 0
+                session.message_offset = counts.get(row.session_id, 0)
+                session.loaded = False
+                sessions[session.session_id] = session
+        return sessions
+        
+    def load_messages(self, session_id: str, start: int = 0, end: int = None) -> List[ChatMessage]:
+        """按位置加载会话中 [start, end) 范围的消息"""
+        # 先等待队列中的写操作提交，避免读不到刚写入的消息
+        self.write_queue.flush(Config.PERSISTENCE_FLUSH_TIMEOUT)
+        query = select(chat_messages).where(
+            chat_messages.c.session_id == session_id,
+            chat_messages.c.position >= start
+        )
+        if end is not None:
+            query = query.where(chat_messages.c.position < end)
+        rows = run_blocking(self._fetch_all, query.order_by(chat_messages.c.position))
+        return [
+            ChatMessage(
+                message_id=row.message_id,
+                role=row.role,
+                content=row.content,
+                session_id=row.session_id,
+                timestamp=row.created_at,
+                metadata=row.meta
+            )
+            for row in rows
+        ]
+
+    def _fetch_all(self, query) -> list:
+        with self.engine.connect() as conn:
+            return conn.execute(query).fetchall()
+
+class AgentRepository:
+    """任务、代码制品和Agent对话历史的持久化"""
+    
+    def __init__(self, engine: Engine = None, write_queue: WriteBehindQueue = None):
+        self.engine = engine or get_engine()
+        self.write_queue = write_queue or get_write_queue(self.engine)
+        
+    def save_task(self, task: Task) -> None:
+        self.write_queue.upsert(tasks, {
+            "task_id": task.task_id,
+            "title": task.title,
+            "description": task.description,
+            "assigned_to": task.assigned_to,
+            "status": task.status,
+            "created_at": task.created_at,
+            "deadline": task.deadline,
+            "priority": task.priority,
+            "dependencies": task.dependencies,
+            "artifacts": task.artifacts
+        })
+        
+    def save_artifact(self, artifact: CodeArtifact) -> None:
+        self.write_queue.upsert(code_artifacts, {
+            "artifact_id": artifact.artifact_id,
+            "file_path": artifact.file_path,
+            "content": artifact.content,
+            "language": artifact.language,
+            "created_at": artifact.created_at,
+            "created_by": artifact.created_by,
+            "version": artifact.version,
+            "parent_version": artifact.parent_version,
+            "commit_message": artifact.commit_message,
+            "meta": artifact.metadata
+        })
+        
+    def append_conversation(self, message: Dict) -> None:
+        self.write_queue.insert(conversation_history, {
+            "message_id": message.get("id"),
+            "role": message["role"],
+            "agent": message.get("agent"),
+            "content": message["content"],
+            "created_at": message.get("timestamp", 0),
+            "session_id": message.get("session_id")
+        })
+        
+    def load_tasks(self) -> Dict[str, Task]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(tasks).order_by(tasks.c.created_at)).fetchall()
+        return {
+            row.task_id: Task(
+                task_id=row.task_id,
+                title=row.title,
+                description=row.description,
+                assigned_to=row.assigned_to,
+                status=row.status,
+                created_at=row.created_at,
+                deadline=row.deadline,
+                priority=row.priority,
+                dependencies=row.dependencies,
+                artifacts=row.artifacts
+            )
+            for row in rows
+        }
+        
+    def load_artifacts(self) -> Dict[str, CodeArtifact]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(code_artifacts).order_by(code_artifacts.c.created_at)).fetchall()
+        artifacts: Dict[str, CodeArtifact] = {}
+        # 按创建顺序加载，新版本相对父版本重新保存为增量
+        hashes: Dict[tuple, str] = {}
+        for row in rows:
+            artifact = CodeArtifact(
+                artifact_id=row.artifact_id,
+                file_path=row.file_path,
+                content=row.content,
+                language=row.language,
+                created_at=row.created_at,
+                created_by=row.created_by,
+                version=row.version,
+                parent_version=row.parent_version,
+                commit_message=row.commit_message,
+                metadata=row.meta,
+                base_hash=hashes.get((row.file_path, row.parent_version))
+            )
+            hashes[(row.file_path, row.version)] = artifact.content_hash
+            artifacts[artifact.artifact_id] = artifact
+        return artifacts
+        
+    def load_conversation(self, limit: int = None) -> List[Dict]:
+        """加载最近的对话历史，按时间正序返回"""
+        query = select(conversation_history).order_by(conversation_history.c.id.desc())
+        if limit:
+            query = query.limit(limit)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        history = []
+        for row in reversed(rows):
+            message = {"role": row.role, "content": row.content, "timestamp": row.created_at}
+            if row.message_id:
+                message["id"] = row.message_id
+            if row.agent:
+                message["agent"] = row.agent
+            if row.session_id:
+                message["session_id"] = row.session_id
+            history.append(message)
+        return history
@@ -0,0 +1,531 @@
+import functools
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from uuid import uuid4
+from config import Config
+from utils.async_mode import run_blocking
+
+class StateBackend:
+    """多个工作进程共享的状态存储接口
+
+    以 (namespace, key) 保存 JSON 文档，另外提供只追加的列表用于保存会话消息，
+    读取时可以只取本地缺少的部分。列表元素的位置从 0 开始且不随裁剪改变，
+    裁剪掉的前缀不再返回。
+    """
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put(self, namespace: str, key: str, value: Dict) -> None:
+        raise NotImplementedError
+
+    def add(self, namespace: str, key: str, value: Dict) -> bool:
+        """键不存在时写入并返回 True，已存在时返回 False，用于多个工作进程之间的抢占"""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def keys(self, namespace: str) -> List[str]:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Dict[str, Dict]:
+        """读取命名空间内的全部文档"""
+        raise NotImplementedError
+
+    def append(self, namespace: str, key: str, item: Dict) -> int:
+        """追加到列表末尾，返回追加后的长度"""
+        raise NotImplementedError
+
+    def get_list(self, namespace: str, key: str, start: int = 0, end: int = None) -> List[Dict]:
+        """读取列表中位置在 [start, end) 范围的元素，end 为空时读到末尾"""
+        raise NotImplementedError
+
+    def list_length(self, namespace: str, key: str) -> int:
+        """追加过的元素总数，即下一个元素的位置，包括已裁剪的元素"""
+        raise NotImplementedError
+
+    def list_start(self, namespace: str, key: str) -> int:
+        """第一个未被裁剪的元素的位置"""
+        raise NotImplementedError
+
+    def trim_list(self, namespace: str, key: str, before: int) -> None:
+        """删除位置在 before 之前的元素，其余元素的位置不变"""
+        raise NotImplementedError
+
+    def delete_list(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+class MemoryStateBackend(StateBackend):
+    """进程内状态存储，只在单进程内共享，主要用于测试"""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, str]] = {}
+        self._lists: Dict[tuple, List[str]] = {}
+        # 列表已裁剪的元素数，即第一个元素的位置
+        self._starts: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        value = self._docs.get(namespace, {}).get(key)
+        return json.loads(value) if value is not None else None
+
+    def put(self, namespace: str, key: str, value: Dict) -> None:
+        # 与其他实现一样保存序列化后的副本，避免调用方修改已保存的数据
+        with self._lock:
+            self._docs.setdefault(namespace, {})[key] = json.dumps(value, ensure_ascii=False)
+
+    def add(self, namespace: str, key: str, value: Dict) -> bool:
+        with self._lock:
+            docs = self._docs.setdefault(namespace, {})
+            if key in docs:
+                return False
+            docs[key] = json.dumps(value, ensure_ascii=False)
+            return True
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._docs.get(namespace, {}).pop(key, None)
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self._docs.get(namespace, {}))
+
+    def items(self, namespace: str) -> Dict[str, Dict]:
+        return {key: json.loads(value) for key, value in list(self._docs.get(namespace, {}).items())}
+
+    def append(self, namespace: str, key: str, item: Dict) -> int:
+        with self._lock:
+            items = self._lists.setdefault((namespace, key), [])
+            items.append(json.dumps(item, ensure_ascii=False))
+            return self._starts.get((namespace, key), 0) + len(items)
+
+    def get_list(self, namespace: str, key: str, start: int = 0, end: int = None) -> List[Dict]:
+        with self._lock:
+            offset = self._starts.get((namespace, key), 0)
+            items = self._lists.get((namespace, key), [])
+            selected = items[max(start - offset, 0):None if end is None else max(end - offset, 0)]
+        return [json.loads(item) for item in selected]
+
+    def list_length(self, namespace: str, key: str) -> int:
+        with self._lock:
+            return self._starts.get((namespace, key), 0) + len(self._lists.get((namespace, key), []))
+
+    def list_start(self, namespace: str, key: str) -> int:
+        return self._starts.get((namespace, key), 0)
+
+    def trim_list(self, namespace: str, key: str, before: int) -> None:
+        with self._lock:
+            offset = self._starts.get((namespace, key), 0)
+            items = self._lists.get((namespace, key), [])
+            count = min(max(before - offset, 0), len(items))
+            if count:
+                del items[:count]
+                self._starts[(namespace, key)] = offset + count
+
+    def delete_list(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._lists.pop((namespace, key), None)
+            self._starts.pop((namespace, key), None)
+
+def _offloaded(method):
+    """sqlite3 的读写不会让出协程，协程模式下转到原生线程执行"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return run_blocking(method, self, *args, **kwargs)
+    return wrapper
+
+class SQLiteStateBackend(StateBackend):
+    """基于 SQLite 的状态存储，适用于同一台机器上的多个工作进程
+
+    列表元素保存自己的位置，state_list_meta 记录每个列表的长度和起始位置，
+    追加和按位置读取都只走索引，不随列表变长而变慢。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_docs ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_lists ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, value TEXT NOT NULL, position INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_list_meta ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, length INTEGER NOT NULL, start INTEGER NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._migrate_lists(conn)
+        conn.execute("DROP INDEX IF EXISTS idx_state_lists_key")
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_state_lists_position ON state_lists (namespace, key, position)"
+        )
+        conn.commit()
+
+    @staticmethod
+    def _migrate_lists(conn: sqlite3.Connection) -> None:
+        """为旧版本创建的列表补上位置和长度记录"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(state_lists)")}
+        if "position" in columns:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("ALTER TABLE state_lists ADD COLUMN position INTEGER")
+            conn.execute(
+                "UPDATE state_lists SET position = (SELECT COUNT(*) FROM state_lists AS earlier "
+                "WHERE earlier.namespace = state_lists.namespace AND earlier.key = state_lists.key "
+                "AND earlier.id < state_lists.id) WHERE position IS NULL"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO state_list_meta (namespace, key, length, start) "
+                "SELECT namespace, key, MAX(position) + 1, MIN(position) FROM state_lists GROUP BY namespace, key"
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @_offloaded
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT value FROM state_docs WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @_offloaded
+    def put(self, namespace: str, key: str, value: Dict) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO state_docs (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False))
+        )
+
+    @_offloaded
+    def add(self, namespace: str, key: str, value: Dict) -> bool:
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO state_docs (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False))
+        )
+        return cursor.rowcount == 1
+
+    @_offloaded
+    def delete(self, namespace: str, key: str) -> None:
+        self._conn().execute("DELETE FROM state_docs WHERE namespace = ? AND key = ?", (namespace, key))
+
+    @_offloaded
+    def keys(self, namespace: str) -> List[str]:
+        rows = self._conn().execute("SELECT key FROM state_docs WHERE namespace = ?", (namespace,))
+        return [row[0] for row in rows]
+
+    @_offloaded
+    def items(self, namespace: str) -> Dict[str, Dict]:
+        rows = self._conn().execute("SELECT key, value FROM state_docs WHERE namespace = ?", (namespace,))
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    @_offloaded
+    def append(self, namespace: str, key: str, item: Dict) -> int:
+        conn = self._conn()
+        # 写锁保证分配的位置和返回的长度与本次追加对应
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            length = conn.execute(
+                "INSERT INTO state_list_meta (namespace, key, length, start) VALUES (?, ?, 1, 0) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET length = length + 1 RETURNING length",
+                (namespace, key)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO state_lists (namespace, key, value, position) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(item, ensure_ascii=False), length - 1)
+            )
+            conn.execute("COMMIT")
+            return length
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @_offloaded
+    def get_list(self, namespace: str, key: str, start: int = 0, end: int = None) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT value FROM state_lists WHERE namespace = ? AND key = ? AND position >= ? AND position < ? "
+            "ORDER BY position",
+            (namespace, key, start, end if end is not None else 2 ** 62)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def _meta(self, namespace: str, key: str) -> tuple:
+        row = self._conn().execute(
+            "SELECT length, start FROM state_list_meta WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return row or (0, 0)
+
+    @_offloaded
+    def list_length(self, namespace: str, key: str) -> int:
+        return self._meta(namespace, key)[0]
+
+    @_offloaded
+    def list_start(self, namespace: str, key: str) -> int:
+        return self._meta(namespace, key)[1]
+
+    @_offloaded
+    def trim_list(self, namespace: str, key: str, before: int) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE state_list_meta SET start = MAX(start, MIN(?, length)) WHERE namespace = ? AND key = ?",
+                (before, namespace, key)
+            )
+            conn.execute(
+                "DELETE FROM state_lists WHERE namespace = ? AND key = ? AND position < ?", (namespace, key, before)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @_offloaded
+    def delete_list(self, namespace: str, key: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM state_lists WHERE namespace = ? AND key = ?", (namespace, key))
+            conn.execute("DELETE FROM state_list_meta WHERE namespace = ? AND key = ?", (namespace, key))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+class RedisStateBackend(StateBackend):
+    """基于 Redis 协议的状态存储，适用于多台机器上的工作进程
+
+    每个命名空间对应一个哈希表，列表使用 Redis 列表保存，
+    另用一个计数键记录列表已裁剪的元素数，把位置换算为 Redis 列表的下标。
+    """
+
+    def __init__(self, url: str = None, client=None, prefix: str = "ai_code_team:"):
+        """初始化存储
+
+        Args:
+            url: Redis 地址，未传入 client 时使用
+            client: 已创建的 Redis 客户端，测试时可传入 fakeredis 客户端
+            prefix: 所有键的前缀
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise Exception("使用 Redis 状态存储需要安装 redis: pip install redis")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+
+    def _hash(self, namespace: str) -> str:
+        return f"{self.prefix}{namespace}"
+
+    def _list(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    def _start(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}:start"
+
+    def _watched(self, keys: List[str], action):
+        """在 WATCH 保护下执行 action(pipe)，期间被其他客户端修改时重试"""
+        from redis.exceptions import WatchError
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(*keys)
+                    return action(pipe)
+                except WatchError:
+                    continue
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        value = self.client.hget(self._hash(namespace), key)
+        return json.loads(value) if value is not None else None
+
+    def put(self, namespace: str, key: str, value: Dict) -> None:
+        self.client.hset(self._hash(namespace), key, json.dumps(value, ensure_ascii=False))
+
+    def add(self, namespace: str, key: str, value: Dict) -> bool:
+        return bool(self.client.hsetnx(self._hash(namespace), key, json.dumps(value, ensure_ascii=False)))
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.client.hdel(self._hash(namespace), key)
+
+    def keys(self, namespace: str) -> List[str]:
+        return [self._decode(key) for key in self.client.hkeys(self._hash(namespace))]
+
+    def items(self, namespace: str) -> Dict[str, Dict]:
+        return {
+            self._decode(key): json.loads(value)
+            for key, value in self.client.hgetall(self._hash(namespace)).items()
+        }
+
+    def append(self, namespace: str, key: str, item: Dict) -> int:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(self._list(namespace, key), json.dumps(item, ensure_ascii=False))
+        pipe.get(self._start(namespace, key))
+        length, offset = pipe.execute()
+        return length + int(offset or 0)
+
+    def get_list(self, namespace: str, key: str, start: int = 0, end: int = None) -> List[Dict]:
+        if end is not None and end <= start:
+            return []
+
+        def read(pipe):
+            offset = int(pipe.get(self._start(namespace, key)) or 0)
+            if end is not None and end <= offset:
+                return []
+            pipe.multi()
+            pipe.lrange(self._list(namespace, key), max(start - offset, 0), -1 if end is None else end - offset - 1)
+            return pipe.execute()[0]
+
+        items = self._watched([self._start(namespace, key)], read)
+        return [json.loads(item) for item in items]
+
+    def list_length(self, namespace: str, key: str) -> int:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.llen(self._list(namespace, key))
+        pipe.get(self._start(namespace, key))
+        length, offset = pipe.execute()
+        return length + int(offset or 0)
+
+    def list_start(self, namespace: str, key: str) -> int:
+        return int(self.client.get(self._start(namespace, key)) or 0)
+
+    def trim_list(self, namespace: str, key: str, before: int) -> None:
+        def trim(pipe):
+            offset = int(pipe.get(self._start(namespace, key)) or 0)
+            count = min(before - offset, pipe.llen(self._list(namespace, key)))
+            if count <= 0:
+                return
+            pipe.multi()
+            pipe.ltrim(self._list(namespace, key), count, -1)
+            pipe.set(self._start(namespace, key), offset + count)
+            pipe.execute()
+
+        self._watched([self._list(namespace, key), self._start(namespace, key)], trim)
+
+    def delete_list(self, namespace: str, key: str) -> None:
+        self.client.delete(self._list(namespace, key), self._start(namespace, key))
+
+    @staticmethod
+    def _decode(value) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+class ChangeFeed:
+    """命名空间的变更日志
+
+    写入方每次修改文档后记录变更的键，读取方只获取上次读取之后变更过的键，
+    列表查询不必每次读取整个命名空间。
+
+    每个读取方在 READERS 中登记自己读到的位置；写入方每追加
+    CHANGE_FEED_COMPACT_INTERVAL 条清理一次所有读取方都已读过的部分，
+    超过 CHANGE_FEED_READER_TTL 没有读取的读取方不再阻止清理，之后再读取时重新全量同步。
+    """
+
+    NAMESPACE = "changes"
+    READERS = "change_readers"
+
+    def __init__(self, state: StateBackend, namespace: str):
+        self.state = state
+        self.namespace = namespace
+        self._reader = f"{namespace}:{uuid4()}"
+        self._offset: Optional[int] = None
+        self._registered_at = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, key: str) -> None:
+        length = self.state.append(self.NAMESPACE, self.namespace, {"key": key})
+        interval = Config.CHANGE_FEED_COMPACT_INTERVAL
+        if interval > 0 and length % interval == 0:
+            self.compact()
+
+    def poll(self) -> Optional[List[str]]:
+        """返回上次读取之后变更过的键，按首次变更的顺序去重
+
+        首次调用，或者上次读取的位置之后的变更已被清理时，只记录当前位置并返回 None，
+        调用方需要读取一次全部文档。
+        """
+        with self._lock:
+            if self._offset is not None:
+                changes = self.state.get_list(self.NAMESPACE, self.namespace, self._offset)
+                # 读取之后再检查起始位置，读取期间发生的清理也能发现
+                if self._offset >= self.state.list_start(self.NAMESPACE, self.namespace):
+                    self._offset += len(changes)
+                    # 没有新变更时也定期续期，避免仍在读取的读取方被当作已退出
+                    if changes or time.time() - self._registered_at > Config.CHANGE_FEED_READER_TTL / 2:
+                        self._register()
+                    return list(dict.fromkeys(change["key"] for change in changes))
+            self._offset = self.state.list_length(self.NAMESPACE, self.namespace)
+            self._register()
+            return None
+
+    def compact(self) -> None:
+        """删除所有仍在读取的读取方都已读过的变更"""
+        prefix = f"{self.namespace}:"
+        now = time.time()
+        offsets = []
+        for reader, data in self.state.items(self.READERS).items():
+            if not reader.startswith(prefix):
+                continue
+            if now - data["polled_at"] > Config.CHANGE_FEED_READER_TTL:
+                self.state.delete(self.READERS, reader)
+            else:
+                offsets.append(data["offset"])
+        before = min(offsets) if offsets else self.state.list_length(self.NAMESPACE, self.namespace)
+        self.state.trim_list(self.NAMESPACE, self.namespace, before)
+
+    def _register(self) -> None:
+        """登记本读取方读到的位置，调用方需持有锁"""
+        self._registered_at = time.time()
+        self.state.put(self.READERS, self._reader, {"offset": self._offset, "polled_at": self._registered_at})
+
+def create_state_backend(url: str = None) -> Optional[StateBackend]:
+    """根据地址创建状态存储
+
+    Args:
+        url: memory://、sqlite:///<路径> 或 redis://<地址>，为空时读取 STATE_BACKEND_URL，
+            仍为空时返回 None，表示只使用进程内状态
+    """
+    url = Config.STATE_BACKEND_URL if url is None else url
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryStateBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteStateBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(url)
+    raise Exception(f"不支持的状态存储地址: {url}")
+
+_backend: Optional[StateBackend] = None
+_backend_created = False
+_backend_lock = threading.Lock()
+
+def get_state_backend() -> Optional[StateBackend]:
+    """获取进程内共享的状态存储，未配置时返回 None"""
+    global _backend, _backend_created
+    if not _backend_created:
+        with _backend_lock:
+            if not _backend_created:
+                _backend = create_state_backend()
+                _backend_created = True
+    return _backend
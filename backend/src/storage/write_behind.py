@@ -0,0 +1,227 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+from sqlalchemy import Table, and_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from config import Config
+from utils.async_mode import run_blocking
+
+logger = logging.getLogger('write_behind')
+
+class WriteBehindQueue:
+    """后台批量写入队列
+
+    请求线程只把写操作放入队列，后台线程按批次合并到一个事务中提交（group commit），
+    请求处理不会等待数据库落盘。队列满时写操作等待空位：普通写操作最多等待 put_timeout 秒后丢弃，
+    标记为 durable 的写操作（聊天消息）一直等到入队，不会丢失。
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = None,
+        flush_interval: float = None,
+        max_queue: int = None,
+        put_timeout: float = None
+    ):
+        """初始化写入队列
+
+        Args:
+            engine: 数据库引擎
+            batch_size: 单个事务最多包含的写操作数
+            flush_interval: 凑批的最长等待时间（秒）
+            max_queue: 队列容量
+            put_timeout: 队列满时普通写操作最多等待的秒数，超时后丢弃并记录警告
+        """
+        self.engine = engine
+        self.batch_size = batch_size or Config.PERSISTENCE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.PERSISTENCE_FLUSH_INTERVAL
+        self._queue: "queue.Queue[Tuple]" = queue.Queue(maxsize=max_queue or Config.PERSISTENCE_MAX_QUEUE)
+        self.put_timeout = put_timeout if put_timeout is not None else Config.PERSISTENCE_PUT_TIMEOUT
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "blocked": 0,
+            "batches": 0,
+            "commit_ms": 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def upsert(self, table: Table, row: Dict, durable: bool = False) -> None:
+        """按主键插入或更新一行，durable 为 True 时队列满也不丢弃"""
+        self._put(("upsert", table, row), durable)
+
+    def insert(self, table: Table, row: Dict, durable: bool = False) -> None:
+        """插入一行，durable 为 True 时队列满也不丢弃"""
+        self._put(("insert", table, row), durable)
+
+    def delete(self, table: Table, durable: bool = False, **where) -> None:
+        """删除满足等值条件的行，durable 为 True 时队列满也不丢弃"""
+        self._put(("delete", table, where), durable)
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待此前入队的写操作全部提交，队列满时入队的等待也计入 timeout"""
+        done = threading.Event()
+        started = time.monotonic()
+        try:
+            self._queue.put(("flush", None, done), timeout=timeout)
+        except queue.Full:
+            return False
+        if timeout is None:
+            return done.wait()
+        return done.wait(max(timeout - (time.monotonic() - started), 0))
+
+    def to_dict(self) -> Dict:
+        with self._stats_lock:
+            return {**self.stats, "queue_size": self._queue.qsize()}
+
+    def _put(self, op: Tuple, durable: bool) -> None:
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            # 数据库跟不上写入速度时让请求线程等待空位，把压力传回写入方
+            with self._stats_lock:
+                self.stats["blocked"] += 1
+            if not self._put_waiting(op, durable):
+                with self._stats_lock:
+                    self.stats["dropped"] += 1
+                    dropped = self.stats["dropped"]
+                # 持续积压时每 1000 次只记录一条警告
+                if dropped % 1000 == 1:
+                    logger.warning(f"写入队列已满（{self._queue.maxsize}），已丢弃 {dropped} 个写操作: {op[1].name}")
+                return
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+
+    def _put_waiting(self, op: Tuple, durable: bool) -> bool:
+        """等待队列空位，普通写操作超时返回 False；durable 写操作一直等待，后台线程总会取走队列中的操作"""
+        while True:
+            try:
+                self._queue.put(op, timeout=self.put_timeout)
+                return True
+            except queue.Full:
+                if not durable:
+                    return False
+                logger.warning(f"写入队列已满（{self._queue.maxsize}），{op[1].name} 的写操作继续等待")
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] != "flush":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            ops = [op for op in batch if op[0] != "flush"]
+            if ops:
+                self._write(ops)
+            for op in batch:
+                if op[0] == "flush":
+                    op[2].set()
+
+    def _write(self, ops: List[Tuple]) -> None:
+        """提交整个批次并记录统计，协程模式下数据库读写在原生线程中执行"""
+        start = time.perf_counter()
+        written, failed, errors = run_blocking(self._commit, ops)
+        for error in errors:
+            logger.error(error)
+
+        with self._stats_lock:
+            self.stats["written"] += written
+            self.stats["failed"] += failed
+            self.stats["batches"] += 1
+            self.stats["commit_ms"] += (time.perf_counter() - start) * 1000
+
+    def _commit(self, ops: List[Tuple]) -> Tuple[int, int, List[str]]:
+        """在一个事务中提交整个批次，失败时逐条重试以隔离出错的行
+
+        只访问数据库，返回成功数、失败数和错误信息，由调用方记录日志和统计。
+        """
+        try:
+            with self.engine.begin() as conn:
+                for kind, table, rows in self._group(ops):
+                    self._execute(conn, kind, table, rows)
+            return len(ops), 0, []
+        except Exception as e:
+            errors = [f"批量写入失败，改为逐条写入: {str(e)}"]
+            written = failed = 0
+            for kind, table, payload in ops:
+                try:
+                    with self.engine.begin() as conn:
+                        self._execute(conn, kind, table, [payload])
+                    written += 1
+                except Exception as row_error:
+                    failed += 1
+                    errors.append(f"写入 {table.name} 失败，已丢弃: {str(row_error)}")
+            return written, failed, errors
+
+    @staticmethod
+    def _group(ops: List[Tuple]) -> List[Tuple]:
+        """把相邻的同类操作合并，以便使用 executemany"""
+        groups = []
+        for kind, table, payload in ops:
+            if groups and groups[-1][0] == kind and groups[-1][1] is table and kind != "delete":
+                groups[-1][2].append(payload)
+            else:
+                groups.append((kind, table, [payload]))
+        return groups
+
+    def _execute(self, conn: Connection, kind: str, table: Table, rows: List[Dict]) -> None:
+        if kind == "insert":
+            conn.execute(table.insert(), rows)
+        elif kind == "upsert":
+            stmt = self._upsert_statement(table)
+            if stmt is None:
+                for row in rows:
+                    self._upsert_row(conn, table, row)
+            else:
+                conn.execute(stmt, rows)
+        elif kind == "delete":
+            for where in rows:
+                conn.execute(table.delete().where(and_(*[table.c[k] == v for k, v in where.items()])))
+
+    def _upsert_statement(self, table: Table):
+        """按数据库方言生成 upsert 语句，不支持原生 upsert 的数据库返回 None"""
+        dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(self.engine.dialect.name)
+        if dialect is None:
+            return None
+        stmt = dialect.insert(table)
+        primary_keys = [column.name for column in table.primary_key.columns]
+        return stmt.on_conflict_do_update(
+            index_elements=primary_keys,
+            set_={c.name: stmt.excluded[c.name] for c in table.columns if not c.primary_key}
+        )
+
+    @staticmethod
+    def _upsert_row(conn: Connection, table: Table, row: Dict) -> None:
+        """通用的 upsert：按主键查询，存在时更新，否则插入"""
+        primary_keys = [column.name for column in table.primary_key.columns]
+        where = and_(*[table.c[k] == row[k] for k in primary_keys])
+        if conn.execute(select(*table.primary_key.columns).where(where)).first() is None:
+            conn.execute(table.insert(), [row])
+        else:
+            values = {k: v for k, v in row.items() if k not in primary_keys}
+            conn.execute(table.update().where(where).values(**values))
+
+_queues: Dict[str, WriteBehindQueue] = {}
+_queues_lock = threading.Lock()
+
+def get_write_queue(engine: Engine) -> WriteBehindQueue:
+    """获取指定数据库在进程内共享的写入队列"""
+    key = str(engine.url)
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = WriteBehindQueue(engine)
+        return _queues[key]
@@ -0,0 +1,112 @@
+import os
+import time
+import types
+import pytest
+
+# 测试时始终使用模拟数据，不访问百度 API
+os.environ['TEST_MODE'] = 'true'
+# 默认不写入 app.db，持久化测试使用临时数据库
+os.environ['PERSISTENCE_ENABLED'] = 'false'
+# 默认同步发送 WebSocket 事件，便于断言，出站队列有单独的测试
+os.environ['WS_EVENT_QUEUE_ENABLED'] = 'false'
+# 测试环境不打协程补丁
+os.environ['ASYNC_MODE'] = 'threading'
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """去掉测试模式下模拟响应的延迟，只影响百度客户端模块"""
+    import utils.baidu_client
+    fake_time = types.SimpleNamespace(**{
+        name: getattr(time, name) for name in dir(time) if not name.startswith('_')
+    })
+    fake_time.sleep = lambda seconds: None
+    monkeypatch.setattr(utils.baidu_client, 'time', fake_time)
+    
+    # 异步客户端的模拟延迟同样去掉，但仍然让出事件循环
+    import asyncio
+    import utils.async_baidu_client
+    fake_asyncio = types.SimpleNamespace(**{
+        name: getattr(asyncio, name) for name in dir(asyncio) if not name.startswith('_')
+    })
+    real_sleep = asyncio.sleep
+    fake_asyncio.sleep = lambda seconds, *args: real_sleep(0, *args)
+    monkeypatch.setattr(utils.async_baidu_client, 'asyncio', fake_asyncio)
+
+class FakeResponse:
+    """百度 API 响应的替身
+
+    Args:
+        data: json() 返回的内容
+        error: raise_for_status() 抛出的异常
+        lines: 流式响应逐行返回的内容
+        status_code: HTTP 状态码，异步客户端据此判断是否出错
+    """
+
+    def __init__(self, data=None, error=None, lines=None, status_code=200):
+        self.data = data
+        self.error = error
+        self.lines = lines or []
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.error:
+            raise self.error
+
+    def json(self):
+        return self.data
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class FakeSession:
+    """记录请求的 requests.Session 替身
+
+    outcomes 中预设的响应或异常按顺序返回，用完后调用 respond(url, payload) 生成响应，
+    默认返回按请求次数编号的“回复N”。每次请求的地址和关键字参数按顺序记录在 requests 中。
+    """
+
+    def __init__(self):
+        from utils.http_pool import ConnectionStats
+        self.connection_stats = ConnectionStats()
+        self.outcomes = []
+        self.requests = []
+        self.respond = lambda url, payload: FakeResponse({"result": f"回复{self.calls}"})
+
+    @property
+    def calls(self) -> int:
+        return len(self.requests)
+
+    @property
+    def payloads(self) -> list:
+        return [kwargs.get("json") for url, kwargs in self.requests]
+
+    def post(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        outcome = self.outcomes.pop(0) if self.outcomes else self.respond(url, kwargs.get("json"))
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def head(self, url, **kwargs):
+        pass
+
+@pytest.fixture
+def online_client(monkeypatch):
+    """非测试模式的百度客户端，请求发往 client.session（FakeSession），不访问网络"""
+    from utils.baidu_client import BaiduClient
+    from utils.completion_cache import CompletionCache
+    from utils.resilience import CircuitBreaker
+    client = BaiduClient(session=FakeSession(), completion_cache=CompletionCache(max_entries=10, ttl=60, db_path=""))
+    client.test_mode = False
+    client.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    monkeypatch.setattr(client, "_get_access_token", lambda: "token")
+    return client
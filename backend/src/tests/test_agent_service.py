@@ -0,0 +1,141 @@
+import pytest
+from services.agent_service import MultiAgentSystem
+
+class FakeSocketIO:
+    def __init__(self):
+        self.events = []
+        
+    def emit(self, event, data, **kwargs):
+        self.events.append((event, data))
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+@pytest.fixture
+def agent_system(socketio):
+    from utils.ws_handler import WebSocketHandler
+    return MultiAgentSystem(WebSocketHandler(socketio))
+
+def test_process_input_streams_deltas(agent_system, socketio):
+    result = agent_system.process_input("帮我设计一个登录页面")
+    
+    assert result["success"]
+    responses = [data for event, data in socketio.events if event == "agent_response"]
+    deltas = [data for event, data in socketio.events if event == "agent_response_delta"]
+    assert len(responses) == 6
+    
+    # 每条完整消息之前都有按顺序编号、可拼接成完整内容的增量消息
+    for response in responses:
+        parts = [d for d in deltas if d["messageId"] == response["messageId"]]
+        assert [d["seq"] for d in parts] == list(range(len(parts)))
+        assert "".join(d["delta"] for d in parts) == response["message"]["content"]
+        assert response["final"]
+        
+def test_process_input_reports_stage_timings(agent_system):
+    result = agent_system.process_input("帮我设计一个登录页面")
+    
+    stages = [timing["stage"] for timing in result["stage_timings"]]
+    assert stages == ["mike", "emma", "bob", "alex", "david", "summary"]
+    assert all("duration_ms" in timing for timing in result["stage_timings"])
+    assert result["critical_path_ms"] <= result["total_ms"] + 1
+    
+def test_artifact_versions_use_numeric_ordering(agent_system):
+    for i in range(11):
+        agent_system.save_code_artifact("src/app.py", f"print({i})", "python", "Alex")
+        
+    latest = agent_system.get_artifact_version("src/app.py")
+    assert latest["version"] == "1.0.10"
+    assert latest["parent_version"] == "1.0.9"
+    assert agent_system.get_artifact_version("src/app.py", "1.0.9")["content"] == "print(9)"
+    assert agent_system.get_artifact_version("src/app.py", "2.0.0") is None
+    assert agent_system.get_artifact_version("src/other.py") is None
+    history = agent_system.get_artifact_history("src/app.py")
+    assert [a["version"] for a in history] == [f"1.0.{i}" for i in range(11)]
+    
+def test_task_dependencies_and_ready_tasks(agent_system):
+    design = agent_system.create_task("设计", "接口设计", "Bob")
+    implement = agent_system.create_task("实现", "实现接口", "Alex", dependencies=[design["task_id"]])
+    
+    assert [t["task_id"] for t in agent_system.get_task_dependencies(implement["task_id"])] == [design["task_id"]]
+    assert [t["task_id"] for t in agent_system.get_dependent_tasks(design["task_id"])] == [implement["task_id"]]
+    assert [t["task_id"] for t in agent_system.get_ready_tasks()] == [design["task_id"]]
+    
+    agent_system.update_task_status(design["task_id"], "completed")
+    assert [t["task_id"] for t in agent_system.get_ready_tasks()] == [implement["task_id"]]
+    assert agent_system.get_task_dependencies("missing") is None
+    with pytest.raises(ValueError):
+        agent_system.create_task("测试", "编写测试", "Alex", dependencies=["missing"])
+        
+def test_stream_failure_does_not_append_error_to_partial_output(agent_system, socketio, monkeypatch):
+    def failing_stream(messages, use_cache=True, deadline=None, priority="background", operation="completion"):
+        yield "部分内容"
+        raise Exception("连接中断")
+        
+    monkeypatch.setattr(agent_system.baidu_client, "stream_completion", failing_stream)
+    response = agent_system._stream_agent_response("Bob", "设计架构", session_id="session-1")
+    
+    assert "部分内容" not in response and "连接中断" in response
+    final = [data for event, data in socketio.events if event == "agent_response"][-1]
+    errors = [data for event, data in socketio.events if event == "error"]
+    # 错误事件与增量消息使用相同的消息ID，完整消息只包含错误说明
+    assert final["message"]["content"] == response
+    assert errors[-1]["messageId"] == final["messageId"]
+    assert errors[-1]["error"]["code"] == "AGENT_RESPONSE_FAILED"
+        
+def test_deadline_during_stream_ends_the_partial_message(agent_system, socketio, monkeypatch):
+    from utils.deadline import DeadlineExceeded
+    
+    def expiring_stream(messages, use_cache=True, deadline=None, priority="background", operation="completion"):
+        yield "部分内容"
+        raise DeadlineExceeded("超时")
+        
+    monkeypatch.setattr(agent_system.baidu_client, "stream_completion", expiring_stream)
+    with pytest.raises(DeadlineExceeded):
+        agent_system._stream_agent_response("Bob", "设计架构", session_id="session-1")
+        
+    delta = [data for event, data in socketio.events if event == "agent_response_delta"][-1]
+    errors = [data for event, data in socketio.events if event == "error"]
+    # 客户端按同一消息ID丢弃已显示的增量
+    assert errors[-1]["messageId"] == delta["messageId"]
+        
+def test_concurrent_history_appends_respect_limit(agent_system, monkeypatch):
+    import threading
+    from config import Config
+    monkeypatch.setattr(Config, "CONVERSATION_HISTORY_LIMIT", 10)
+    
+    def append_many(worker):
+        for i in range(200):
+            agent_system._append_history({"role": "assistant", "content": f"{worker}-{i}"})
+            
+    threads = [threading.Thread(target=append_many, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(agent_system.conversation_history) == 10
+        
+def test_conversation_only_contains_own_session(agent_system):
+    agent_system.process_input("SECRET-of-user-A", session_id="A")
+    response = agent_system.process_input("用户B的需求", session_id="B")
+    
+    contents = [m["content"] for m in response["conversation"]]
+    assert "用户B的需求" in contents
+    assert not any("SECRET-of-user-A" in c for c in contents)
+    assert all(m["session_id"] == "B" for m in response["conversation"])
+        
+def test_concurrent_saves_get_distinct_versions(agent_system):
+    import threading
+    
+    def save(worker):
+        for i in range(10):
+            agent_system.save_code_artifact("src/app.py", f"print({worker}, {i})", "python", "Alex")
+            
+    threads = [threading.Thread(target=save, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    versions = [a["version"] for a in agent_system.get_artifact_history("src/app.py")]
+    assert len(versions) == len(set(versions)) == 40
+    assert agent_system.get_artifact_version("src/app.py")["version"] == "1.0.39"
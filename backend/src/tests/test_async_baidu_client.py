@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from conftest import FakeResponse
+from utils.async_baidu_client import AsyncBaiduClient, gather_limited
+from utils.baidu_client import BaiduClient
+
+class FakeAsyncHTTP:
+    """记录请求和最大并发数的 httpx.AsyncClient 替身"""
+
+    def __init__(self, statuses=None):
+        self.calls = []
+        self.statuses = list(statuses or [])
+        self.running = 0
+        self.max_running = 0
+
+    async def post(self, url, params=None, json=None):
+        self.calls.append({"url": url, "params": params, "json": json})
+        number = len(self.calls)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        return FakeResponse({"result": f"回复{number}"}, status_code=status)
+
+@pytest.fixture
+def async_client(online_client):
+    http = FakeAsyncHTTP()
+    return AsyncBaiduClient(online_client, http_client=http), http
+
+def test_test_mode_returns_mock_response():
+    client = AsyncBaiduClient(BaiduClient())
+    assert client.test_mode
+    result = asyncio.run(client.get_completion([{"role": "user", "content": "你是架构师Bob"}]))
+    assert "Bob" in result or "架构" in result
+    assert asyncio.run(client.get_code_review("print(1)"))
+
+def test_completion_uses_shared_cache(async_client):
+    client, http = async_client
+    messages = [{"role": "user", "content": "你好"}]
+
+    async def run():
+        return await client.get_completion(messages), await client.get_completion(messages)
+
+    assert asyncio.run(run()) == ("回复1", "回复1")
+    assert len(http.calls) == 1
+    assert http.calls[0]["json"]["temperature"] == 0.7
+    # 同步客户端命中同一份缓存
+    assert client.sync_client.get_completion(messages) == "回复1"
+
+def test_code_completion_parameters(async_client):
+    client, http = async_client
+    asyncio.run(client.get_code_completion([{"role": "user", "content": "写个函数"}]))
+    assert http.calls[0]["json"]["temperature"] == 0.2
+    asyncio.run(client.get_code_explanation("print(1)"))
+    assert "请解释以下代码" in http.calls[1]["json"]["messages"][1]["content"]
+
+def test_retries_after_401_with_bounded_attempts(async_client):
+    client, http = async_client
+    http.statuses = [401, 401, 401]
+    with pytest.raises(Exception, match="已尝试 3 次"):
+        asyncio.run(client.get_completion([{"role": "user", "content": "a"}], use_cache=False))
+    assert len(http.calls) == 3
+    assert client.sync_client.get_stats()["retries"]["auth_refreshes"] == 3
+
+def test_gather_completions_limits_concurrency(async_client):
+    client, http = async_client
+    message_lists = [[{"role": "user", "content": f"问题{i}"}] for i in range(12)]
+    results = asyncio.run(client.gather_completions(message_lists, limit=3))
+    assert len(results) == 12 and len(set(results)) == 12
+    assert http.max_running == 3
+
+def test_gather_code_reviews_returns_exceptions(async_client):
+    client, http = async_client
+    http.statuses = [200, 400, 200]
+    results = asyncio.run(client.gather_code_reviews(["a = 1", "b = 2", "c = 3"], limit=1, return_exceptions=True))
+    assert isinstance(results[1], Exception)
+    assert [r for r in results if isinstance(r, str)] == ["回复1", "回复3"]
+
+def test_gather_limited_keeps_order():
+    async def value(i):
+        await asyncio.sleep(0.001 * (5 - i))
+        return i
+    assert asyncio.run(gather_limited([value(i) for i in range(5)], limit=2)) == [0, 1, 2, 3, 4]
@@ -0,0 +1,46 @@
+import sys
+import types
+import pytest
+from config import Config
+from utils import async_mode
+
+@pytest.fixture(autouse=True)
+def reset_mode(monkeypatch):
+    monkeypatch.setattr(async_mode, "_mode", None)
+
+def test_threading_mode_does_not_patch():
+    assert async_mode.setup_async_mode("threading") == "threading"
+    assert async_mode.get_async_mode() == "threading"
+    assert not async_mode.is_cooperative()
+    assert async_mode.concurrency_limit(4) == 4
+
+def test_mode_read_from_config():
+    # conftest 通过 ASYNC_MODE 选择 threading
+    assert async_mode.setup_async_mode() == "threading"
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        async_mode.setup_async_mode("asyncio")
+
+def test_missing_package(monkeypatch):
+    monkeypatch.setitem(sys.modules, "eventlet", None)
+    with pytest.raises(Exception, match="pip install eventlet"):
+        async_mode.setup_async_mode("eventlet")
+    assert async_mode.get_async_mode() == "threading"
+
+def test_cooperative_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(async_mode, "_mode", "gevent")
+    assert async_mode.is_cooperative()
+    assert async_mode.concurrency_limit(4) == Config.GREEN_CONCURRENCY
+    assert async_mode.concurrency_limit(Config.GREEN_CONCURRENCY + 1) == Config.GREEN_CONCURRENCY + 1
+
+def test_blocking_calls_use_native_threads_in_cooperative_mode(monkeypatch):
+    assert async_mode.run_blocking(lambda a, b=0: a + b, 1, b=2) == 3
+
+    executed = []
+    fake_tpool = types.SimpleNamespace(execute=lambda fn, *args, **kwargs: executed.append(fn) or fn(*args, **kwargs))
+    monkeypatch.setitem(sys.modules, "eventlet", types.SimpleNamespace(tpool=fake_tpool))
+    monkeypatch.setitem(sys.modules, "eventlet.tpool", fake_tpool)
+    monkeypatch.setattr(async_mode, "_mode", "eventlet")
+    assert async_mode.run_blocking(max, 1, 2) == 2
+    assert executed == [max]
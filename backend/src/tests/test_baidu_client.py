@@ -0,0 +1,41 @@
+import pytest
+from utils.baidu_client import BaiduClient
+
+@pytest.fixture
+def baidu_client():
+    return BaiduClient()
+
+def test_stream_completion_test_mode(baidu_client):
+    messages = [{"role": "user", "content": "你是产品经理Emma，请提出建议"}]
+    
+    chunks = list(baidu_client.stream_completion(messages))
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 8 for chunk in chunks)
+    assert "".join(chunks).startswith("【")
+    
+def test_stream_response_raises_error(baidu_client, monkeypatch):
+    def broken_stream(messages, use_cache=True, deadline=None, priority="background", operation="completion"):
+        raise Exception("网络错误")
+        yield
+        
+    monkeypatch.setattr(baidu_client, "stream_completion", broken_stream)
+    
+    with pytest.raises(Exception, match="网络错误"):
+        list(baidu_client.stream_response([{"role": "user", "content": "你好"}]))
+    
+def test_identical_requests_hit_cache(online_client):
+    assert online_client.get_code_review("print(1)") == "回复1"
+    assert online_client.get_code_review("print(1)") == "回复1"
+    assert online_client.get_code_review("print(2)") == "回复2"
+    
+    assert online_client.session.calls == 2
+    assert online_client.get_stats()["cache"]["hits"] == 1
+    
+def test_cache_can_be_bypassed(online_client):
+    messages = [{"role": "user", "content": "讲个笑话"}]
+    
+    online_client.get_completion(messages)
+    online_client.get_completion(messages, use_cache=False)
+    
+    assert online_client.session.calls == 2
@@ -0,0 +1,99 @@
+from storage.blob_store import BlobStore
+from models.agent import CodeArtifact
+
+def make_file(lines: int, changed: int = -1) -> str:
+    return "".join(
+        f"changed_{i} = {i}\n" if i == changed else f"value_{i} = {i}\n"
+        for i in range(lines)
+    )
+
+def test_identical_content_is_deduplicated():
+    store = BlobStore()
+    
+    first = store.put(make_file(100))
+    second = store.put(make_file(100))
+    
+    assert first == second
+    assert store.to_dict()["blobs"] == 1
+    assert store.to_dict()["dedup_hits"] == 1
+    
+def test_versions_are_stored_as_deltas_and_reconstructed():
+    store = BlobStore(snapshot_interval=4, cache_size=0)
+    hashes = [store.put(make_file(200))]
+    for i in range(7):
+        hashes.append(store.put(make_file(200, changed=i), base_hash=hashes[-1]))
+        
+    stats = store.to_dict()
+    assert stats["snapshots"] == 2
+    assert stats["deltas"] == 6
+    assert stats["stored_bytes"] < stats["raw_bytes"] / 10
+    for i, content_hash in enumerate(hashes[1:]):
+        assert store.get(content_hash) == make_file(200, changed=i)
+        
+def test_latest_version_is_served_from_cache():
+    store = BlobStore(cache_size=2)
+    base = store.put(make_file(50))
+    latest = store.put(make_file(50, changed=3), base_hash=base)
+    
+    assert store.get(latest) == make_file(50, changed=3)
+    assert store.to_dict()["cache_misses"] == 0
+    
+def test_new_artifact_version_is_delta_against_parent():
+    store = BlobStore()
+    artifact = CodeArtifact("src/app.py", make_file(100), "python", blob_store=store)
+    
+    new_version = artifact.create_new_version(make_file(100, changed=5), "修改一行")
+    
+    assert new_version.content == make_file(100, changed=5)
+    assert artifact.content == make_file(100)
+    assert store.to_dict()["deltas"] == 1
+    
+def test_unreferenced_content_is_collected():
+    import gc
+    store = BlobStore(cache_size=0)
+    parent = CodeArtifact("src/app.py", make_file(100), "python", blob_store=store)
+    child = parent.create_new_version(make_file(100, changed=5), "修改一行")
+    
+    # 父版本的内容仍是子版本增量的基准，不能回收
+    del parent
+    gc.collect()
+    assert store.to_dict()["blobs"] == 2
+    assert child.content == make_file(100, changed=5)
+    
+    del child
+    gc.collect()
+    assert store.to_dict()["blobs"] == 0
+    assert store.to_dict()["collected"] == 2
+    
+def test_shared_content_is_kept_until_last_reference():
+    store = BlobStore()
+    first = store.put(make_file(10))
+    store.put(make_file(10))
+    
+    store.release(first)
+    assert first in store
+    store.release(first)
+    assert first not in store
+    
+def test_diff_is_computed_outside_the_lock(monkeypatch):
+    import threading
+    store = BlobStore(cache_size=0)
+    base = store.put(make_file(100))
+    other = store.put("其他文件\n")
+    started, release = threading.Event(), threading.Event()
+    diff = BlobStore._diff
+    
+    def slow_diff(base_content, content):
+        started.set()
+        release.wait(2)
+        return diff(base_content, content)
+        
+    monkeypatch.setattr(BlobStore, "_diff", staticmethod(slow_diff))
+    writer = threading.Thread(target=store.put, args=(make_file(100, changed=1), base))
+    writer.start()
+    assert started.wait(2)
+    # 计算增量期间其他内容仍可读取
+    assert store.get(other) == "其他文件\n"
+    release.set()
+    writer.join()
+    assert store.to_dict()["deltas"] == 1
@@ -1,7 +1,8 @@
 import pytest
 from datetime import datetime
 from services.chat_service import ChatService
-from models.chat import ChatMessage
+from models.chat import ChatMessage, ChatSession
+from config import Config
 
 @pytest.fixture
 def chat_service():
@@ -62,4 +63,122 @@ def test_chat_history(chat_service):
     assert history[0]["role"] == "user"
     assert history[0]["content"] == "测试消息 1"
     assert history[1]["role"] == "assistant"
-    assert history[1]["content"] == "测试响应 1" 
\ No newline at end of file
+    assert history[1]["content"] == "测试响应 1" 
+
+def test_context_messages_only_include_role_and_content():
+    session = ChatSession()
+    session.add_message(ChatMessage(role="user", content="你好", metadata={"source": "web"}))
+
+    assert session.get_context_messages() == [{"role": "user", "content": "你好"}]
+
+def test_context_messages_prepend_summary_and_respect_budget():
+    session = ChatSession()
+    for i in range(10):
+        session.add_message(ChatMessage(role="user", content=f"问题{i}" * 10))
+        session.add_message(ChatMessage(role="assistant", content=f"回答{i}" * 10))
+    session.add_message(ChatMessage(role="user", content="最新问题"))
+    session.summary = "用户在讨论登录页面"
+    session.summarized_count = 4
+
+    context = session.get_context_messages(max_tokens=100)
+
+    assert context[0]["role"] == "user"
+    assert "用户在讨论登录页面" in context[0]["content"]
+    assert context[-1]["content"] == "最新问题"
+    assert len(context) < 17
+
+def test_old_turns_are_summarized_in_background(chat_service, monkeypatch):
+    monkeypatch.setattr(Config, "CHAT_WINDOW_TURNS", 2)
+    session_id = chat_service.create_session()["session_id"]
+
+    for i in range(4):
+        chat_service.process_message(session_id, f"第{i}个问题")
+    chat_service._summary_executor.submit(lambda: None).result()
+
+    session = chat_service.sessions[session_id]
+    assert session.summary
+    assert session.summarized_count == 4
+    assert len(session.get_context_messages()) == 4
+
+def test_history_is_paginated_by_cursor(chat_service):
+    session_id = chat_service.create_session()["session_id"]
+    for i in range(5):
+        chat_service.process_message(session_id, f"第{i}个问题")
+    session = chat_service.sessions[session_id]
+
+    first = chat_service.get_history_page(session_id, limit=4)
+    second = chat_service.get_history_page(session_id, before=first["next_before"], limit=4)
+    last = chat_service.get_history_page(session_id, before=second["next_before"], limit=4)
+
+    pages = last["messages"] + second["messages"] + first["messages"]
+    assert [m["message_id"] for m in pages] == [m.message_id for m in session.messages]
+    assert first["has_more"] and second["has_more"]
+    assert not last["has_more"] and last["next_before"] is None
+    with pytest.raises(ValueError):
+        chat_service.get_history_page(session_id, before="missing")
+
+def test_delta_response_only_contains_new_messages(chat_service):
+    session_id = chat_service.create_session()["session_id"]
+    chat_service.process_message(session_id, "第一个问题")
+
+    response = chat_service.process_message(session_id, "第二个问题", delta=True)
+
+    assert "session" not in response
+    assert [m["role"] for m in response["messages"]] == ["user", "assistant"]
+    assert response["messages"][0]["content"] == "第二个问题"
+    assert response["version"] == chat_service.get_session(session_id)["version"]
+    assert chat_service.get_session(session_id, message_limit=2)["messages"] == response["messages"]
+    assert "has_more" not in chat_service.get_session(session_id, message_limit=2)
+
+def test_delta_flag_is_parsed_explicitly():
+    from flask import Flask
+    from api.chat import chat_bp
+    app = Flask(__name__)
+    app.register_blueprint(chat_bp)
+    client = app.test_client()
+    session_id = client.post("/sessions", json={}).get_json()["session_id"]
+    url = f"/sessions/{session_id}/messages"
+
+    assert "session" in client.post(url, json={"message": "你好", "delta": "false"}).get_json()
+    assert "session" in client.post(url, json={"message": "你好", "delta": "0"}).get_json()
+    assert "messages" in client.post(url, json={"message": "你好", "delta": "true"}).get_json()
+    assert client.post(url, json={"message": "你好", "delta": "maybe"}).status_code == 400
+
+def test_archived_filter_is_parsed_explicitly():
+    from flask import Flask
+    from api.chat import chat_bp
+    app = Flask(__name__)
+    app.register_blueprint(chat_bp)
+    client = app.test_client()
+    session_id = client.post("/sessions", json={}).get_json()["session_id"]
+    client.post(f"/sessions/{session_id}/archive")
+
+    archived = client.get("/sessions?archived=true").get_json()
+    assert session_id in [s["session_id"] for s in archived["sessions"]]
+    assert archived["total"] == len(archived["sessions"])
+    assert session_id not in [s["session_id"] for s in client.get("/sessions?archived=0").get_json()["sessions"]]
+    assert client.get("/sessions?archived=maybe").status_code == 400
+
+def test_sessions_listed_by_last_activity_with_cursor(chat_service):
+    session_ids = [chat_service.create_session(f"会话{i}")["session_id"] for i in range(5)]
+    for i, session_id in enumerate(session_ids):
+        chat_service.sessions[session_id].last_active_at = datetime(2024, 2, 28, 12, i)
+        chat_service._index_session(chat_service.sessions[session_id])
+    chat_service.process_message(session_ids[0], "激活最早的会话")
+    chat_service.archive_session(session_ids[1])
+
+    first = chat_service.list_sessions_page(archived=False, limit=2)
+    second = chat_service.list_sessions_page(archived=False, limit=2, cursor=first["next_cursor"])
+
+    listed = [s["session_id"] for s in first["sessions"] + second["sessions"]]
+    assert listed == [session_ids[0], session_ids[4], session_ids[3], session_ids[2]]
+    assert second["next_cursor"] is None
+    assert first["sessions"][0]["message_count"] == 2
+    assert [s["session_id"] for s in chat_service.list_sessions(archived=True)] == [session_ids[1]]
+    # total 统计筛选后的会话数
+    assert first["total"] == 4
+    assert chat_service.list_sessions_page(archived=True)["total"] == 1
+    assert chat_service.list_sessions_page()["total"] == 5
+
+    chat_service.delete_session(session_ids[0])
+    assert session_ids[0] not in [s["session_id"] for s in chat_service.list_sessions()]
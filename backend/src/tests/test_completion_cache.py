@@ -0,0 +1,54 @@
+import time
+from utils.completion_cache import CompletionCache
+
+MESSAGES = [{"role": "user", "content": "你好", "message_id": "ignored"}]
+
+def test_key_depends_on_sampling_parameters():
+    key = CompletionCache.make_key("ERNIE-Bot-4", MESSAGES, 0.7, 0.8)
+    
+    assert key == CompletionCache.make_key("ERNIE-Bot-4", [{"role": "user", "content": "你好"}], 0.7, 0.8)
+    assert key != CompletionCache.make_key("ERNIE-Bot-4", MESSAGES, 0.2, 0.8)
+    assert key != CompletionCache.make_key("ERNIE-Bot-turbo", MESSAGES, 0.7, 0.8)
+    
+def test_lru_eviction_and_stats():
+    cache = CompletionCache(max_entries=2, ttl=60, db_path="")
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    stats = cache.to_dict()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["size"] == 2
+    
+def test_expired_entries_are_not_returned():
+    cache = CompletionCache(max_entries=10, ttl=0, db_path="")
+    cache.set("a", "1")
+    time.sleep(0.001)
+    
+    assert cache.get("a") is None
+    assert cache.to_dict()["expirations"] == 1
+    
+def test_disk_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    CompletionCache(max_entries=10, ttl=60, db_path=db_path).set("a", "1")
+    
+    cache = CompletionCache(max_entries=10, ttl=60, db_path=db_path)
+    assert cache.get("a") == "1"
+    assert cache.get("a") == "1"
+    assert cache.to_dict()["disk_hits"] == 1
+    assert cache.to_dict()["hits"] == 1
+    
+def test_disk_hit_keeps_original_expiry(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    CompletionCache(max_entries=10, ttl=0.05, db_path=db_path).set("a", "1")
+    
+    cache = CompletionCache(max_entries=10, ttl=60, db_path=db_path)
+    assert cache.get("a") == "1"
+    time.sleep(0.06)
+    # 提升到内存层的条目沿用磁盘中的过期时间
+    assert cache.get("a") is None
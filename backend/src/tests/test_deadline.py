@@ -0,0 +1,96 @@
+import time
+import pytest
+import requests
+from config import Config
+from services.agent_service import MultiAgentSystem
+from services.chat_service import ChatService
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.ws_handler import WebSocketHandler
+
+class FakeSocketIO:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data, **kwargs):
+        self.events.append((event, data))
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+@pytest.fixture
+def agent_system(socketio):
+    return MultiAgentSystem(WebSocketHandler(socketio))
+
+def test_deadline_from_request():
+    assert Deadline.from_request(None, 30).seconds == 30
+    assert Deadline.from_request("12.5", 30).seconds == 12.5
+    assert Deadline.from_request(10 ** 6, 30).seconds == Config.REQUEST_TIMEOUT_MAX
+    with pytest.raises(ValueError):
+        Deadline.from_request("abc", 30)
+    with pytest.raises(ValueError):
+        Deadline.from_request(0, 30)
+
+def test_timeout_is_bounded_by_remaining_budget():
+    connect, read = Deadline(2).timeout(5, 60)
+    assert connect <= 2 and read <= 2
+    assert Deadline(100).timeout(5, 60) == (5, 60)
+    with pytest.raises(DeadlineExceeded):
+        Deadline(0).timeout(5, 60)
+
+def test_every_request_has_a_timeout(online_client):
+    client, session = online_client, online_client.session
+    client.get_completion([{"role": "user", "content": "你好"}], use_cache=False)
+    assert session.requests[-1][1]["timeout"] == (Config.BAIDU_CONNECT_TIMEOUT, Config.BAIDU_READ_TIMEOUT)
+
+    client.get_completion([{"role": "user", "content": "你好"}], use_cache=False, deadline=Deadline(1))
+    connect, read = session.requests[-1][1]["timeout"]
+    assert connect <= 1 and read <= 1
+
+def test_retries_stop_at_deadline(online_client, monkeypatch):
+    client, session = online_client, online_client.session
+    calls = []
+
+    def slow_failure(url, **kwargs):
+        calls.append(kwargs["timeout"])
+        time.sleep(0.05)
+        raise requests.exceptions.ConnectionError("断开")
+
+    monkeypatch.setattr(session, "post", slow_failure)
+    client.retry_policy.max_attempts = 10
+    with pytest.raises(DeadlineExceeded):
+        client.get_completion([{"role": "user", "content": "你好"}], deadline=Deadline(0.08))
+    assert len(calls) == 2
+    # 截止时间导致的失败不计入熔断
+    assert client.breaker.to_dict()["failures"] == 1
+
+def test_optional_stage_is_skipped_when_budget_is_short(agent_system, socketio, monkeypatch):
+    monkeypatch.setattr(Config, "PIPELINE_OPTIONAL_MIN_BUDGET", 60)
+    messages = []
+    result = agent_system.process_input("帮我设计一个登录页面", on_message=messages.append, deadline=Deadline(30))
+
+    assert result["success"] and not result["deadline_exceeded"]
+    assert [s["stage"] for s in result["skipped_stages"]] == ["david"]
+    assert result["skipped_stages"][0]["reason"] == "budget_low"
+    assert any(m.get("skipped") and m["stage"] == "david" for m in messages)
+    # 总结阶段照常执行，跳过的阶段不产生流式回复
+    agents = [data["message"]["agent"] for event, data in socketio.events if event == "agent_response"]
+    assert "David" not in agents and "Mike总结" in agents and "系统" in agents
+    statuses = [data["agents"][0] for event, data in socketio.events if event == "agent_status"]
+    assert {"name": "David", "status": "skipped", "role": ""} in statuses
+
+def test_nothing_is_skipped_with_enough_budget(agent_system):
+    result = agent_system.process_input("帮我设计一个登录页面", deadline=Deadline(300))
+    assert result["skipped_stages"] == []
+    assert result["deadline"]["budget"] == 300
+
+def test_expired_deadline_stops_required_stages(agent_system, socketio):
+    result = agent_system.process_input("帮我设计一个登录页面", deadline=Deadline(0))
+
+    assert result["deadline_exceeded"]
+    agents = [data["message"]["agent"] for event, data in socketio.events if event == "agent_response"]
+    assert agents == ["系统"]
+
+def test_chat_raises_when_deadline_expires():
+    with pytest.raises(DeadlineExceeded):
+        ChatService().process_message("deadline-session", "你好", deadline=Deadline(0))
@@ -0,0 +1,85 @@
+import threading
+from tests.test_agent_service import FakeSocketIO
+from utils.event_queue import OutboundEventQueue
+from utils.ws_handler import WebSocketHandler
+
+def test_superseded_status_events_are_coalesced():
+    socketio = FakeSocketIO()
+    handler = WebSocketHandler(socketio, use_queue=True)
+    
+    for status in ["processing", "busy", "completed"]:
+        handler.emit_agent_status("Mike", status)
+    handler.emit_agent_response_delta("Mike", "m1", 0, "你")
+    handler.emit_agent_response_delta("Mike", "m1", 1, "好")
+    handler.emit_agent_status("Emma", "processing")
+    assert handler.flush(timeout=2)
+    
+    statuses = [data["agents"][0] for event, data in socketio.events if event == "agent_status"]
+    assert statuses == [
+        {"name": "Mike", "status": "completed", "role": ""},
+        {"name": "Emma", "status": "processing", "role": ""}
+    ]
+    deltas = [data["delta"] for event, data in socketio.events if event == "agent_response_delta"]
+    assert deltas == ["你", "好"]
+    assert handler.event_queue.to_dict()["coalesced"] == 2
+    
+def test_full_queue_drops_low_priority_events_first():
+    release = threading.Event()
+    sent = []
+    queue = OutboundEventQueue(lambda event, data, room: (release.wait(), sent.append(event)), tick=0, max_size=3)
+    # 第一条事件占住发送线程，其余事件留在队列中
+    queue.put("first", {})
+    while queue.to_dict()["queue_size"]:
+        pass
+    queue.put("status", {}, low_priority=True)
+    queue.put("delta-1", {})
+    queue.put("delta-2", {})
+    queue.put("delta-3", {})
+    assert not queue.put("status-2", {}, low_priority=True)
+    
+    release.set()
+    assert queue.flush(timeout=2)
+    assert sent == ["first", "delta-1", "delta-2", "delta-3"]
+    assert queue.to_dict()["dropped"] == 2
+    
+def test_send_message_does_not_block_on_socket_io():
+    release = threading.Event()
+    
+    class SlowSocketIO(FakeSocketIO):
+        def emit(self, event, data, **kwargs):
+            release.wait()
+            super().emit(event, data, **kwargs)
+            
+    socketio = SlowSocketIO()
+    handler = WebSocketHandler(socketio, use_queue=True)
+    for i in range(100):
+        assert handler.emit_agent_response_delta("Alex", "m1", i, str(i))
+    assert socketio.events == []
+    
+    release.set()
+    assert handler.flush(timeout=2)
+    assert len(socketio.events) == 100
+    
+def test_full_queue_never_drops_final_responses():
+    release = threading.Event()
+    sent = []
+    queue = OutboundEventQueue(lambda event, data, room: (release.wait(), sent.append(event)), tick=0, max_size=2)
+    queue.put("first", {})
+    while queue.to_dict()["queue_size"]:
+        pass
+    queue.put("delta-1", {}, droppable=True)
+    queue.put("delta-2", {}, droppable=True)
+    # 最终回复挤掉最早的增量，之后的增量丢弃自身，已入队的增量保持连续
+    assert queue.put("agent_response", {})
+    assert not queue.put("delta-3", {}, droppable=True)
+    
+    assert queue.put("error", {})
+    
+    # 队列中没有可丢弃的事件时，必须送达的事件立即超出容量入队，发送方不等待
+    assert queue.put("task_update", {})
+    stats = queue.to_dict()
+    assert stats["dropped"] == 3 and stats["overflow"] == 1 and stats["queue_size"] == 3
+    
+    release.set()
+    assert queue.flush(timeout=2)
+    assert sent == ["first", "agent_response", "error", "task_update"]
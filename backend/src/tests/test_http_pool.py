@@ -0,0 +1,125 @@
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.http_pool import (
+    CancelScope, RequestCancelled, cancel_scope, create_session, pool_saturated, pool_wait_timeout
+)
+from utils.resilience import Hedger
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"result": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        
+    def do_GET(self):
+        # 只发送部分响应体，模拟一直占用连接的流式响应
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        self.wfile.write(b"da")
+        self.wfile.flush()
+        self.server.release.wait(5)
+        
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+def test_session_reuses_connections(server_url):
+    session = create_session(pool_size=2)
+    
+    for _ in range(5):
+        session.connection_stats.record_request()
+        assert session.post(server_url, json={}).json() == {"result": "ok"}
+        
+    stats = session.connection_stats.to_dict()
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 4
+    
+def test_full_pool_waits_no_longer_than_connect_timeout(server_url):
+    session = create_session(pool_size=1, pool_timeout=30)
+    stream = session.get(server_url, stream=True)
+    
+    started = time.monotonic()
+    with pytest.raises(Exception, match="Pool"):
+        session.get(server_url, timeout=(0.2, 1))
+    assert time.monotonic() - started < 2
+    stream.close()
+    
+def test_pool_wait_is_capped():
+    assert pool_wait_timeout(0.5, 5) == 0.5
+    assert pool_wait_timeout(30, 5) == 5
+    assert pool_wait_timeout(None, 5) == 5
+    
+def test_in_use_connections_are_counted(server_url):
+    session = create_session(pool_size=1)
+    stream = session.get(server_url, stream=True)
+    assert session.connection_stats.in_use == 1
+    assert pool_saturated(session)
+    stream.close()
+    assert session.connection_stats.in_use == 0
+    assert not pool_saturated(session)
+    
+def test_cancel_scope_closes_blocked_request(server_url):
+    session = create_session(pool_size=2)
+    scope = CancelScope()
+    errors = []
+    
+    def blocked_read():
+        with cancel_scope(scope):
+            try:
+                session.get(server_url, timeout=10).content
+            except Exception as e:
+                errors.append(e)
+                
+    thread = threading.Thread(target=blocked_read)
+    thread.start()
+    time.sleep(0.2)
+    started = time.monotonic()
+    scope.cancel()
+    thread.join(5)
+    assert time.monotonic() - started < 2
+    assert errors
+    assert session.connection_stats.in_use == 0
+    # 取消后在同一范围内发出的请求直接失败
+    with cancel_scope(scope), pytest.raises(RequestCancelled):
+        session.post(server_url, json={})
+    
+def test_hedge_win_closes_primary_connection(server_url):
+    session = create_session(pool_size=4)
+    hedger = Hedger(percentile=95, min_samples=3, max_workers=2)
+    for _ in range(3):
+        hedger.latency.record(0.05)
+    calls = []
+    
+    def request():
+        calls.append(threading.current_thread())
+        if len(calls) == 1:
+            return session.get(server_url, timeout=10).text
+        return session.post(server_url, json={}).json()["result"]
+        
+    started = time.monotonic()
+    assert hedger.call(request) == "ok"
+    # 主请求在调用方线程上执行，对冲请求获胜后主请求的连接被关闭，调用方不必等到主请求超时
+    assert calls[0] is threading.current_thread()
+    assert time.monotonic() - started < 2
+    assert session.connection_stats.in_use == 0
+    assert hedger.to_dict()["hedge_wins"] == 1
@@ -0,0 +1,88 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from services.agent_service import MultiAgentSystem
+from services.job_service import JobService, JobQueueFullError
+from utils.ws_handler import WebSocketHandler
+from tests.test_agent_service import FakeSocketIO
+
+def wait_for(job_service, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = job_service.get_job(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("任务未在规定时间内完成")
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+@pytest.fixture
+def job_service(socketio):
+    ws_handler = WebSocketHandler(socketio)
+    service = JobService(MultiAgentSystem(ws_handler), ws_handler, max_workers=2)
+    yield service
+    service.shutdown()
+
+def test_submit_returns_immediately_and_completes(job_service, socketio):
+    job = job_service.submit("帮我设计一个登录页面")
+    assert job["status"] == "pending"
+    
+    finished = wait_for(job_service, job["job_id"])
+    
+    assert finished["status"] == "completed"
+    assert finished["progress"] == 1.0
+    assert [r["stage"] for r in finished["partial_results"]][0] == "mike"
+    assert len(finished["partial_results"]) == 6
+    updates = [data["task"] for event, data in socketio.events if event == "task_update"]
+    assert updates[-1]["status"] == "completed"
+    
+def test_finished_jobs_expire(job_service):
+    job = job_service.submit("需求")
+    wait_for(job_service, job["job_id"])
+    
+    job_service.jobs[job["job_id"]].finished_at = datetime.utcnow() - timedelta(seconds=job_service.result_ttl + 1)
+    
+    assert job_service.get_job(job["job_id"]) is None
+    
+def test_rejects_when_queue_full(socketio):
+    service = JobService(MultiAgentSystem(WebSocketHandler(socketio)), max_workers=1, max_pending=1)
+    try:
+        service.submit("需求一")
+        with pytest.raises(JobQueueFullError):
+            service.submit("需求二")
+    finally:
+        service.shutdown()
+        
+def test_result_is_a_snapshot_and_progress_omits_it(socketio):
+    from storage.state_backend import MemoryStateBackend
+    agent_system = MultiAgentSystem(WebSocketHandler(socketio))
+    state = MemoryStateBackend()
+    writes = []
+    put = state.put
+    state.put = lambda namespace, key, value: writes.append(value) or put(namespace, key, value)
+    service = JobService(agent_system, max_workers=1, state_backend=state)
+    try:
+        job = service.submit("需求")
+        finished = wait_for(service, job["job_id"])
+    finally:
+        service.shutdown()
+        
+    conversation = list(finished["result"]["conversation"])
+    agent_system._append_history({"role": "user", "content": "之后的请求"})
+    assert service.get_job(job["job_id"])["result"]["conversation"] == conversation
+    # 只有任务结束时的最后一次写入包含完整结果
+    assert [w["result"] is not None for w in writes].count(True) == 1
+    assert writes[-1]["result"] is not None
+        
+def test_async_flag_is_parsed_explicitly():
+    from app import app
+    client = app.test_client()
+    
+    assert client.post("/api/agent/analyze", json={"input": "需求", "async": "false"}).status_code == 200
+    assert client.post("/api/agent/analyze", json={"input": "需求", "async": "maybe"}).status_code == 400
+    response = client.post("/api/agent/analyze", json={"input": "需求", "async": "true"})
+    assert response.status_code == 202
+    assert response.get_json()["job_id"]
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import pytest
+from config import Config
+from conftest import FakeResponse
+from services.agent_service import MultiAgentSystem
+from utils.async_baidu_client import AsyncBaiduClient
+from storage.state_backend import MemoryStateBackend
+from utils.model_router import MODEL_URLS, ModelRoute, ModelRouter, default_routes
+from utils.ws_handler import WebSocketHandler
+
+class FakeSocketIO:
+    def emit(self, event, data, **kwargs):
+        pass
+
+@pytest.fixture
+def router():
+    return ModelRouter(routes={
+        "alex": ModelRoute("ERNIE-Bot-4", 0.2, 0.95),
+        "mike": ModelRoute("ERNIE-Bot-turbo")
+    }, default_model="ERNIE-Bot")
+
+@pytest.fixture
+def online_client(online_client, router):
+    """按 router 选择模型的客户端，响应带有 token 用量"""
+    online_client.router = router
+    online_client.completion_cache = None
+
+    def respond(url, payload):
+        if payload.get("stream"):
+            return FakeResponse(lines=[
+                "data: " + json.dumps({"result": "流式", "is_end": False}),
+                "data: " + json.dumps({"result": "回复", "is_end": True, "usage": {"prompt_tokens": 7, "completion_tokens": 3}})
+            ])
+        return FakeResponse({"result": "回复", "usage": {"prompt_tokens": 5, "completion_tokens": 2}})
+
+    online_client.session.respond = respond
+    return online_client
+
+def test_resolve_fills_unset_fields(router):
+    route = router.resolve("mike", 0.7, 0.8)
+    assert (route.model, route.temperature, route.top_p) == ("ERNIE-Bot-turbo", 0.7, 0.8)
+    route = router.resolve("alex", 0.7, 0.8)
+    assert (route.model, route.temperature, route.top_p) == ("ERNIE-Bot-4", 0.2, 0.95)
+    # 没有路由的操作使用默认模型和调用方的采样参数
+    route = router.resolve("chat", 0.7, 0.8)
+    assert (route.model, route.temperature, route.top_p) == ("ERNIE-Bot", 0.7, 0.8)
+
+def test_routes_are_validated():
+    with pytest.raises(ValueError):
+        ModelRoute("GPT-4")
+    with pytest.raises(ValueError):
+        ModelRoute(temperature=1.5)
+    with pytest.raises(ValueError):
+        ModelRoute.from_dict({"model": "ERNIE-Bot", "max_tokens": 100})
+    with pytest.raises(ValueError):
+        ModelRoute.from_dict(["ERNIE-Bot"])
+    with pytest.raises(ValueError):
+        ModelRouter(routes={}).set_route("unknown-stage", ModelRoute("ERNIE-Bot"))
+
+def test_runtime_routes_are_shared_between_workers(monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_ROUTES_SYNC_INTERVAL", 0)
+    state = MemoryStateBackend()
+    worker_a = ModelRouter(routes={"alex": ModelRoute("ERNIE-Bot-4")}, default_model="ERNIE-Bot", state=state)
+    worker_b = ModelRouter(routes={"alex": ModelRoute("ERNIE-Bot-4")}, default_model="ERNIE-Bot", state=state)
+
+    worker_a.set_route("bob", ModelRoute("ERNIE-Bot-8K"))
+    assert worker_b.resolve("bob", 0.7, 0.8).model == "ERNIE-Bot-8K"
+    # 删除启动时配置的路由同样对其他进程生效
+    assert worker_a.remove_route("alex")
+    assert worker_b.resolve("alex", 0.7, 0.8).model == "ERNIE-Bot"
+    assert not worker_b.remove_route("alex")
+    assert set(worker_b.get_routes()) == {"bob"}
+
+def test_route_endpoint_rejects_invalid_bodies():
+    from app import app
+    client = app.test_client()
+    assert client.put("/api/llm/routes/bob", json=[]).status_code == 400
+    assert client.put("/api/llm/routes/bob", json="x").status_code == 400
+    assert client.put("/api/llm/routes/bob", json={"model": "GPT-4"}).status_code == 400
+    assert client.put("/api/llm/routes/nobody", json={"model": "ERNIE-Bot"}).status_code == 400
+
+    assert client.put("/api/llm/routes/bob", json={"model": "ERNIE-Bot-8K"}).status_code == 200
+    assert client.get("/api/llm/routes").get_json()["routes"]["bob"]["model"] == "ERNIE-Bot-8K"
+    assert client.delete("/api/llm/routes/bob").status_code == 200
+    assert client.delete("/api/llm/routes/bob").status_code == 404
+
+def test_config_overrides_default_routes(monkeypatch):
+    monkeypatch.setattr(Config, "BAIDU_MODEL_ROUTES", json.dumps({"alex": {"model": "ERNIE-Bot-8K"}, "chat": {"top_p": 0.5}}))
+    routes = default_routes()
+    assert routes["alex"].to_dict() == {"model": "ERNIE-Bot-8K", "temperature": None, "top_p": None}
+    assert routes["chat"].top_p == 0.5
+    assert routes["mike"].model == Config.BAIDU_FAST_MODEL
+    monkeypatch.setattr(Config, "BAIDU_MODEL_ROUTES", "{不是JSON")
+    with pytest.raises(ValueError):
+        default_routes()
+
+def test_completion_uses_routed_model_and_records_stats(online_client):
+    online_client.get_completion([{"role": "user", "content": "你好"}], operation="alex")
+    url, kwargs = online_client.session.requests[-1]
+    payload = kwargs["json"]
+    assert url.endswith(MODEL_URLS["ERNIE-Bot-4"])
+    assert (payload["temperature"], payload["top_p"]) == (0.2, 0.95)
+
+    online_client.get_completion([{"role": "user", "content": "你好"}], operation="chat")
+    assert online_client.session.requests[-1][0].endswith(MODEL_URLS["ERNIE-Bot"])
+
+    models = online_client.get_stats()["routing"]["models"]
+    assert models["ERNIE-Bot-4"]["calls"] == 1
+    assert models["ERNIE-Bot-4"]["prompt_tokens"] == 5
+    assert models["ERNIE-Bot-4"]["completion_tokens"] == 2
+    assert models["ERNIE-Bot-4"]["p50_ms"] is not None
+
+def test_route_changes_apply_at_runtime(online_client, router):
+    messages = [{"role": "user", "content": "你好"}]
+    router.set_route("chat", ModelRoute("ERNIE-Bot-8K", temperature=0.3))
+    online_client.get_completion(messages, operation="chat")
+    url, kwargs = online_client.session.requests[-1]
+    payload = kwargs["json"]
+    assert url.endswith(MODEL_URLS["ERNIE-Bot-8K"])
+    assert (payload["temperature"], payload["top_p"]) == (0.3, 0.8)
+
+    assert router.remove_route("chat")
+    assert not router.remove_route("chat")
+    online_client.get_completion(messages, operation="chat")
+    assert online_client.session.requests[-1][0].endswith(MODEL_URLS["ERNIE-Bot"])
+
+def test_pipeline_stages_use_their_routes(online_client):
+    agent_system = MultiAgentSystem(WebSocketHandler(FakeSocketIO()))
+    agent_system.baidu_client = online_client
+    result = agent_system.process_input("帮我设计一个登录页面")
+
+    assert result["success"]
+    urls = [url for url, kwargs in online_client.session.requests if kwargs["json"].get("stream")]
+    assert len(urls) == 6
+    assert sum(url.endswith(MODEL_URLS["ERNIE-Bot-turbo"]) for url in urls) == 1
+    assert sum(url.endswith(MODEL_URLS["ERNIE-Bot-4"]) for url in urls) == 1
+    models = online_client.get_stats()["routing"]["models"]
+    assert models["ERNIE-Bot"]["calls"] == 4 and models["ERNIE-Bot"]["errors"] == 0
+    assert models["ERNIE-Bot-turbo"]["completion_tokens"] == 3
+
+def test_async_client_uses_routed_model(online_client, monkeypatch):
+    client = AsyncBaiduClient(sync_client=online_client)
+    requested = []
+
+    class FakeHttp:
+        async def post(self, url, **kwargs):
+            requested.append(url)
+            return FakeResponse({"result": "异步回复"})
+
+    monkeypatch.setattr(client, "_get_http", lambda: FakeHttp())
+    assert asyncio.run(client.get_completion([{"role": "user", "content": "你好"}], operation="mike")) == "异步回复"
+    assert requested[0].endswith(MODEL_URLS["ERNIE-Bot-turbo"])
+    assert online_client.get_stats()["routing"]["models"]["ERNIE-Bot-turbo"]["calls"] == 1
+
+def test_tasks_use_the_route_of_their_agent(online_client):
+    agent_system = MultiAgentSystem(WebSocketHandler(FakeSocketIO()))
+    agent_system.baidu_client = online_client
+    task = agent_system.create_task("实现登录接口", "编写登录接口的代码", "Alex")
+
+    agent_system.execute_task(task["task_id"])
+    url, kwargs = online_client.session.requests[-1]
+    payload = kwargs["json"]
+    assert url.endswith(MODEL_URLS["ERNIE-Bot-4"])
+    assert (payload["temperature"], payload["top_p"]) == (0.2, 0.95)
@@ -0,0 +1,53 @@
+import threading
+import time
+import pytest
+from services.pipeline import PipelineStage, PipelineExecutor
+
+def test_independent_stages_overlap():
+    stages = [
+        PipelineStage("bob", "Bob", "{input}"),
+        PipelineStage("alex", "Alex", "{bob}", depends_on=["bob"]),
+        PipelineStage("david", "David", "{bob}", depends_on=["bob"]),
+        PipelineStage("summary", "Mike总结", "{alex}{david}", depends_on=["alex", "david"])
+    ]
+    barrier = threading.Barrier(2, timeout=2)
+    
+    def run_stage(stage, outputs):
+        # alex 和 david 必须同时运行才能通过屏障
+        if stage.name in ("alex", "david"):
+            barrier.wait()
+        time.sleep(0.01)
+        return stage.build_prompt("需求", outputs) + stage.name
+        
+    result = PipelineExecutor(stages, max_workers=2).run(run_stage)
+    
+    assert result["outputs"]["summary"] == "需求bobalex需求bobdavidsummary"
+    assert [t["stage"] for t in result["stage_timings"]] == ["bob", "alex", "david", "summary"]
+    assert result["critical_path_ms"] <= result["total_ms"] + 1
+    
+def test_cycle_is_rejected():
+    stages = [
+        PipelineStage("a", "A", "", depends_on=["b"]),
+        PipelineStage("b", "B", "", depends_on=["a"])
+    ]
+    with pytest.raises(ValueError):
+        PipelineExecutor(stages)
+        
+def test_template_must_declare_dependencies():
+    with pytest.raises(ValueError):
+        PipelineStage("emma", "Emma", "{mike}")
+        
+def test_stage_error_stops_pipeline():
+    stages = [
+        PipelineStage("a", "A", ""),
+        PipelineStage("b", "B", "", depends_on=["a"])
+    ]
+    executor = PipelineExecutor(stages)
+    
+    def run_stage(stage, outputs):
+        raise RuntimeError("失败")
+        
+    with pytest.raises(RuntimeError):
+        executor.run(run_stage)
+    assert "b" not in executor.timings
+    assert executor.timings["a"]["error"] == "失败"
@@ -0,0 +1,64 @@
+from services.pipeline import PipelineStage
+from utils.prompt_budget import PromptBudget, estimate_tokens, trim_to_tokens, OMITTED_MARK
+
+STAGE = PipelineStage(
+    name="summary",
+    agent_name="Mike总结",
+    prompt_template="请总结。需求: '{input}'，规划: '{emma}'，方案: '{bob}'",
+    depends_on=["emma", "bob"]
+)
+
+def test_estimate_tokens_counts_chinese_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好世界") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("你好 abcd") == 4
+    
+def test_trim_drops_code_blocks_first():
+    text = "说明文字\n```python\n" + "x = 1\n" * 200 + "```\n结论"
+    
+    trimmed = trim_to_tokens(text, 30)
+    
+    assert "[代码已省略]" in trimmed
+    assert "结论" in trimmed
+    
+def test_trim_keeps_leading_lines():
+    text = "\n".join(f"第{i}条建议" for i in range(100))
+    
+    trimmed = trim_to_tokens(text, 50)
+    
+    assert trimmed.startswith("第0条建议")
+    assert trimmed.endswith(OMITTED_MARK)
+    assert estimate_tokens(trimmed) <= 50
+    
+def test_prompt_within_budget_is_unchanged():
+    budget = PromptBudget(default_budget=1000, mode="extractive")
+    
+    prompt, stats = budget.build_prompt(STAGE, "需求", {"emma": "规划", "bob": "方案"})
+    
+    assert prompt == "请总结。需求: '需求'，规划: '规划'，方案: '方案'"
+    assert stats["compressed"] == []
+    
+def test_long_outputs_are_compressed_to_budget():
+    budget = PromptBudget(default_budget=200, mode="extractive")
+    outputs = {"emma": "短规划", "bob": "\n".join("架构要点" * 5 for _ in range(100))}
+    
+    prompt, stats = budget.build_prompt(STAGE, "需求", outputs)
+    
+    assert stats["original_tokens"] > 200
+    assert stats["final_tokens"] <= 200
+    assert stats["compressed"] == ["bob"]
+    assert "短规划" in prompt
+    
+def test_summary_mode_uses_summarizer():
+    calls = []
+    
+    def summarize(text, max_tokens):
+        calls.append(max_tokens)
+        return "摘要"
+        
+    budget = PromptBudget(default_budget=100, summarize=summarize, mode="summary")
+    prompt, _ = budget.build_prompt(STAGE, "需求", {"emma": "规划" * 200, "bob": "方案" * 200})
+    
+    assert len(calls) == 2
+    assert prompt == "请总结。需求: '需求'，规划: '摘要'，方案: '摘要'"
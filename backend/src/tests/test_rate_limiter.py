@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+import requests
+from conftest import FakeResponse
+from services.chat_service import ChatService
+from utils.baidu_client import BaiduClient
+from utils.completion_cache import CompletionCache
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.prompt_budget import estimate_tokens
+from utils.rate_limiter import RateLimiter, estimate_message_tokens
+from utils.resilience import CircuitOpenError
+
+def test_disabled_limiter_does_not_wait():
+    limiter = RateLimiter(requests_per_minute=0, tokens_per_minute=0)
+    assert not limiter.enabled
+    assert limiter.acquire(10 ** 6) == 0.0
+
+def test_requests_are_spaced_by_rate():
+    limiter = RateLimiter(requests_per_minute=1200, burst_seconds=0.05)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    # 桶里只有 1 个额度，之后每 50ms 补充一个
+    assert time.monotonic() - started >= 0.14
+    stats = limiter.to_dict()["priorities"]["background"]
+    assert stats["acquired"] == 4 and stats["queued"] == 3
+
+def test_token_rate_and_settle():
+    limiter = RateLimiter(tokens_per_minute=60000, burst_seconds=0.1)
+    # 容量 100 个 token，超过容量的请求在桶满时放行
+    assert limiter.acquire(500) < 0.01
+    limiter.settle(-500)
+    assert limiter.acquire(100) < 0.01
+
+def test_interactive_requests_jump_the_queue():
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=0.1)
+    limiter.acquire()
+    order = []
+
+    def acquire(priority):
+        limiter.acquire(priority=priority)
+        order.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=("background",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.03)
+    assert limiter.to_dict()["queue_depth"] == 3
+    interactive = threading.Thread(target=acquire, args=("interactive",))
+    interactive.start()
+    for thread in threads + [interactive]:
+        thread.join()
+
+    assert order == ["interactive", "background", "background", "background"]
+    stats = limiter.to_dict()
+    assert stats["queue_depth"] == 0
+    assert stats["priorities"]["interactive"]["p95_wait_ms"] < stats["priorities"]["background"]["max_wait_ms"]
+
+def test_wait_beyond_deadline_raises():
+    limiter = RateLimiter(requests_per_minute=60, burst_seconds=1)
+    limiter.acquire()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(priority="interactive", deadline=Deadline(0.05))
+    assert limiter.to_dict()["priorities"]["interactive"]["timeouts"] == 1
+    with pytest.raises(ValueError):
+        limiter.acquire(priority="urgent")
+
+def test_upstream_rate_limit_drains_bucket(online_client):
+    client = online_client
+    client.rate_limiter = RateLimiter(requests_per_minute=6000, burst_seconds=1)
+    response = requests.Response()
+    response.status_code = 429
+    client.session.outcomes = [FakeResponse(error=requests.exceptions.HTTPError(response=response))]
+
+    assert client.get_completion([{"role": "user", "content": "你好"}]) == "回复2"
+    stats = client.get_stats()["rate_limit"]
+    assert stats["rate_limited"] == 1
+    assert stats["priorities"]["background"]["acquired"] == 2
+    # 限流错误清空了请求桶，重试需要排队等待
+    assert stats["priorities"]["background"]["queued"] == 1
+
+def test_chat_messages_use_interactive_priority(monkeypatch):
+    service = ChatService()
+    calls = []
+
+    def fake_completion(messages, use_cache=True, deadline=None, priority="background", operation="completion"):
+        calls.append(priority)
+        return "回复"
+
+    monkeypatch.setattr(service.baidu_client, "get_completion", fake_completion)
+    service.process_message("rate-limit-session", "你好")
+    assert calls == ["interactive"]
+
+class CountingLimiter(RateLimiter):
+    """记录 token 桶净扣除量的限流器"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.reserved = 0
+
+    def _take(self, tokens):
+        super()._take(tokens)
+        self.reserved += tokens
+
+    def settle(self, tokens):
+        super().settle(tokens)
+        self.reserved += tokens
+
+def test_failed_attempts_refund_their_reservation(online_client):
+    limiter = CountingLimiter(tokens_per_minute=600000)
+    client = online_client
+    client.rate_limiter = limiter
+    response = requests.Response()
+    response.status_code = 503
+    client.session.outcomes = [FakeResponse(error=requests.exceptions.HTTPError(response=response)) for _ in range(2)]
+
+    messages = [{"role": "user", "content": "你好"}]
+    assert client.get_completion(messages) == "回复3"
+    assert limiter.to_dict()["priorities"]["background"]["acquired"] == 3
+    # 只有成功的尝试按实际输入和输出计入额度
+    assert limiter.reserved == estimate_message_tokens(messages) + estimate_tokens("回复3")
+
+def test_open_breaker_does_not_take_quota(monkeypatch):
+    limiter = RateLimiter(requests_per_minute=6000)
+    client = BaiduClient(completion_cache=CompletionCache(max_entries=10, ttl=60, db_path=""), rate_limiter=limiter)
+    client.test_mode = False
+    for _ in range(client.breaker.failure_threshold):
+        client.breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        client.get_completion([{"role": "user", "content": "你好"}])
+    assert limiter.to_dict()["priorities"]["background"]["acquired"] == 0
@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+import time
+import pytest
+from sqlalchemy import inspect
+from config import Config
+from models.chat import ChatMessage, ChatSession
+from services.agent_service import MultiAgentSystem
+from services.chat_service import ChatService
+from storage.database import create_db_engine
+from storage.repositories import AgentRepository, ChatRepository
+from storage.write_behind import WriteBehindQueue
+from tests.test_agent_service import FakeSocketIO
+from utils.ws_handler import WebSocketHandler
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+@pytest.fixture
+def write_queue(engine):
+    return WriteBehindQueue(engine, batch_size=50, flush_interval=0.01)
+
+def test_chat_sessions_survive_restart(engine, write_queue):
+    service = ChatService(ChatRepository(engine, write_queue))
+    session_id = service.create_session()["session_id"]
+    service.process_message(session_id, "帮我写一个登录接口")
+    service.archive_session(session_id)
+    original = service.sessions[session_id]
+    write_queue.flush()
+
+    restored = ChatService(ChatRepository(engine, write_queue))
+    # 启动时只加载元数据，版本号和最后活跃时间从数据库恢复
+    assert not restored.sessions[session_id].loaded
+    assert restored.sessions[session_id].version == original.version
+    assert restored.sessions[session_id].last_active_at == original.last_active_at
+    assert restored.list_sessions()[0]["message_count"] == 2
+
+    session = restored.get_session(session_id)
+    assert session["title"] == "帮我写一个登录接口"
+    assert session["is_archived"]
+    assert [m["role"] for m in session["messages"]] == ["user", "assistant"]
+
+def test_deleted_session_is_not_restored(engine, write_queue):
+    service = ChatService(ChatRepository(engine, write_queue))
+    session_id = service.create_session("临时会话")["session_id"]
+    service.delete_session(session_id)
+    write_queue.flush()
+
+    assert ChatService(ChatRepository(engine, write_queue)).get_session(session_id) is None
+
+def test_tasks_artifacts_and_conversation_survive_restart(engine, write_queue):
+    repository = AgentRepository(engine, write_queue)
+    system = MultiAgentSystem(WebSocketHandler(FakeSocketIO()), repository=repository)
+    task = system.create_task("登录页", "实现登录页", "Alex", dependencies=[])
+    system.update_task_status(task["task_id"], "completed")
+    system.save_code_artifact("src/login.py", "print(1)", "python", "Alex")
+    system.save_code_artifact("src/login.py", "print(2)", "python", "Alex")
+    system.process_input("帮我设计一个登录页面")
+    write_queue.flush()
+
+    restored = MultiAgentSystem(WebSocketHandler(FakeSocketIO()), repository=repository)
+
+    assert restored.get_task(task["task_id"])["status"] == "completed"
+    assert restored.get_artifact_version("src/login.py")["content"] == "print(2)"
+    assert len(restored.conversation_history) == len(system.conversation_history)
+
+def test_writes_are_group_committed(engine):
+    write_queue = WriteBehindQueue(engine, batch_size=100, flush_interval=0.5)
+    repository = AgentRepository(engine, write_queue)
+    for i in range(100):
+        repository.append_conversation({"role": "user", "content": f"消息{i}", "timestamp": i})
+    write_queue.flush()
+
+    stats = write_queue.to_dict()
+    assert stats["written"] == 100
+    assert stats["batches"] <= 2
+    assert len(repository.load_conversation()) == 100
+
+def test_full_queue_applies_backpressure_instead_of_losing_messages(engine):
+    write_queue = WriteBehindQueue(engine, batch_size=1, flush_interval=0, max_queue=1, put_timeout=0.05)
+    release = threading.Event()
+    write = write_queue._write
+
+    def stalled_write(ops):
+        release.wait(5)
+        write(ops)
+
+    write_queue._write = stalled_write
+    repository = ChatRepository(engine, write_queue)
+    session = ChatSession(title="积压")
+    messages = [ChatMessage("user", f"消息{i}", session_id=session.session_id) for i in range(3)]
+    repository.save_message(messages[0], 0)
+    while write_queue.to_dict()["queue_size"]:
+        time.sleep(0.005)
+    repository.save_message(messages[1], 1)
+
+    # 队列已满：普通写操作等待 put_timeout 后丢弃，等待写入提交也有上限
+    repository.save_session(session)
+    assert write_queue.to_dict()["dropped"] == 1
+    assert not write_queue.flush(timeout=0.05)
+    # 消息的写操作一直等到队列有空位
+    writer = threading.Thread(target=repository.save_message, args=(messages[2], 2))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+
+    release.set()
+    writer.join(5)
+    assert write_queue.flush(timeout=5)
+    assert [m.content for m in repository.load_messages(session.session_id)] == ["消息0", "消息1", "消息2"]
+    assert write_queue.to_dict()["dropped"] == 1
+    assert write_queue.to_dict()["blocked"] == 2
+
+def test_message_offset_follows_saved_positions(engine, write_queue):
+    repository = ChatRepository(engine, write_queue)
+    session = ChatSession(title="位置")
+    repository.save_session(session)
+    for position in (0, 1, 3):
+        repository.save_message(ChatMessage("user", f"消息{position}", session_id=session.session_id), position)
+    write_queue.flush()
+
+    assert repository.load_sessions()[session.session_id].message_offset == 4
+
+def test_history_pages_are_loaded_from_database(engine, write_queue, monkeypatch):
+    repository = ChatRepository(engine, write_queue)
+    session = ChatSession(title="长会话")
+    for i in range(10):
+        message = ChatMessage("user" if i % 2 == 0 else "assistant", f"消息{i}", session_id=session.session_id)
+        session.add_message(message, update_title=False)
+        repository.save_message(message, i)
+    session.summarized_count = 8
+    repository.save_session(session)
+    write_queue.flush()
+    monkeypatch.setattr(Config, "CHAT_HISTORY_MAX_PAGE_SIZE", 4)
+
+    restored = ChatService(repository)
+    page = restored.get_history_page(session.session_id, limit=2)
+    # 只加载摘要之后的消息和最近一页
+    assert restored.sessions[session.session_id].message_offset == 6
+
+    contents = [m["content"] for m in page["messages"]]
+    while page["has_more"]:
+        page = restored.get_history_page(session.session_id, before=page["next_before"], limit=2)
+        contents = [m["content"] for m in page["messages"]] + contents
+    assert contents == [f"消息{i}" for i in range(10)]
+
+def test_least_recently_used_sessions_are_unloaded(engine, write_queue, monkeypatch):
+    monkeypatch.setattr(Config, "CHAT_MAX_LOADED_SESSIONS", 1)
+    service = ChatService(ChatRepository(engine, write_queue))
+    first = service.create_session()["session_id"]
+    second = service.create_session()["session_id"]
+    service.process_message(first, "第一个会话")
+    service.process_message(second, "第二个会话")
+
+    assert not service.sessions[first].loaded
+    assert service.sessions[first].messages == []
+    assert service.list_sessions()[1]["message_count"] == 2
+    assert [m["content"] for m in service.get_session(first)["messages"]][0] == "第一个会话"
+    assert not service.sessions[second].loaded
+
+def test_full_write_queue_drops_instead_of_blocking(engine, monkeypatch):
+    write_queue = WriteBehindQueue(engine, batch_size=1, flush_interval=0, max_queue=1)
+    release = threading.Event()
+    monkeypatch.setattr(write_queue, "_write", lambda ops: release.wait())
+    repository = AgentRepository(engine, write_queue)
+    for i in range(5):
+        repository.append_conversation({"role": "user", "content": f"消息{i}", "timestamp": i})
+    release.set()
+
+    # 后台线程和队列最多各持有一个写操作，其余的被丢弃
+    assert write_queue.to_dict()["dropped"] >= 3
+
+def test_upsert_falls_back_without_native_support(engine, write_queue, monkeypatch):
+    monkeypatch.setattr(write_queue, "_upsert_statement", lambda table: None)
+    repository = ChatRepository(engine, write_queue)
+    service = ChatService(repository)
+    session_id = service.create_session("初始标题")["session_id"]
+    service.update_session_title(session_id, "新标题")
+    write_queue.flush()
+
+    sessions = repository.load_sessions()
+    assert list(sessions) == [session_id]
+    assert sessions[session_id].title == "新标题"
+    assert write_queue.to_dict()["failed"] == 0
+
+def test_missing_columns_are_added_to_existing_tables(tmp_path):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE chat_sessions (session_id VARCHAR(64) PRIMARY KEY, title VARCHAR(255) NOT NULL, "
+            "created_at DATETIME NOT NULL, is_archived BOOLEAN NOT NULL, summary TEXT NOT NULL, "
+            "summarized_count INTEGER NOT NULL)"
+        )
+
+    engine = create_db_engine(f"sqlite:///{path}")
+    columns = {column["name"] for column in inspect(engine).get_columns("chat_sessions")}
+    assert {"last_active_at", "version"} <= columns
@@ -0,0 +1,152 @@
+import threading
+import time
+import pytest
+import requests
+from conftest import FakeResponse
+from utils.resilience import (
+    BaiduAPIError, CircuitBreaker, Hedger, RetryPolicy, UpstreamError, classify_error
+)
+
+def http_error(status: int) -> requests.exceptions.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+def test_classify_error():
+    assert classify_error(http_error(401)) == "auth"
+    assert classify_error(http_error(429)) == "retryable"
+    assert classify_error(http_error(503)) == "retryable"
+    assert classify_error(http_error(400)) == "fatal"
+    assert classify_error(requests.exceptions.ConnectTimeout()) == "retryable"
+    assert classify_error(UpstreamError("断开")) == "retryable"
+    assert classify_error(BaiduAPIError(111, "令牌过期")) == "auth"
+    assert classify_error(BaiduAPIError(18, "QPS 超限")) == "retryable"
+    assert classify_error(BaiduAPIError(336003, "参数错误")) == "fatal"
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=2)
+    for attempt in range(1, 6):
+        assert 0 <= policy.delay(attempt) <= min(2, 0.5 * 2 ** (attempt - 1))
+
+def test_breaker_opens_and_recovers_through_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # 半开状态只放行一个探测请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.to_dict()["opened"] == 1
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_transient_error_is_retried_without_test_mode(online_client):
+    online_client.session.outcomes = [requests.exceptions.ConnectionError("断开"), FakeResponse(error=http_error(503))]
+    assert online_client.get_completion([{"role": "user", "content": "你好"}]) == "回复3"
+    assert online_client.session.calls == 3
+    assert not online_client.test_mode
+    assert online_client.get_stats()["retries"]["retries"] == 2
+    assert online_client.breaker.state == "closed"
+
+def test_auth_error_refreshes_token_with_bounded_attempts(online_client):
+    online_client.session.outcomes = [FakeResponse(error=http_error(401))] * 5
+    with pytest.raises(Exception, match="已尝试 3 次"):
+        online_client.get_completion([{"role": "user", "content": "你好"}])
+    assert online_client.session.calls == 3
+
+def test_fatal_error_is_not_retried(online_client):
+    online_client.session.outcomes = [FakeResponse({"error_code": 336003, "error_msg": "参数错误"})]
+    with pytest.raises(Exception, match="参数错误"):
+        online_client.get_completion([{"role": "user", "content": "你好"}])
+    assert online_client.session.calls == 1
+    assert online_client.breaker.state == "closed"
+
+def test_breaker_rejects_calls_after_repeated_failures(online_client):
+    online_client.session.outcomes = [requests.exceptions.ConnectionError("断开")] * 3
+    with pytest.raises(Exception):
+        online_client.get_completion([{"role": "user", "content": "你好"}])
+    assert online_client.breaker.state == "open"
+
+    with pytest.raises(Exception, match="熔断"):
+        online_client.get_completion([{"role": "user", "content": "再试"}])
+    assert online_client.session.calls == 3
+    assert not online_client.test_mode
+
+def test_stream_retries_before_first_chunk(online_client):
+    online_client.session.outcomes = [
+        FakeResponse(lines=['{"error_code": 18, "error_msg": "QPS 超限"}']),
+        FakeResponse(lines=['data: {"result": "你", "is_end": false}', '', 'data: {"result": "好", "is_end": true}'])
+    ]
+    chunks = list(online_client.stream_completion([{"role": "user", "content": "你好"}]))
+    assert chunks == ["你", "好"]
+    assert online_client.session.calls == 2
+
+def test_hedge_takes_faster_result():
+    hedger = Hedger(percentile=95, min_samples=3, max_workers=4)
+    for _ in range(3):
+        hedger.call(lambda: "预热")
+    calls = []
+    lock = threading.Lock()
+
+    def slow_then_fast():
+        with lock:
+            calls.append(len(calls))
+            first = len(calls) == 1
+        time.sleep(0.5 if first else 0.01)
+        return "慢" if first else "快"
+
+    hedges = []
+    assert hedger.call(slow_then_fast, on_hedge=lambda: hedges.append(1)) == "快"
+    # 对冲请求发送前通知调用方扣除额度
+    assert hedges == [1]
+    stats = hedger.to_dict()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_win_rate"] == 1.0
+
+def test_hedge_skipped_when_saturated():
+    hedger = Hedger(percentile=95, min_samples=3, max_workers=4, saturated=lambda: True)
+    for _ in range(3):
+        hedger.call(lambda: "预热")
+    threads = []
+    hedges = []
+
+    def slow():
+        threads.append(threading.current_thread())
+        time.sleep(0.1)
+        return "慢"
+
+    assert hedger.call(slow, on_hedge=lambda: hedges.append(1)) == "慢"
+    # 主请求在调用方线程上执行，连接池饱和时不发送对冲请求，也不扣除额度
+    assert threads == [threading.current_thread()]
+    assert hedges == []
+    stats = hedger.to_dict()
+    assert stats["hedged"] == 0
+    assert stats["skipped"] == 1
+
+def test_hedge_failure_falls_back_to_primary_error():
+    hedger = Hedger(percentile=95, min_samples=3, max_workers=4)
+    for _ in range(3):
+        hedger.call(lambda: "预热")
+
+    def failing():
+        time.sleep(0.05)
+        raise UpstreamError("网络错误")
+
+    with pytest.raises(UpstreamError):
+        hedger.call(failing)
+    assert hedger.to_dict()["hedged"] == 1
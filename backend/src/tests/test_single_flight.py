@@ -0,0 +1,136 @@
+import threading
+import time
+import pytest
+from conftest import FakeResponse
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.single_flight import SingleFlight
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "等待条件超时"
+        time.sleep(0.005)
+
+def run_concurrently(count, target):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+@pytest.fixture
+def gated_client(online_client):
+    """上游请求在 release 之前一直挂起，用于制造并发的相同请求"""
+    client = online_client
+    client.completion_cache = None
+    client.release = threading.Event()
+
+    def respond(url, payload):
+        client.release.wait(2)
+        return FakeResponse({"result": f"回复{client.session.calls}"})
+
+    client.session.respond = respond
+    return client
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return "结果"
+
+    threads, results = run_concurrently(5, lambda: flight.do("key", slow))
+    wait_for(lambda: flight.to_dict()["waiting"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["结果"] * 5
+    assert len(calls) == 1
+    assert flight.to_dict() == {"executed": 1, "saved_calls": 4, "in_flight": 0, "waiting": 0}
+
+def test_error_is_shared_with_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise Exception("上游错误")
+
+    threads, results = run_concurrently(3, lambda: flight.do("key", failing))
+    wait_for(lambda: flight.to_dict()["waiting"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(r, Exception) and "上游错误" in str(r) for r in results)
+    # 共享到的异常不算节省的调用
+    assert flight.to_dict()["saved_calls"] == 0
+    # 调用结束后不再保留，之后的请求重新执行
+    assert flight.do("key", lambda: "新结果") == "新结果"
+
+def test_waiter_retries_when_leader_runs_out_of_time():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def leader():
+        release.wait(2)
+        raise DeadlineExceeded("执行者超时")
+
+    threads, results = run_concurrently(1, lambda: flight.do("key", leader))
+    wait_for(lambda: flight.to_dict()["in_flight"] == 1)
+    waiter_threads, waiter_results = run_concurrently(1, lambda: flight.do("key", lambda: "重新请求", Deadline(5)))
+    wait_for(lambda: flight.to_dict()["waiting"] == 1)
+    release.set()
+    for thread in threads + waiter_threads:
+        thread.join()
+
+    assert isinstance(results[0], DeadlineExceeded)
+    assert waiter_results == ["重新请求"]
+    assert flight.to_dict()["saved_calls"] == 0
+
+def test_identical_code_reviews_go_upstream_once(gated_client):
+    reviews, review_results = run_concurrently(4, lambda: gated_client.get_code_review("print(1)"))
+    explanations, explanation_results = run_concurrently(3, lambda: gated_client.get_code_explanation("print(1)"))
+    wait_for(lambda: gated_client.single_flight.to_dict()["waiting"] == 5)
+    gated_client.release.set()
+    for thread in reviews + explanations:
+        thread.join()
+
+    # 审查和解释的提示词不同，各自只发送一次
+    assert gated_client.session.calls == 2
+    assert len(set(review_results)) == 1 and len(set(explanation_results)) == 1
+    assert gated_client.get_stats()["single_flight"]["saved_calls"] == 5
+
+def test_uncached_calls_are_not_coalesced(gated_client):
+    gated_client.release.set()
+    messages = [{"role": "user", "content": "每次都要新的结果"}]
+    threads, results = run_concurrently(3, lambda: gated_client.get_completion(messages, use_cache=False))
+    for thread in threads:
+        thread.join()
+    assert gated_client.session.calls == 3
+    assert gated_client.get_stats()["single_flight"]["executed"] == 0
+
+def test_different_priorities_are_not_coalesced(gated_client):
+    messages = [{"role": "user", "content": "同一个问题"}]
+    background, background_results = run_concurrently(1, lambda: gated_client.get_completion(messages))
+    wait_for(lambda: gated_client.session.calls == 1)
+    # 交互请求不等待后台请求的结果，按自己的优先级单独发送
+    interactive, interactive_results = run_concurrently(
+        1, lambda: gated_client.get_completion(messages, priority="interactive")
+    )
+    wait_for(lambda: gated_client.session.calls == 2)
+    gated_client.release.set()
+    for thread in background + interactive:
+        thread.join()
+    assert gated_client.get_stats()["single_flight"]["executed"] == 2
+    assert gated_client.get_stats()["single_flight"]["saved_calls"] == 0
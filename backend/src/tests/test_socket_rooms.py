@@ -0,0 +1,49 @@
+import pytest
+from app import app, socketio, ws_handler
+
+def connect(count, **kwargs):
+    return [socketio.test_client(app, **kwargs) for _ in range(count)]
+
+def received(client, event):
+    return [packet for packet in client.get_received() if packet["name"] == event]
+
+@pytest.mark.parametrize("bystanders", [5, 50])
+def test_session_events_only_reach_subscribed_clients(bystanders):
+    others = connect(bystanders)
+    subscriber = socketio.test_client(app)
+    subscriber.emit("subscribe", {"sessionId": "session-1"})
+    by_query = socketio.test_client(app, query_string="sessionId=session-1")
+    for client in others + [subscriber, by_query]:
+        client.get_received()
+        
+    ws_handler.emit_agent_response("Mike", "只发给会话1", session_id="session-1")
+    ws_handler.flush()
+    
+    # 每个事件的投递次数只取决于房间内的连接数，与总连接数无关
+    assert len(received(subscriber, "agent_response")) == 1
+    assert len(received(by_query, "agent_response")) == 1
+    assert sum(len(received(client, "agent_response")) for client in others) == 0
+    for client in others + [subscriber, by_query]:
+        client.disconnect()
+        
+def test_events_without_session_are_broadcast():
+    clients = connect(3)
+    for client in clients:
+        client.get_received()
+        
+    ws_handler.emit_agent_response("Mike", "广播消息")
+    ws_handler.flush()
+    
+    assert all(len(received(client, "agent_response")) == 1 for client in clients)
+    for client in clients:
+        client.disconnect()
+        
+def test_connect_status_is_not_broadcast():
+    first = socketio.test_client(app)
+    first.get_received()
+    second = socketio.test_client(app)
+    
+    assert received(first, "connection_status") == []
+    assert len(received(second, "connection_status")) == 1
+    first.disconnect()
+    second.disconnect()
@@ -0,0 +1,232 @@
+import pytest
+from config import Config
+from services.agent_service import MultiAgentSystem
+from services.chat_service import ChatService
+from services.job_service import JobService
+from tests.test_agent_service import FakeSocketIO
+from utils.ws_handler import WebSocketHandler
+from storage.state_backend import (
+    ChangeFeed, MemoryStateBackend, SQLiteStateBackend, RedisStateBackend, create_state_backend
+)
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    if request.param == "sqlite":
+        return SQLiteStateBackend(str(tmp_path / "state.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisStateBackend(client=fakeredis.FakeRedis(decode_responses=True))
+
+@pytest.fixture
+def shared(tmp_path):
+    """两个工作进程共用的 SQLite 存储，各自使用独立的连接"""
+    path = str(tmp_path / "shared.db")
+    return SQLiteStateBackend(path), SQLiteStateBackend(path)
+
+def test_documents(backend):
+    assert backend.get("sessions", "s1") is None
+    backend.put("sessions", "s1", {"title": "会话"})
+    backend.put("sessions", "s2", {"title": "另一个"})
+    assert backend.get("sessions", "s1") == {"title": "会话"}
+    assert sorted(backend.keys("sessions")) == ["s1", "s2"]
+    assert backend.items("sessions")["s2"] == {"title": "另一个"}
+
+    backend.delete("sessions", "s1")
+    assert backend.get("sessions", "s1") is None
+    assert backend.keys("jobs") == []
+
+def test_add_only_once(backend):
+    assert backend.add("task_claims", "t1", {"worker": 1})
+    assert not backend.add("task_claims", "t1", {"worker": 2})
+    assert backend.get("task_claims", "t1") == {"worker": 1}
+
+def test_lists(backend):
+    for i in range(3):
+        assert backend.append("session_messages", "s1", {"i": i}) == i + 1
+    assert [item["i"] for item in backend.get_list("session_messages", "s1")] == [0, 1, 2]
+    assert [item["i"] for item in backend.get_list("session_messages", "s1", 2)] == [2]
+    assert [item["i"] for item in backend.get_list("session_messages", "s1", 0, 2)] == [0, 1]
+    assert backend.get_list("session_messages", "s1", 1, 1) == []
+
+    assert backend.list_length("session_messages", "s1") == 3
+
+    backend.delete_list("session_messages", "s1")
+    assert backend.get_list("session_messages", "s1") == []
+    assert backend.list_length("session_messages", "s1") == 0
+
+def test_trimmed_lists_keep_positions(backend):
+    for i in range(5):
+        backend.append("changes", "sessions", {"i": i})
+    backend.trim_list("changes", "sessions", 3)
+    
+    assert backend.list_start("changes", "sessions") == 3
+    assert backend.list_length("changes", "sessions") == 5
+    assert [item["i"] for item in backend.get_list("changes", "sessions")] == [3, 4]
+    assert [item["i"] for item in backend.get_list("changes", "sessions", 4)] == [4]
+    assert backend.get_list("changes", "sessions", 0, 3) == []
+    assert backend.append("changes", "sessions", {"i": 5}) == 6
+    
+def test_change_feed_returns_only_new_keys(backend):
+    writer = ChangeFeed(backend, "sessions")
+    reader = ChangeFeed(backend, "sessions")
+    writer.publish("s1")
+    # 首次读取需要调用方全量同步，之后只返回新的变更
+    assert reader.poll() is None
+    assert reader.poll() == []
+    for key in ("s2", "s3", "s2"):
+        writer.publish(key)
+    assert reader.poll() == ["s2", "s3"]
+    assert reader.poll() == []
+
+def test_change_feed_is_compacted_behind_the_slowest_reader(backend, monkeypatch):
+    monkeypatch.setattr(Config, "CHANGE_FEED_COMPACT_INTERVAL", 4)
+    writer = ChangeFeed(backend, "sessions")
+    fast, slow = ChangeFeed(backend, "sessions"), ChangeFeed(backend, "sessions")
+    assert fast.poll() is None and slow.poll() is None
+    writer.publish("s1")
+    assert fast.poll() == ["s1"]
+    for key in ("s2", "s3", "s4"):
+        writer.publish(key)
+    # 第 4 条变更触发清理，慢的读取方还没有读过任何变更
+    assert backend.list_start("changes", "sessions") == 0
+    
+    assert slow.poll() == ["s1", "s2", "s3", "s4"]
+    assert fast.poll() == ["s2", "s3", "s4"]
+    for key in ("s5", "s6", "s7", "s8"):
+        writer.publish(key)
+    assert backend.list_start("changes", "sessions") == 4
+    assert slow.poll() == fast.poll() == ["s5", "s6", "s7", "s8"]
+    
+def test_reader_resyncs_after_its_changes_are_trimmed(backend, monkeypatch):
+    monkeypatch.setattr(Config, "CHANGE_FEED_COMPACT_INTERVAL", 0)
+    writer, reader = ChangeFeed(backend, "tasks"), ChangeFeed(backend, "tasks")
+    assert reader.poll() is None
+    writer.publish("t1")
+    # 读取方长时间没有读取，清理时不再等待它
+    monkeypatch.setattr(Config, "CHANGE_FEED_READER_TTL", -1)
+    writer.compact()
+    
+    assert reader.poll() is None
+    writer.publish("t2")
+    assert reader.poll() == ["t2"]
+    
+def test_sqlite_lists_from_older_versions_are_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE state_lists (id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, value TEXT NOT NULL)"
+        )
+        for i in range(3):
+            conn.execute("INSERT INTO state_lists (namespace, key, value) VALUES ('m', 's1', ?)", (f'{{"i": {i}}}',))
+    
+    backend = SQLiteStateBackend(path)
+    assert backend.list_length("m", "s1") == 3
+    assert backend.append("m", "s1", {"i": 3}) == 4
+    assert [item["i"] for item in backend.get_list("m", "s1", 1)] == [1, 2, 3]
+    
+def test_create_state_backend(tmp_path):
+    assert create_state_backend("") is None
+    assert isinstance(create_state_backend("memory://"), MemoryStateBackend)
+    assert isinstance(create_state_backend(f"sqlite:///{tmp_path / 'state.db'}"), SQLiteStateBackend)
+    with pytest.raises(Exception):
+        create_state_backend("ftp://localhost")
+
+def test_sessions_shared_between_workers(shared):
+    worker_a = ChatService(state_backend=shared[0])
+    worker_b = ChatService(state_backend=shared[1])
+
+    session = worker_a.create_session("共享会话")
+    worker_a.process_message(session["session_id"], "你好")
+    history = worker_b.get_session_history(session["session_id"])
+    assert [m["content"] for m in history][0] == "你好"
+
+    # 另一个进程继续对话后只读取新增的消息
+    worker_b.process_message(session["session_id"], "继续")
+    assert len(worker_a.get_session_history(session["session_id"])) == 4
+    assert worker_a.get_session(session["session_id"])["version"] == worker_b.sessions[session["session_id"]].version
+
+    worker_a.clear_session_history(session["session_id"])
+    assert worker_b.get_session_history(session["session_id"]) == []
+    worker_b.update_session_title(session["session_id"], "新标题")
+    assert [s["title"] for s in worker_a.list_sessions()] == ["新标题"]
+
+    worker_b.delete_session(session["session_id"])
+    assert worker_a.get_session(session["session_id"]) is None
+    assert worker_a.list_sessions() == []
+
+def test_session_list_reads_only_changed_sessions(shared, monkeypatch):
+    worker_a = ChatService(state_backend=shared[0])
+    worker_b = ChatService(state_backend=shared[1])
+    worker_a.create_session("第一个")
+    assert len(worker_b.list_sessions()) == 1
+
+    reads = []
+    monkeypatch.setattr(shared[1], "items", lambda namespace: reads.append(namespace) or {})
+    second = worker_a.create_session("第二个")
+    worker_a.update_session_title(second["session_id"], "改名")
+    assert [s["title"] for s in worker_b.list_sessions()] == ["改名", "第一个"]
+    assert reads == []
+
+def test_concurrent_appends_keep_shared_order(shared, monkeypatch):
+    worker_a = ChatService(state_backend=shared[0])
+    worker_b = ChatService(state_backend=shared[1])
+    session_id = worker_a.create_session()["session_id"]
+    worker_b.get_session(session_id)
+
+    # 工作进程 A 等待模型回复期间，B 在同一会话中完成了一轮对话
+    replies = ["B的回复"]
+
+    def reply_after_other_worker(messages, **kwargs):
+        if replies:
+            replies.pop()
+            worker_b.process_message(session_id, "B的问题")
+        return "回复"
+
+    monkeypatch.setattr(worker_a.baidu_client, "get_completion", reply_after_other_worker)
+    worker_a.process_message(session_id, "A的问题")
+
+    history_a = [m["message_id"] for m in worker_a.get_session_history(session_id)]
+    history_b = [m["message_id"] for m in worker_b.get_session_history(session_id)]
+    assert len(history_a) == 4
+    assert history_a == history_b
+
+def test_tasks_and_artifacts_shared_between_workers(shared):
+    worker_a = MultiAgentSystem(state_backend=shared[0])
+    worker_b = MultiAgentSystem(state_backend=shared[1])
+
+    first = worker_a.create_task("设计", "设计接口", "Bob")
+    second = worker_a.create_task("实现", "实现接口", "Alex", dependencies=[first["task_id"]])
+    assert worker_b.get_task(second["task_id"])["dependencies"] == [first["task_id"]]
+    assert [t["task_id"] for t in worker_b.get_ready_tasks()] == [first["task_id"]]
+
+    assert worker_b.update_task_status(first["task_id"], "completed")
+    assert [t["task_id"] for t in worker_a.get_ready_tasks()] == [second["task_id"]]
+    # 之后新建的任务通过变更日志同步
+    third = worker_a.create_task("测试", "编写测试", "David", dependencies=[second["task_id"]])
+    assert worker_b.get_task_order()[-1] == third["task_id"]
+
+    # 同一任务只能被一个工作进程领取
+    assert worker_a.claim_task(second["task_id"])
+    assert not worker_b.claim_task(second["task_id"])
+
+    worker_a.save_code_artifact("app.py", "print(1)\n", "python", "Alex")
+    updated = worker_b.save_code_artifact("app.py", "print(2)\n", "python", "Alex")
+    assert updated["version"] == "1.0.1"
+    assert [a["content"] for a in worker_a.get_artifact_history("app.py")] == ["print(1)\n", "print(2)\n"]
+    assert worker_a.get_artifact_version("app.py")["artifact_id"] == updated["artifact_id"]
+
+def test_job_status_visible_to_other_workers(shared):
+    agent_system = MultiAgentSystem(WebSocketHandler(FakeSocketIO()))
+    worker_a = JobService(agent_system, state_backend=shared[0])
+    worker_b = JobService(agent_system, state_backend=shared[1])
+    try:
+        job = worker_a.submit("写一个函数")
+        worker_a._executor.shutdown(wait=True)
+        assert worker_b.get_job(job["job_id"])["status"] == "completed"
+        assert worker_b.get_job("missing") is None
+    finally:
+        worker_a.shutdown()
+        worker_b.shutdown()
@@ -0,0 +1,44 @@
+import pytest
+from services.task_graph import TaskGraph
+
+def test_ready_set_follows_completed_dependencies():
+    graph = TaskGraph()
+    graph.add_task("design")
+    graph.add_task("backend", ["design"])
+    graph.add_task("frontend", ["design"])
+    graph.add_task("release", ["backend", "frontend"])
+    
+    assert graph.ready() == ["design"]
+    graph.set_status("design", "completed")
+    assert sorted(graph.ready()) == ["backend", "frontend"]
+    graph.set_status("backend", "completed")
+    graph.set_status("frontend", "completed")
+    assert graph.ready() == ["release"]
+    
+    # 重新打开依赖任务后，后继任务不再就绪
+    graph.set_status("backend", "pending")
+    assert sorted(graph.ready()) == ["backend"]
+    
+def test_dependency_queries_and_topological_order():
+    graph = TaskGraph()
+    graph.add_task("a")
+    graph.add_task("b", ["a"])
+    graph.add_task("c", ["a", "b"])
+    
+    assert sorted(graph.dependents("a")) == ["b", "c"]
+    assert sorted(graph.dependencies("c")) == ["a", "b"]
+    assert graph.topological_order() == ["a", "b", "c"]
+    
+def test_cycles_and_unknown_dependencies_are_rejected():
+    graph = TaskGraph()
+    graph.add_task("a")
+    graph.add_task("b", ["a"])
+    graph.add_task("c", ["b"])
+    
+    with pytest.raises(ValueError):
+        graph.add_dependency("a", "c")
+    with pytest.raises(ValueError):
+        graph.add_task("d", ["missing"])
+    with pytest.raises(ValueError):
+        graph.add_dependency("a", "a")
+    assert graph.dependencies("a") == []
@@ -0,0 +1,132 @@
+import threading
+import time
+import pytest
+from services.agent_service import MultiAgentSystem
+from services.task_scheduler import TaskScheduler
+from tests.test_agent_service import FakeSocketIO
+from utils.ws_handler import WebSocketHandler
+
+@pytest.fixture
+def socketio():
+    return FakeSocketIO()
+
+@pytest.fixture
+def agent_system(socketio):
+    return MultiAgentSystem(WebSocketHandler(socketio))
+
+def record_execution(agent_system, monkeypatch, delay=0.0):
+    """把任务执行替换为记录执行顺序和并发数"""
+    executed = []
+    state = {"running": 0, "max_running": 0}
+    lock = threading.Lock()
+    
+    def execute_task(task_id):
+        with lock:
+            executed.append(agent_system.tasks[task_id].title)
+            state["running"] += 1
+            state["max_running"] = max(state["max_running"], state["running"])
+        time.sleep(delay)
+        with lock:
+            state["running"] -= 1
+        return f"{agent_system.tasks[task_id].title} 完成"
+        
+    monkeypatch.setattr(agent_system, "execute_task", execute_task)
+    return executed, state
+    
+def test_tasks_run_by_priority_after_dependencies(agent_system, monkeypatch):
+    executed, _ = record_execution(agent_system, monkeypatch)
+    blocker = agent_system.create_task("阻塞", "先完成", "Bob")
+    for title, priority in [("低", 1), ("高", 5), ("中", 3)]:
+        agent_system.create_task(title, title, "Alex", priority=priority, dependencies=[blocker["task_id"]])
+        
+    scheduler = TaskScheduler(agent_system, max_workers=1)
+    assert scheduler.wait_idle(timeout=5)
+    
+    assert executed == ["阻塞", "高", "中", "低"]
+    assert all(task.status == "completed" for task in agent_system.tasks.values())
+    assert agent_system.tasks[blocker["task_id"]].artifacts[-1]["content"] == "阻塞 完成"
+    
+def test_scheduler_records_timings_and_emits_updates(agent_system, socketio, monkeypatch):
+    record_execution(agent_system, monkeypatch, delay=0.01)
+    scheduler = TaskScheduler(agent_system, WebSocketHandler(socketio), max_workers=2)
+    task = agent_system.create_task("实现", "实现接口", "Alex")
+    assert scheduler.wait_idle(timeout=5)
+    
+    timing = scheduler.get_timing(task["task_id"])
+    assert timing["execution_ms"] >= 10
+    assert timing["queue_wait_ms"] >= 0
+    updates = [data["task"] for event, data in socketio.events if event == "task_update"]
+    assert [u["status"] for u in updates if u["task_id"] == task["task_id"]] == ["in_progress", "completed"]
+    
+def test_independent_tasks_run_in_parallel(agent_system, monkeypatch):
+    _, state = record_execution(agent_system, monkeypatch, delay=0.05)
+    scheduler = TaskScheduler(agent_system, max_workers=4)
+    for i in range(8):
+        agent_system.create_task(f"任务{i}", "并行执行", "Alex")
+    assert scheduler.wait_idle(timeout=5)
+    
+    assert state["max_running"] == 4
+    assert scheduler.to_dict()["completed"] == 8
+    
+def test_failed_task_does_not_release_dependents(agent_system, monkeypatch):
+    def execute_task(task_id):
+        raise Exception("模型调用失败")
+    monkeypatch.setattr(agent_system, "execute_task", execute_task)
+    first = agent_system.create_task("第一步", "会失败", "Alex")
+    second = agent_system.create_task("第二步", "依赖第一步", "Alex", dependencies=[first["task_id"]])
+    
+    scheduler = TaskScheduler(agent_system, max_workers=1)
+    assert scheduler.wait_idle(timeout=5)
+    
+    assert agent_system.tasks[first["task_id"]].status == "failed"
+    assert agent_system.tasks[second["task_id"]].status == "pending"
+    
+def test_interrupted_tasks_are_rerun_after_restart(agent_system, monkeypatch):
+    executed, _ = record_execution(agent_system, monkeypatch)
+    interrupted = agent_system.create_task("中断", "执行到一半", "Bob")
+    dependent = agent_system.create_task("后续", "等待前置任务", "Alex", dependencies=[interrupted["task_id"]])
+    agent_system.update_task_status(interrupted["task_id"], "in_progress")
+    
+    scheduler = TaskScheduler(agent_system)
+    try:
+        assert scheduler.wait_idle(timeout=2)
+    finally:
+        scheduler.shutdown()
+    assert executed == ["中断", "后续"]
+    assert agent_system.get_task(dependent["task_id"])["status"] == "completed"
+    
+def test_expired_claims_can_be_taken_over(tmp_path):
+    from storage.state_backend import SQLiteStateBackend
+    path = str(tmp_path / "state.db")
+    crashed = MultiAgentSystem(state_backend=SQLiteStateBackend(path))
+    task_id = crashed.create_task("中断", "执行到一半", "Bob")["task_id"]
+    assert crashed.claim_task(task_id)
+    crashed.update_task_status(task_id, "in_progress")
+    
+    worker_a = MultiAgentSystem(state_backend=SQLiteStateBackend(path))
+    worker_b = MultiAgentSystem(state_backend=SQLiteStateBackend(path))
+    # 租期内其他工作进程既不能恢复也不能领取
+    assert worker_a.recover_stale_tasks() == []
+    assert not worker_b.claim_task(task_id)
+    
+    # 租期过期后只有一个工作进程能接管
+    crashed.state.put("task_claims", task_id, {"claimed_at": "", "expires_at": time.time() - 1})
+    assert worker_a.recover_stale_tasks() == [task_id]
+    assert worker_b.get_task(task_id)["status"] == "pending"
+    assert worker_b.claim_task(task_id)
+    assert not worker_a.claim_task(task_id)
+    crashed.state.put("task_claims", task_id, {"claimed_at": "", "expires_at": time.time() - 1})
+    assert [worker_a.claim_task(task_id), worker_b.claim_task(task_id)] == [True, False]
+    
+def test_timings_are_bounded(agent_system, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, "TASK_TIMINGS_MAX", 3)
+    record_execution(agent_system, monkeypatch)
+    scheduler = TaskScheduler(agent_system)
+    try:
+        for i in range(6):
+            agent_system.create_task(f"任务{i}", "描述", "Alex")
+        assert scheduler.wait_idle(timeout=2)
+    finally:
+        scheduler.shutdown()
+    assert len(scheduler.timings) == 3
@@ -0,0 +1,96 @@
+import os
+import stat
+import threading
+import time
+from utils.token_manager import TokenManager
+
+class FakeOAuth:
+    def __init__(self, expires_in=2592000, delay=0.0):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+        
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"access_token": f"token-{self.calls}", "expires_in": self.expires_in}
+
+def test_concurrent_requests_share_one_refresh(tmp_path):
+    oauth = FakeOAuth(delay=0.05)
+    manager = TokenManager(oauth, "key", cache_file=str(tmp_path / "token.json"), refresh_margin=60)
+    tokens = []
+    
+    threads = [threading.Thread(target=lambda: tokens.append(manager.get_token())) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manager.stop()
+    
+    assert oauth.calls == 1
+    assert set(tokens) == {"token-1"}
+    
+def test_token_is_reused_from_file(tmp_path):
+    cache_file = str(tmp_path / "token.json")
+    first = TokenManager(FakeOAuth(), "key", cache_file=cache_file, refresh_margin=60)
+    assert first.get_token() == "token-1"
+    first.stop()
+    
+    # 另一个进程（或重启后）使用同一个缓存文件
+    oauth = FakeOAuth()
+    second = TokenManager(oauth, "key", cache_file=cache_file, refresh_margin=60)
+    assert second.get_token() == "token-1"
+    assert oauth.calls == 0
+    second.stop()
+    
+def test_expired_and_invalidated_tokens_are_refreshed():
+    oauth = FakeOAuth(expires_in=0)
+    manager = TokenManager(oauth, "key", cache_file="", refresh_margin=0)
+    
+    assert manager.get_token() == "token-1"
+    assert manager.get_token() == "token-2"
+    
+    oauth.expires_in = 3600
+    token = manager.get_token()
+    manager.invalidate("stale-token")
+    assert manager.get_token() == token
+    manager.invalidate(token)
+    assert manager.get_token() != token
+    manager.stop()
+    
+def test_background_refresh_before_expiry():
+    oauth = FakeOAuth(expires_in=1)
+    manager = TokenManager(oauth, "key", cache_file="", refresh_margin=0.9)
+    
+    assert manager.get_token() == "token-1"
+    time.sleep(0.3)
+    
+    assert oauth.calls >= 2
+    manager.stop()
+    
+def test_invalidated_token_is_not_reloaded_from_file(tmp_path):
+    cache_file = str(tmp_path / "token.json")
+    oauth = FakeOAuth()
+    manager = TokenManager(oauth, "key", cache_file=cache_file, refresh_margin=60)
+    assert manager.get_token() == "token-1"
+    
+    # 服务端拒绝了令牌，缓存文件中的同一个令牌不能再被加载
+    manager.invalidate("token-1")
+    assert manager.get_token() == "token-2"
+    assert oauth.calls == 2
+    manager.stop()
+    
+    # 其他进程读取缓存文件时拿到的是新令牌
+    other = TokenManager(FakeOAuth(), "key", cache_file=cache_file, refresh_margin=60)
+    assert other.get_token() == "token-2"
+    other.stop()
+    
+def test_cache_file_is_private(tmp_path):
+    cache_dir = tmp_path / "cache"
+    manager = TokenManager(FakeOAuth(), "key", cache_file=str(cache_dir / "token.json"), refresh_margin=60)
+    manager.get_token()
+    manager.stop()
+    
+    assert os.listdir(cache_dir) == ["token.json"]
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(cache_dir / "token.json").st_mode) == 0o600
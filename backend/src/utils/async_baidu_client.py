@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Dict, Iterable, List, Optional
+from config import Config
+from utils.baidu_client import BaiduClient, get_baidu_client
+from utils.model_router import ModelRoute
+from utils.rate_limiter import estimate_message_tokens
+from utils.resilience import BaiduAPIError, CircuitOpenError, UpstreamError, classify_error, is_rate_limited
+
+async def gather_limited(
+    awaitables: Iterable[Awaitable],
+    limit: int = None,
+    return_exceptions: bool = False
+) -> List:
+    """并发等待多个协程，同时运行的数量不超过 limit，结果按传入顺序返回
+
+    Args:
+        awaitables: 协程列表
+        limit: 最大并发数，为空时使用 BAIDU_ASYNC_CONCURRENCY
+        return_exceptions: 为 True 时把异常作为结果返回，否则第一个异常直接抛出
+    """
+    semaphore = asyncio.Semaphore(limit or Config.BAIDU_ASYNC_CONCURRENCY)
+
+    async def run(awaitable: Awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(run(a) for a in awaitables), return_exceptions=return_exceptions)
+
+class AsyncBaiduClient:
+    """基于 asyncio 的百度 API 客户端
+
+    与 BaiduClient 共用访问令牌、补全缓存、模型配置和测试模式的模拟数据，
+    HTTP 请求通过 httpx.AsyncClient 的连接池发送，多个请求的网络等待可以在单个线程中重叠。
+    """
+
+    def __init__(self, sync_client: BaiduClient = None, http_client=None):
+        """初始化客户端
+
+        Args:
+            sync_client: 提供令牌、缓存和模型配置的同步客户端，默认使用进程内共享的客户端
+            http_client: 已创建的 httpx.AsyncClient，为空时在首次请求时创建
+        """
+        self.sync_client = sync_client or get_baidu_client()
+        self._http = http_client
+        self._http_loop = None
+        # 传入的连接池由调用方管理
+        self._owns_http = http_client is None
+
+    @property
+    def test_mode(self) -> bool:
+        return self.sync_client.test_mode
+
+    async def get_completion(self, messages: List[Dict], use_cache: bool = True, operation: str = "completion") -> str:
+        """获取百度 API 的响应，operation 为路由名，决定使用的模型和采样参数"""
+        return await self._complete(messages, self.sync_client.router.resolve(operation, 0.7, 0.8), use_cache)
+
+    async def get_code_completion(
+        self,
+        messages: List[Dict],
+        use_cache: bool = True,
+        operation: str = "code_completion"
+    ) -> str:
+        """获取代码相关的百度 API 响应"""
+        return await self._complete(messages, self.sync_client.router.resolve(operation, 0.2, 0.95), use_cache)
+
+    async def get_code_review(self, code: str, use_cache: bool = True) -> str:
+        """获取代码审查建议"""
+        return await self.get_completion(BaiduClient._code_review_messages(code), use_cache, "code_review")
+
+    async def get_code_explanation(self, code: str, use_cache: bool = True) -> str:
+        """获取代码解释"""
+        return await self.get_completion(BaiduClient._code_explanation_messages(code), use_cache, "code_explanation")
+
+    async def gather_completions(
+        self,
+        message_lists: Iterable[List[Dict]],
+        limit: int = None,
+        return_exceptions: bool = False,
+        use_cache: bool = True
+    ) -> List:
+        """并发获取多组消息的响应，结果按传入顺序返回"""
+        return await gather_limited(
+            (self.get_completion(messages, use_cache) for messages in message_lists),
+            limit,
+            return_exceptions
+        )
+
+    async def gather_code_reviews(
+        self,
+        codes: Iterable[str],
+        limit: int = None,
+        return_exceptions: bool = False
+    ) -> List:
+        """并发审查多段代码，结果按传入顺序返回"""
+        return await gather_limited(
+            (self.get_code_review(code) for code in codes),
+            limit,
+            return_exceptions
+        )
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _complete(self, messages: List[Dict], route: ModelRoute, use_cache: bool) -> str:
+        client = self.sync_client
+        if client.test_mode:
+            await asyncio.sleep(client._test_delay())
+            return client._pick_test_response(messages)
+
+        cache_key = client._get_cache_key(messages, route, use_cache)
+        cached = client._get_cached(cache_key)
+        if cached is not None:
+            return cached
+
+        payload = {
+            'messages': messages,
+            'temperature': route.temperature,
+            'top_p': route.top_p
+        }
+        content = await self._call_upstream(
+            payload,
+            estimate_message_tokens(messages) + Config.BAIDU_RATE_LIMIT_OUTPUT_TOKENS,
+            route.model
+        )
+        client._settle_output_tokens(content)
+        client._set_cached(cache_key, content)
+        return content
+
+    async def _call_upstream(self, payload: Dict, tokens: int = 0, model: str = None) -> str:
+        """与同步客户端共用熔断器、重试策略和限流器，退避时只挂起当前协程
+
+        与同步客户端一样先检查熔断器再排队取得额度，失败的尝试退还预留的 token。
+        """
+        client = self.sync_client
+        retry_policy = client.retry_policy
+        last_error = None
+        for attempt in range(1, retry_policy.max_attempts + 1):
+            if not client.breaker.allow():
+                raise CircuitOpenError("百度 API 暂时不可用（熔断中），请稍后重试")
+            if client.rate_limiter.enabled:
+                try:
+                    # 限流排队会阻塞等待，放到线程中执行
+                    await asyncio.to_thread(client.rate_limiter.acquire, tokens)
+                except BaseException:
+                    client.breaker.release()
+                    raise
+            try:
+                # 刷新令牌是同步请求，放到线程中执行，避免阻塞事件循环
+                access_token = await asyncio.to_thread(client._get_access_token)
+                result = await self._request(payload, access_token, model)
+            except Exception as e:
+                client.rate_limiter.refund(tokens)
+                last_error = e
+                kind = classify_error(e)
+                if kind == "fatal":
+                    client.breaker.release()
+                    raise Exception(f"调用百度 API 时出错: {str(e)}")
+                if kind == "auth":
+                    client.breaker.release()
+                    client.token_manager.invalidate(access_token)
+                    client._record_retry("auth_refreshes")
+                    continue
+                if is_rate_limited(e):
+                    client.rate_limiter.penalize()
+                client.breaker.record_failure()
+                if attempt < retry_policy.max_attempts:
+                    client._record_retry("retries")
+                    await asyncio.sleep(retry_policy.delay(attempt))
+                continue
+            client.breaker.record_success()
+            return result
+        client._record_retry("exhausted")
+        raise Exception(f"调用百度 API 时出错（已尝试 {retry_policy.max_attempts} 次）: {str(last_error)}")
+
+    async def _request(self, payload: Dict, access_token: str, model: str = None) -> str:
+        client = self.sync_client
+        model = model or client.model
+        started = time.monotonic()
+        try:
+            try:
+                response = await self._get_http().post(
+                    client._get_model_url(model),
+                    params={'access_token': access_token},
+                    json=payload
+                )
+            except Exception as e:
+                raise UpstreamError(str(e))
+            if response.status_code >= 400:
+                raise UpstreamError(f"HTTP {response.status_code}", response.status_code)
+            result = response.json()
+            if 'error_code' in result:
+                raise BaiduAPIError(result['error_code'], result.get('error_msg', '未知错误'))
+        except Exception:
+            client._record_model_call(model, started, error=True)
+            raise
+        client._record_model_call(model, started, payload['messages'], result['result'], result.get('usage'))
+        return result['result']
+
+    def _get_http(self):
+        """获取当前事件循环的连接池
+
+        httpx 的连接绑定创建时的事件循环，事件循环变化时（如多次 asyncio.run）重新创建。
+        """
+        if not self._owns_http:
+            return self._http
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http_loop is not loop:
+            try:
+                import httpx
+            except ImportError:
+                raise Exception("使用异步百度客户端需要安装 httpx: pip install httpx")
+            pool_size = Config.BAIDU_POOL_SIZE
+            self._http = httpx.AsyncClient(
+                headers={'Content-Type': 'application/json'},
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=httpx.Timeout(
+                    Config.BAIDU_READ_TIMEOUT, connect=Config.BAIDU_CONNECT_TIMEOUT, pool=Config.BAIDU_POOL_TIMEOUT
+                )
+            )
+            self._http_loop = loop
+        return self._http
+
+_shared_async_client: Optional[AsyncBaiduClient] = None
+_shared_async_client_lock = threading.Lock()
+
+def get_async_baidu_client() -> AsyncBaiduClient:
+    """获取进程内共享的 AsyncBaiduClient"""
+    global _shared_async_client
+    if _shared_async_client is None:
+        with _shared_async_client_lock:
+            if _shared_async_client is None:
+                _shared_async_client = AsyncBaiduClient()
+    return _shared_async_client
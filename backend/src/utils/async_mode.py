@@ -0,0 +1,76 @@
+import logging
+from typing import Callable, Optional, TypeVar
+from config import Config
+
+T = TypeVar("T")
+
+ASYNC_MODES = ("threading", "eventlet", "gevent")
+
+_mode: Optional[str] = None
+
+def setup_async_mode(mode: str = None) -> str:
+    """按配置的异步模式打猴子补丁，返回传给 Flask-SocketIO 的 async_mode
+
+    eventlet 和 gevent 模式下 socket、time.sleep 和线程都会替换为协程版本，
+    阻塞的 HTTP 请求和等待只挂起当前协程，不会卡住整个事件循环。
+    必须在导入其他模块之前调用，否则已创建的锁和连接不会被替换。
+
+    Args:
+        mode: threading、eventlet 或 gevent，为空时读取 ASYNC_MODE
+    """
+    global _mode
+    mode = (mode or Config.ASYNC_MODE).lower()
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"不支持的异步模式: {mode}，可选值: {', '.join(ASYNC_MODES)}")
+    if _mode == mode:
+        return mode
+
+    try:
+        if mode == "eventlet":
+            import eventlet
+            eventlet.monkey_patch()
+        elif mode == "gevent":
+            from gevent import monkey
+            monkey.patch_all()
+    except ImportError:
+        raise Exception(f"异步模式 {mode} 需要安装 {mode}: pip install {mode}")
+
+    if mode != "threading" and (Config.STATE_BACKEND_URL or "").startswith("sqlite"):
+        logging.getLogger(__name__).warning(
+            f"{mode} 模式下 SQLite 共享状态存储的读写会阻塞事件循环，多工作进程部署建议使用 redis://"
+        )
+    _mode = mode
+    return mode
+
+def get_async_mode() -> str:
+    """当前的异步模式，未调用 setup_async_mode 时为 threading"""
+    return _mode or "threading"
+
+def is_cooperative() -> bool:
+    """是否运行在协程模式下"""
+    return get_async_mode() != "threading"
+
+def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """执行不会让出协程的阻塞调用（如 sqlite3），协程模式下转到原生线程池执行
+
+    sqlite3 等 C 扩展的 I/O 不受猴子补丁影响，直接在协程中调用会卡住整个事件循环。
+    threading 模式下直接调用。
+    """
+    mode = get_async_mode()
+    if mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    if mode == "gevent":
+        from gevent import get_hub
+        return get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+def concurrency_limit(threaded_limit: int) -> int:
+    """线程池和连接池的并发上限
+
+    线程模式下每个并发请求占用一个系统线程，使用各自配置的较小上限；
+    协程模式下等待 I/O 的协程几乎没有开销，上限提高到 GREEN_CONCURRENCY。
+    """
+    if is_cooperative():
+        return max(threaded_limit, Config.GREEN_CONCURRENCY)
+    return threaded_limit
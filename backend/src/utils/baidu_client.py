@@ -1,18 +1,60 @@
 import requests
 import os
-from typing import List, Dict
+import json
+from typing import Callable, List, Dict, Iterator, Optional, TypeVar
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
+from utils.http_pool import get_shared_session, pool_saturated
+from utils.token_manager import get_token_manager
+from utils.completion_cache import CompletionCache
+from utils.async_mode import is_cooperative
+from utils.deadline import Deadline, DeadlineExceeded, request_timeout
+from utils.prompt_budget import estimate_tokens
+from utils.rate_limiter import RateLimiter, estimate_message_tokens, get_rate_limiter
+from utils.single_flight import SingleFlight
+from utils.model_router import MODEL_URLS, ModelRoute, ModelRouter, get_model_router
+from utils.resilience import (
+    BaiduAPIError, CircuitBreaker, CircuitOpenError, Hedger, RetryPolicy, classify_error, is_rate_limited
+)
+import itertools
+import threading
 import random
 import time
 
+T = TypeVar('T')
+
 class BaiduClient:
-    def __init__(self):
+    def __init__(
+        self,
+        session: requests.Session = None,
+        completion_cache: CompletionCache = None,
+        rate_limiter: RateLimiter = None,
+        router: ModelRouter = None
+    ):
+        self.session = session or get_shared_session()
+        if completion_cache is None and Config.LLM_CACHE_ENABLED:
+            completion_cache = CompletionCache()
+        self.completion_cache = completion_cache
         self.api_key = Config.BAIDU_API_KEY
         self.secret_key = Config.BAIDU_SECRET_KEY
         self.model = Config.BAIDU_MODEL_NAME
-        self.base_url = "https://aip.baidubce.com"
-        self.access_token = None
+        # 按流水线阶段或操作选择模型和采样参数，未配置路由时使用 self.model
+        self.router = router or get_model_router()
+        self.base_url = Config.BAIDU_API_BASE_URL.rstrip('/')
+        # 协程模式下读取流式响应时主动让出，避免数据连续到达时长时间占用事件循环
+        self.cooperative = is_cooperative()
+        self.token_manager = get_token_manager(self.api_key, self._fetch_access_token)
         self.test_mode = not (self.api_key and self.secret_key) or os.getenv('TEST_MODE', 'false').lower() == 'true'
+        # 失败时有上限地重试，连续失败后熔断并自动半开恢复；可选对冲请求削减长尾延迟
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
+        self.hedger = Hedger(saturated=lambda: pool_saturated(self.session)) if Config.BAIDU_HEDGE_ENABLED else None
+        self.retry_stats = {"retries": 0, "auth_refreshes": 0, "exhausted": 0}
+        # 进程内所有客户端共用一份配额，额度不足时排队，交互式请求优先
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # 进行中的相同请求只发送一次
+        self.single_flight = SingleFlight()
+        self._stats_lock = threading.Lock()
         
         if self.test_mode:
             print("警告: BaiduClient运行在测试模式下，将返回模拟数据。")
@@ -22,49 +64,145 @@ class BaiduClient:
         if self.test_mode:
             return "test_token"
             
-        if self.access_token:
-            return self.access_token
-            
         try:
-            url = f"{self.base_url}/oauth/2.0/token"
-            params = {
-                'grant_type': 'client_credentials',
-                'client_id': self.api_key,  # 直接使用完整的API Key
-                'client_secret': self.secret_key
-            }
+            return self.token_manager.get_token()
+        except Exception as e:
+            raise Exception(f"获取访问令牌时出错: {str(e)}")
             
-            response = requests.post(url, params=params)
-            response.raise_for_status()
-            result = response.json()
+    def _fetch_access_token(self) -> Dict:
+        """调用 OAuth 接口获取新的访问令牌，返回包含 access_token 和 expires_in 的字典"""
+        url = f"{self.base_url}/oauth/2.0/token"
+        params = {
+            'grant_type': 'client_credentials',
+            'client_id': self.api_key,  # 直接使用完整的API Key
+            'client_secret': self.secret_key
+        }
+        
+        response = self._post(url, params=params)
+        response.raise_for_status()
+        result = response.json()
+        
+        if 'error' in result:
+            raise Exception(f"获取访问令牌失败: {result.get('error_description', '未知错误')}")
             
-            if 'error' in result:
-                raise Exception(f"获取访问令牌失败: {result.get('error_description', '未知错误')}")
-                
-            self.access_token = result['access_token']
-            return self.access_token
+        return result
+        
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """通过共享连接池发送 POST 请求，未指定超时时使用配置的连接和读取超时"""
+        self.session.connection_stats.record_request()
+        kwargs.setdefault('timeout', request_timeout(None))
+        return self.session.post(url, **kwargs)
+        
+    def warm_up(self, connections: int = None) -> None:
+        """预先建立到百度 API 的连接并获取访问令牌，避免首个请求承担握手开销
+        
+        Args:
+            connections: 预热的连接数
+        """
+        if self.test_mode:
+            return
             
+        connections = connections if connections is not None else Config.BAIDU_POOL_WARMUP
+        
+        def open_connection(_):
+            try:
+                self.session.connection_stats.record_request()
+                self.session.head(self.base_url, timeout=request_timeout(None))
+            except Exception as e:
+                print(f"警告: 预热百度 API 连接失败: {str(e)}")
+                
+        # 并发发起请求，连接池中才会同时保留多条连接
+        if connections > 0:
+            with ThreadPoolExecutor(max_workers=connections) as pool:
+                list(pool.map(open_connection, range(connections)))
+                
+        try:
+            self._get_access_token()
         except Exception as e:
-            raise Exception(f"获取访问令牌时出错: {str(e)}")
+            print(f"警告: 预热时获取访问令牌失败: {str(e)}")
+            
+    def _get_cache_key(self, messages: List[Dict], route: ModelRoute, use_cache: bool) -> Optional[str]:
+        """计算补全缓存键，不使用缓存时返回 None"""
+        if not use_cache or not self.completion_cache:
+            return None
+        return self.completion_cache.make_key(route.model, messages, route.temperature, route.top_p)
+        
+    def _get_cached(self, cache_key: Optional[str]) -> Optional[str]:
+        return self.completion_cache.get(cache_key) if cache_key else None
         
-    def _get_model_url(self) -> str:
-        """获取模型 API 地址"""
-        model_urls = {
-            'ERNIE-Bot': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions",
-            'ERNIE-Bot-4': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro",
-            'ERNIE-Bot-8K': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/ernie_bot_8k",
-            'ERNIE-Bot-turbo': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/eb-instant"
+    def _set_cached(self, cache_key: Optional[str], content: str) -> None:
+        if cache_key and content:
+            self.completion_cache.set(cache_key, content)
+            
+    def get_stats(self) -> Dict:
+        """获取客户端运行统计"""
+        return {
+            "test_mode": self.test_mode,
+            "model": self.model,
+            "connections": self.session.connection_stats.to_dict(),
+            "token": self.token_manager.to_dict(),
+            "cache": self.completion_cache.to_dict() if self.completion_cache else None,
+            "breaker": self.breaker.to_dict(),
+            "retries": dict(self.retry_stats),
+            "hedge": self.hedger.to_dict() if self.hedger else None,
+            "rate_limit": self.rate_limiter.to_dict(),
+            "single_flight": self.single_flight.to_dict(),
+            "routing": self.router.to_dict()
         }
-        return f"{self.base_url}{model_urls.get(self.model, model_urls['ERNIE-Bot-4'])}"
+        
+    def _get_model_url(self, model: str = None) -> str:
+        """获取模型 API 地址，未指定模型时使用默认模型"""
+        return f"{self.base_url}{MODEL_URLS.get(model or self.model, MODEL_URLS['ERNIE-Bot-4'])}"
+        
+    def _record_model_call(
+        self,
+        model: str,
+        started: float,
+        messages: List[Dict] = None,
+        content: str = "",
+        usage: Dict = None,
+        error: bool = False
+    ) -> None:
+        """按模型记录一次上游调用的耗时和 token 用量，接口未返回用量时按文本估算"""
+        elapsed = time.monotonic() - started
+        if error:
+            self.router.record(model, elapsed, error=True)
+            return
+        usage = usage or {}
+        self.router.record(
+            model,
+            elapsed,
+            usage.get('prompt_tokens', estimate_message_tokens(messages or [])),
+            usage.get('completion_tokens', estimate_tokens(content))
+        )
     
     def _get_test_response(self, messages: List[Dict]) -> str:
         """在测试模式下返回模拟数据"""
+        # 添加随机延迟，模拟真实响应时间
+        time.sleep(self._test_delay())
+        
+        return self._pick_test_response(messages)
+        
+    @staticmethod
+    def _test_delay() -> float:
+        """测试模式下模拟的响应时间（秒）"""
+        return random.uniform(0.5, 1.5)
+        
+    def _iter_test_response(self, messages: List[Dict], chunk_size: int = 8) -> Iterator[str]:
+        """在测试模式下按块返回模拟数据，模拟流式输出"""
+        content = self._pick_test_response(messages)
+        
+        # 首块延迟较短，模拟流式接口的首字响应
+        time.sleep(random.uniform(0.1, 0.3))
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+            time.sleep(random.uniform(0.01, 0.03))
+        
+    def _pick_test_response(self, messages: List[Dict]) -> str:
+        """根据消息内容挑选模拟响应"""
         # 分析最后一条消息
         last_message = messages[-1]['content'] if messages else ""
         
-        # 添加随机延迟，模拟真实响应时间
-        delay = random.uniform(0.5, 1.5)
-        time.sleep(delay)
-        
         # 根据消息内容返回不同的模拟响应
         if "Mike" in last_message or "团队负责人" in last_message:
             # 根据是否包含"总结"或"summary"来区分是开始分析还是结束总结
@@ -123,161 +261,336 @@ class BaiduClient:
             ]
             return random.choice(generic_responses)
         
-    def get_completion(self, messages: List[Dict]) -> str:
-        """获取百度 API 的响应"""
+    def get_completion(
+        self,
+        messages: List[Dict],
+        use_cache: bool = True,
+        deadline: Deadline = None,
+        priority: str = "background",
+        operation: str = "completion"
+    ) -> str:
+        """获取百度 API 的响应
+        
+        Args:
+            messages: 对话消息列表
+            use_cache: 是否使用补全缓存，需要每次得到不同结果时传 False
+            deadline: 所属请求的截止时间，超时和重试都不会超过剩余时间
+            priority: 限流排队的优先级，用户正在等待的请求传 interactive
+            operation: 路由名（流水线阶段名或操作名），决定使用的模型和采样参数
+        """
+        return self._complete(messages, self.router.resolve(operation, 0.7, 0.8), use_cache, deadline, priority)
+        
+    def get_code_completion(
+        self,
+        messages: List[Dict],
+        use_cache: bool = True,
+        deadline: Deadline = None,
+        priority: str = "background",
+        operation: str = "code_completion"
+    ) -> str:
+        """获取代码相关的百度 API 响应，降低随机性"""
+        return self._complete(messages, self.router.resolve(operation, 0.2, 0.95), use_cache, deadline, priority)
+        
+    def _complete(
+        self,
+        messages: List[Dict],
+        route: ModelRoute,
+        use_cache: bool,
+        deadline: Deadline = None,
+        priority: str = "background"
+    ) -> str:
+        if deadline:
+            deadline.check()
         if self.test_mode:
             return self._get_test_response(messages)
             
-        try:
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-                
-            url = self._get_model_url()
+        cache_key = self._get_cache_key(messages, route, use_cache)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
             
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            
-            params = {
-                'access_token': self.access_token
-            }
-            
-            payload = {
-                'messages': messages,
-                'temperature': 0.7,
-                'top_p': 0.8
-            }
-            
-            response = requests.post(url, headers=headers, params=params, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            
-            if 'error_code' in result:
-                raise Exception(f"API 错误: {result.get('error_msg', '未知错误')}")
-                
+        payload = {
+            'messages': messages,
+            'temperature': route.temperature,
+            'top_p': route.top_p
+        }
+        
+        def request(access_token: str) -> str:
+            started = time.monotonic()
+            try:
+                response = self._post(
+                    self._get_model_url(route.model),
+                    headers={'Content-Type': 'application/json'},
+                    params={'access_token': access_token},
+                    json=payload,
+                    timeout=request_timeout(deadline)
+                )
+                response.raise_for_status()
+                result = response.json()
+                if 'error_code' in result:
+                    raise BaiduAPIError(result['error_code'], result.get('error_msg', '未知错误'))
+            except Exception:
+                self._record_model_call(route.model, started, error=True)
+                raise
+            self._record_model_call(route.model, started, messages, result['result'], result.get('usage'))
             return result['result']
             
-        except Exception as e:
-            # 如果是认证错误，尝试重新获取 access_token
-            if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 401:
-                self.access_token = None
-                return self.get_completion(messages)
-                
-            # 如果在非测试模式下发生错误，切换到测试模式
-            if not self.test_mode:
-                print(f"警告: 调用百度 API 出错: {str(e)}，切换到测试模式")
-                self.test_mode = True
-                return self._get_test_response(messages)
-                
-            raise Exception(f"调用百度 API 时出错: {str(e)}")
-            
-    def get_code_completion(self, messages: List[Dict]) -> str:
-        """获取代码相关的百度 API 响应"""
-        if self.test_mode:
-            return self._get_test_response(messages)
-            
-        try:
-            if not self.access_token:
-                self.access_token = self._get_access_token()
-                
-            url = self._get_model_url()
-            
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            
-            params = {
-                'access_token': self.access_token
-            }
+        def call_upstream() -> str:
+            content = self._call_upstream(
+                request,
+                hedge=True,
+                deadline=deadline,
+                tokens=estimate_message_tokens(messages) + Config.BAIDU_RATE_LIMIT_OUTPUT_TOKENS,
+                priority=priority
+            )
+            self._settle_output_tokens(content)
+            self._set_cached(cache_key, content)
+            return content
             
-            payload = {
-                'messages': messages,
-                'temperature': 0.2,  # 降低随机性
-                'top_p': 0.95
-            }
+        # 不使用缓存的调用方需要各自独立的结果，不参与合并
+        if not use_cache:
+            return call_upstream()
+        # 同时到达的相同请求（如多个用户或浏览器重试提交同一段代码）只发送一次，其余调用共享结果或异常。
+        # 执行者按自己的优先级排队和限流，只合并优先级相同的请求，交互请求不会等在后台请求后面
+        flight_key = cache_key or CompletionCache.make_key(route.model, messages, route.temperature, route.top_p)
+        return self.single_flight.do(f"{priority}:{flight_key}", call_upstream, deadline)
+        
+    def _call_upstream(
+        self,
+        request: Callable[[str], T],
+        hedge: bool = False,
+        deadline: Deadline = None,
+        tokens: int = 0,
+        priority: str = "background"
+    ) -> T:
+        """经过熔断器和重试调用百度 API
+        
+        令牌失效时刷新令牌后重试；网络错误、限流和服务端错误按指数退避加随机抖动重试，
+        并计入熔断器；请求参数错误直接抛出。重试次数用尽或熔断器打开时抛出异常，
+        不会把整个进程切换到测试模式。截止时间到达时抛出 DeadlineExceeded，不再重试，
+        因时间预算被截短的超时也不计入熔断。每次尝试先检查熔断器，再在限流器排队取得额度，
+        熔断期间不占用额度；失败的尝试退还预留的 token，只有成功的那次由调用方按实际输出结算，
+        对冲请求另外扣除一次额度。上游返回限流错误时清空请求额度，让其他排队的请求一起放慢。
+        
+        Args:
+            request: 接收访问令牌并发送一次请求的函数
+            hedge: 是否允许对冲请求
+            deadline: 所属请求的截止时间
+            tokens: 本次请求预计消耗的 token 数
+            priority: 限流排队的优先级
+        """
+        last_error = None
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if deadline:
+                deadline.check()
+            if not self.breaker.allow():
+                raise CircuitOpenError("百度 API 暂时不可用（熔断中），请稍后重试")
+            try:
+                self.rate_limiter.acquire(tokens, priority, deadline)
+            except Exception:
+                self.breaker.release()
+                raise
+            try:
+                access_token = self._get_access_token()
+                if hedge and self.hedger:
+                    result = self.hedger.call(
+                        lambda: request(access_token),
+                        on_hedge=lambda: self.rate_limiter.charge(tokens)
+                    )
+                else:
+                    result = request(access_token)
+            except DeadlineExceeded:
+                self.rate_limiter.refund(tokens)
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self.rate_limiter.refund(tokens)
+                last_error = e
+                if deadline and deadline.expired():
+                    self.breaker.release()
+                    raise DeadlineExceeded(f"调用百度 API 超时：已超过 {deadline.seconds:g} 秒的时间预算（{str(e)}）")
+                kind = classify_error(e)
+                if kind == "fatal":
+                    self.breaker.release()
+                    raise Exception(f"调用百度 API 时出错: {str(e)}")
+                if kind == "auth":
+                    self.breaker.release()
+                    self.token_manager.invalidate(access_token)
+                    self._record_retry("auth_refreshes")
+                    continue
+                if is_rate_limited(e):
+                    self.rate_limiter.penalize()
+                self.breaker.record_failure()
+                if attempt < self.retry_policy.max_attempts:
+                    self._record_retry("retries")
+                    delay = self.retry_policy.delay(attempt)
+                    time.sleep(min(delay, deadline.remaining()) if deadline else delay)
+                continue
+            self.breaker.record_success()
+            return result
+        self._record_retry("exhausted")
+        raise Exception(f"调用百度 API 时出错（已尝试 {self.retry_policy.max_attempts} 次）: {str(last_error)}")
+        
+    def _settle_output_tokens(self, content: str) -> None:
+        """按实际输出长度修正限流器中预留的输出 token"""
+        self.rate_limiter.settle(estimate_tokens(content) - Config.BAIDU_RATE_LIMIT_OUTPUT_TOKENS)
+        
+    def _record_retry(self, key: str) -> None:
+        with self._stats_lock:
+            self.retry_stats[key] += 1
             
-            response = requests.post(url, headers=headers, params=params, json=payload)
-            response.raise_for_status()
-            result = response.json()
+    def stream_completion(
+        self,
+        messages: List[Dict],
+        use_cache: bool = True,
+        deadline: Deadline = None,
+        priority: str = "background",
+        operation: str = "completion"
+    ) -> Iterator[str]:
+        """以流式方式获取百度 API 的响应，逐块返回文本
+        
+        使用 ERNIE 的 stream=true (SSE) 模式，每收到一个增量就立即返回，
+        测试模式下返回等价的分块模拟数据。命中缓存时一次性返回完整内容。
+        建立连接和读取首个数据行的失败会重试，开始输出后出错直接抛出。
+        每个数据块之后检查截止时间，到期时抛出 DeadlineExceeded。
+        """
+        if deadline:
+            deadline.check()
+        if self.test_mode:
+            for chunk in self._iter_test_response(messages):
+                yield chunk
+                if deadline:
+                    deadline.check("生成回复")
+            return
             
-            if 'error_code' in result:
-                raise Exception(f"API 错误: {result.get('error_msg', '未知错误')}")
-                
-            return result['result']
+        route = self.router.resolve(operation, 0.7, 0.8)
+        cache_key = self._get_cache_key(messages, route, use_cache)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            yield cached
+            return
             
-        except Exception as e:
-            # 如果是认证错误，尝试重新获取 access_token
-            if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 401:
-                self.access_token = None
-                return self.get_code_completion(messages)
-                
-            # 如果在非测试模式下发生错误，切换到测试模式
-            if not self.test_mode:
-                print(f"警告: 调用百度 API 出错: {str(e)}，切换到测试模式")
-                self.test_mode = True
-                return self._get_test_response(messages)
+        payload = {
+            'messages': messages,
+            'temperature': route.temperature,
+            'top_p': route.top_p,
+            'stream': True
+        }
+        attempt = {}
+        
+        def open_stream(access_token: str):
+            attempt['started'] = time.monotonic()
+            response = None
+            try:
+                response = self._post(
+                    self._get_model_url(route.model),
+                    headers={'Content-Type': 'application/json'},
+                    params={'access_token': access_token},
+                    json=payload,
+                    stream=True,
+                    timeout=request_timeout(deadline)
+                )
+                response.raise_for_status()
+                lines = response.iter_lines(decode_unicode=True)
+                # 出错时接口直接返回 JSON 而非 SSE 数据行，读取首个数据行以便在输出前重试
+                for line in lines:
+                    if line:
+                        return response, self._parse_stream_line(line), lines
+                return response, {'is_end': True}, lines
+            except Exception:
+                if response is not None:
+                    response.close()
+                self._record_model_call(route.model, attempt['started'], error=True)
+                raise
                 
-            raise Exception(f"调用百度 API 时出错: {str(e)}")
-            
-    def get_code_review(self, code: str) -> str:
-        """获取代码审查建议"""
+        response, first, lines = self._call_upstream(
+            open_stream,
+            deadline=deadline,
+            tokens=estimate_message_tokens(messages) + Config.BAIDU_RATE_LIMIT_OUTPUT_TOKENS,
+            priority=priority
+        )
+        chunks = []
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的代码审查者。请对提供的代码进行审查，"
-                    "指出潜在的问题、改进建议和最佳实践。"
-                },
-                {
-                    "role": "user",
-                    "content": f"请审查以下代码：\n\n{code}"
-                }
-            ]
-            
-            return self.get_completion(messages)
-            
+            with response:
+                rest = (self._parse_stream_line(line) for line in lines if line)
+                for result in itertools.chain([first], rest):
+                    chunk = result.get('result', '')
+                    if chunk:
+                        chunks.append(chunk)
+                        yield chunk
+                        
+                    if result.get('is_end'):
+                        content = "".join(chunks)
+                        self._record_model_call(route.model, attempt['started'], messages, content, result.get('usage'))
+                        self._set_cached(cache_key, content)
+                        break
+                        
+                    if deadline:
+                        deadline.check("生成回复")
+                    if self.cooperative:
+                        time.sleep(0)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            # 如果在非测试模式下发生错误，切换到测试模式
-            if not self.test_mode:
-                print(f"警告: 调用百度 API 出错: {str(e)}，切换到测试模式")
-                self.test_mode = True
-                return self._get_test_response(messages)
-                
+            self._record_model_call(route.model, attempt['started'], error=True)
+            # 读取超时被截短到剩余时间时，按超过时间预算处理
+            if deadline and deadline.expired():
+                raise DeadlineExceeded(f"生成回复超时：已超过 {deadline.seconds:g} 秒的时间预算")
             raise Exception(f"调用百度 API 时出错: {str(e)}")
+        finally:
+            self._settle_output_tokens("".join(chunks))
             
-    def get_code_explanation(self, code: str) -> str:
+    @staticmethod
+    def _parse_stream_line(line: str) -> Dict:
+        data_str = line[len('data:'):].strip() if line.startswith('data:') else line
+        result = json.loads(data_str)
+        if 'error_code' in result:
+            raise BaiduAPIError(result['error_code'], result.get('error_msg', '未知错误'))
+        return result
+        
+    def get_code_review(self, code: str, use_cache: bool = True) -> str:
+        """获取代码审查建议"""
+        return self.get_completion(self._code_review_messages(code), use_cache, operation="code_review")
+        
+    def get_code_explanation(self, code: str, use_cache: bool = True) -> str:
         """获取代码解释"""
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的代码讲解者。请用清晰易懂的方式解释提供的代码，"
-                    "包括其功能、实现原理和关键点。"
-                },
-                {
-                    "role": "user",
-                    "content": f"请解释以下代码：\n\n{code}"
-                }
-            ]
-            
-            return self.get_completion(messages)
-            
-        except Exception as e:
-            # 如果在非测试模式下发生错误，切换到测试模式
-            if not self.test_mode:
-                print(f"警告: 调用百度 API 出错: {str(e)}，切换到测试模式")
-                self.test_mode = True
-                return self._get_test_response(messages)
-                
-            raise Exception(f"调用百度 API 时出错: {str(e)}")
-            
-    def get_response(self, messages: List[Dict]) -> str:
+        return self.get_completion(self._code_explanation_messages(code), use_cache, operation="code_explanation")
+        
+    @staticmethod
+    def _code_review_messages(code: str) -> List[Dict]:
+        return [
+            {
+                "role": "system",
+                "content": "你是一个专业的代码审查者。请对提供的代码进行审查，"
+                "指出潜在的问题、改进建议和最佳实践。"
+            },
+            {
+                "role": "user",
+                "content": f"请审查以下代码：\n\n{code}"
+            }
+        ]
+        
+    @staticmethod
+    def _code_explanation_messages(code: str) -> List[Dict]:
+        return [
+            {
+                "role": "system",
+                "content": "你是一个专业的代码讲解者。请用清晰易懂的方式解释提供的代码，"
+                "包括其功能、实现原理和关键点。"
+            },
+            {
+                "role": "user",
+                "content": f"请解释以下代码：\n\n{code}"
+            }
+        ]
+        
+    def get_response(self, messages: List[Dict], use_cache: bool = True) -> str:
         """获取百度AI的响应文本
         
         该方法简化了获取AI回复的接口，直接返回文本内容
         """
         try:
-            result = self.get_completion(messages)
+            result = self.get_completion(messages, use_cache)
             
             # 处理不同类型的返回结果
             if isinstance(result, dict) and 'content' in result:
@@ -289,4 +602,37 @@ class BaiduClient:
         except Exception as e:
             error_msg = f"获取AI响应失败: {str(e)}"
             print(error_msg)
-            return f"抱歉，AI响应生成过程中遇到了错误。错误信息: {str(e)}" 
\ No newline at end of file
+            return f"抱歉，AI响应生成过程中遇到了错误。错误信息: {str(e)}"
+            
+    def stream_response(
+        self,
+        messages: List[Dict],
+        use_cache: bool = True,
+        deadline: Deadline = None,
+        priority: str = "background",
+        operation: str = "completion"
+    ) -> Iterator[str]:
+        """以流式方式获取百度AI的响应文本
+        
+        出错时抛出异常而不是把错误说明拼接在已输出的片段之后，由调用方丢弃已输出的部分；
+        超过截止时间时抛出 DeadlineExceeded，由调用方决定跳过还是终止
+        """
+        try:
+            yield from self.stream_completion(messages, use_cache, deadline, priority, operation)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"获取AI响应失败: {str(e)}")
+            raise
+
+_shared_client: Optional[BaiduClient] = None
+_shared_client_lock = threading.Lock()
+
+def get_baidu_client() -> BaiduClient:
+    """获取进程内共享的 BaiduClient，各服务共用同一个连接池和访问令牌"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = BaiduClient()
+    return _shared_client
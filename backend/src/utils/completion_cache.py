@@ -0,0 +1,149 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from utils.async_mode import run_blocking
+
+class CompletionCache:
+    """模型补全结果缓存
+
+    以 (model, messages, temperature, top_p) 的哈希为键，内存中按 LRU 淘汰并设置过期时间，
+    可选使用 SQLite 作为磁盘二级缓存，进程重启后仍可命中。
+    """
+
+    def __init__(self, max_entries: int = None, ttl: int = None, db_path: str = None):
+        """初始化缓存
+
+        Args:
+            max_entries: 内存中保留的最大条目数
+            ttl: 条目有效期（秒）
+            db_path: SQLite 磁盘缓存路径，为空时不使用磁盘缓存
+        """
+        self.max_entries = max_entries or Config.LLM_CACHE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else Config.LLM_CACHE_TTL
+        self.db_path = Config.LLM_CACHE_DB_PATH if db_path is None else db_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 磁盘层使用单独的锁，读写 SQLite 时不阻塞内存层的查询；协程模式下 SQLite 读写在原生线程中执行
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+        if self.db_path:
+            self._open_db()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], temperature: float, top_p: float) -> str:
+        """根据请求参数计算缓存键，只使用 role 和 content 字段"""
+        payload = json.dumps({
+            "model": model,
+            "messages": [[m.get("role"), m.get("content")] for m in messages],
+            "temperature": temperature,
+            "top_p": top_p
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._entries[key]
+                self.stats["expirations"] += 1
+
+        row = self._get_from_db(key, now)
+        with self._lock:
+            if row is not None:
+                value, expires_at = row
+                self.stats["disk_hits"] += 1
+                # 沿用磁盘中的过期时间，提升到内存层不会延长有效期
+                self._put_memory(key, value, expires_at)
+                return value
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存，磁盘写入在内存层的锁之外进行"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+        if self._db:
+            with self._db_lock:
+                run_blocking(self._write_db, key, value, expires_at)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+        if self._db:
+            with self._db_lock:
+                run_blocking(self._clear_db)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk_enabled": self._db is not None,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _put_memory(self, key: str, value: str, expires_at: float) -> None:
+        """写入内存层并按 LRU 淘汰，调用方需持有锁"""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _open_db(self) -> None:
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_completions_expires_at ON completions (expires_at)")
+        self._db.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    def _get_from_db(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        """从磁盘层读取值和过期时间"""
+        if not self._db:
+            return None
+        with self._db_lock:
+            row = run_blocking(lambda: self._db.execute(
+                "SELECT value, expires_at FROM completions WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone())
+        return tuple(row) if row else None
+
+    def _write_db(self, key: str, value: str, expires_at: float) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+        self._db.commit()
+
+    def _clear_db(self) -> None:
+        self._db.execute("DELETE FROM completions")
+        self._db.commit()
@@ -0,0 +1,70 @@
+import time
+from typing import Dict, Optional, Tuple
+from config import Config
+
+class DeadlineExceeded(Exception):
+    """请求的时间预算已用完"""
+
+class Deadline:
+    """一次分析或聊天请求的端到端截止时间
+
+    在入口处创建，沿调用链传递到每次模型调用，
+    每次调用的连接和读取超时都不超过剩余的时间预算。
+    """
+
+    def __init__(self, seconds: float):
+        """初始化截止时间
+
+        Args:
+            seconds: 从现在开始的时间预算（秒）
+        """
+        self.seconds = seconds
+        self._expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_request(cls, value, default: float) -> "Deadline":
+        """根据客户端传入的超时秒数创建截止时间
+
+        未传入时使用 default，超过 REQUEST_TIMEOUT_MAX 时按上限处理。
+
+        Raises:
+            ValueError: 超时不是正数
+        """
+        if value is None or value == "":
+            seconds = default
+        else:
+            try:
+                seconds = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"超时时间必须是数字: {value}")
+            if seconds <= 0:
+                raise ValueError(f"超时时间必须大于 0: {value}")
+        return cls(min(seconds, Config.REQUEST_TIMEOUT_MAX))
+
+    def remaining(self) -> float:
+        """剩余秒数，已过期时为 0"""
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, action: str = "请求") -> None:
+        """已过期时抛出 DeadlineExceeded"""
+        if self.expired():
+            raise DeadlineExceeded(f"{action}超时：已超过 {self.seconds:g} 秒的时间预算")
+
+    def timeout(self, connect: float, read: float) -> Tuple[float, float]:
+        """按剩余时间收紧单次 HTTP 请求的连接和读取超时"""
+        self.check("调用百度 API ")
+        remaining = self.remaining()
+        return min(connect, remaining), min(read, remaining)
+
+    def to_dict(self) -> Dict:
+        return {"budget": self.seconds, "remaining": round(self.remaining(), 3)}
+
+def request_timeout(deadline: Optional[Deadline]) -> Tuple[float, float]:
+    """单次请求的 (连接超时, 读取超时)，没有截止时间时使用配置的默认值"""
+    connect, read = Config.BAIDU_CONNECT_TIMEOUT, Config.BAIDU_READ_TIMEOUT
+    if deadline is None:
+        return connect, read
+    return deadline.timeout(connect, read)
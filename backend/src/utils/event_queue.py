@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger('event_queue')
+
+class OutboundEventQueue:
+    """WebSocket 出站事件队列
+
+    发送方只把事件放入队列立即返回，由独立的发送线程按节拍批量取出并发送：
+    同一节拍内带有相同合并键的事件只发送最新的一条；
+    队列满时先丢弃低优先级事件（如 Agent 状态），再丢弃可丢弃的事件（如流式增量），
+    最终回复、错误等必须送达的事件从不丢弃：没有可丢弃的事件时超出容量入队并计入 overflow，
+    发送方（流水线线程）从不阻塞。
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, Dict, Optional[str]], None],
+        tick: float = 0.05,
+        max_size: int = 10000
+    ):
+        """初始化事件队列
+
+        Args:
+            emit: 实际发送事件的函数，参数为事件名、数据和目标房间
+            tick: 合并事件的时间窗口（秒）
+            max_size: 队列容量
+        """
+        self.emit = emit
+        self.tick = tick
+        self.max_size = max_size
+        # 序号 -> (事件名, 数据, 房间, 合并键, 是否低优先级, 是否可丢弃)，按入队顺序排列
+        self._pending: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._by_key: Dict[Tuple, int] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._sending = False
+        self._flush_requested = False
+        self.stats = {
+            "enqueued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "overflow": 0, "batches": 0
+        }
+        self._thread = threading.Thread(target=self._run, name="ws-emitter", daemon=True)
+        self._thread.start()
+
+    def put(
+        self,
+        event: str,
+        data: Dict,
+        room: str = None,
+        coalesce_key: str = None,
+        low_priority: bool = False,
+        droppable: bool = False
+    ) -> bool:
+        """放入事件，被丢弃时返回 False
+
+        Args:
+            event: 事件名
+            data: 事件数据
+            room: 目标房间，为空时广播
+            coalesce_key: 合并键，队列中已有相同键和房间的事件时用新数据替换
+            low_priority: 队列满时最先丢弃的事件
+            droppable: 丢失后客户端可以从后续事件恢复的事件，队列满时在低优先级事件之后丢弃
+        """
+        with self._cond:
+            self.stats["enqueued"] += 1
+            key = (coalesce_key, room) if coalesce_key else None
+            if key and key in self._by_key:
+                seq = self._by_key[key]
+                self._pending[seq] = (event, data, room, key, low_priority, droppable)
+                self.stats["coalesced"] += 1
+                return True
+
+            if len(self._pending) >= self.max_size and not self._make_room(event, low_priority or droppable):
+                self.stats["dropped"] += 1
+                return False
+
+            seq = next(self._seq)
+            self._pending[seq] = (event, data, room, key, low_priority, droppable)
+            if key:
+                self._by_key[key] = seq
+            self._cond.notify()
+            return True
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待队列中的事件全部发送"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._pending and not self._sending, timeout)
+            self._flush_requested = False
+            return done
+
+    def to_dict(self) -> Dict:
+        with self._cond:
+            return {**self.stats, "queue_size": len(self._pending)}
+
+    def _make_room(self, event: str, droppable: bool) -> bool:
+        """队列满时为新事件腾出位置，新事件应被丢弃时返回 False，调用方需持有锁
+
+        可丢弃的新事件只能挤掉低优先级事件，否则丢弃自身，已入队的流式增量保持连续；
+        必须送达的事件还可以挤掉最早的可丢弃事件，都没有时立即超出容量入队，不等待发送线程。
+        """
+        if self._evict(lambda entry: entry[4]):
+            return True
+        if droppable:
+            return False
+        if self._evict(lambda entry: entry[5]):
+            return True
+        self.stats["overflow"] += 1
+        # 持续积压时每 1000 次只记录一条警告
+        if self.stats["overflow"] % 1000 == 1:
+            logger.warning(f"WebSocket事件队列已满，超出容量放入必须送达的事件（累计 {self.stats['overflow']} 次）: {event}")
+        return True
+
+    def _evict(self, evictable: Callable[[Tuple], bool]) -> bool:
+        """丢弃最早的一条满足条件的事件"""
+        for seq, entry in self._pending.items():
+            if evictable(entry):
+                self._remove(seq)
+                return True
+        return False
+
+    def _remove(self, seq: int) -> None:
+        entry = self._pending.pop(seq)
+        if entry[3]:
+            self._by_key.pop(entry[3], None)
+        self.stats["dropped"] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # 等待一个节拍，让被取代的事件在发送前完成合并
+                deadline = time.monotonic() + self.tick
+                while not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._by_key.clear()
+                self._sending = True
+
+            try:
+                self._send(batch)
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self.stats["sent"] += len(batch)
+                    self.stats["batches"] += 1
+                    self._cond.notify_all()
+
+    def _send(self, batch: List[Tuple]) -> None:
+        """按目标房间分组发送，同一房间内保持入队顺序"""
+        by_room: "OrderedDict[Optional[str], List[Tuple]]" = OrderedDict()
+        for entry in batch:
+            by_room.setdefault(entry[2], []).append(entry)
+        for room, entries in by_room.items():
+            for event, data, *_ in entries:
+                try:
+                    self.emit(event, data, room)
+                except Exception as e:
+                    logger.error(f"发送WebSocket事件失败: {event}: {str(e)}")
@@ -0,0 +1,220 @@
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import Config
+from utils.async_mode import concurrency_limit
+
+class ConnectionStats:
+    """统计连接池中新建连接与复用连接的次数，以及正在使用的连接数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.in_use = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.in_use += 1
+
+    def record_checkin(self) -> None:
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+                "in_use": self.in_use
+            }
+
+class RequestCancelled(Exception):
+    """请求所属的取消范围已被取消"""
+
+class CancelScope:
+    """记录一次调用正在使用的连接，取消时关闭这些连接，使阻塞中的读取立即失败
+
+    连接归还连接池时解除关联，取消不会影响之后被其他请求复用的连接。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = set()
+        self.cancelled = False
+
+    def attach(self, conn) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled("请求已取消")
+            self._connections.add(conn)
+
+    def detach(self, conn) -> None:
+        with self._lock:
+            self._connections.discard(conn)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            for conn in self._connections:
+                sock = getattr(conn, "sock", None)
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            self._connections.clear()
+
+_scope = threading.local()
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    """在当前线程内发出的请求都关联到 scope"""
+    previous = getattr(_scope, "current", None)
+    _scope.current = scope
+    try:
+        yield scope
+    finally:
+        _scope.current = previous
+
+def current_cancel_scope() -> Optional[CancelScope]:
+    return getattr(_scope, "current", None)
+
+def pool_saturated(session: requests.Session) -> bool:
+    """会话的连接池是否已没有空闲连接"""
+    pool_size = getattr(session, "pool_size", None)
+    stats = getattr(session, "connection_stats", None)
+    return bool(pool_size and stats) and stats.in_use >= pool_size
+
+def pool_wait_timeout(timeout, max_wait: float) -> float:
+    """等待空闲连接的最长秒数：不超过本次请求的连接超时（已按截止时间收紧），也不超过 max_wait"""
+    connect = getattr(timeout, "connect_timeout", timeout)
+    if isinstance(connect, (int, float)):
+        return min(connect, max_wait)
+    return max_wait
+
+def _counting_pool(base: type, stats: ConnectionStats, max_wait: float) -> type:
+    """创建在新建连接时计数、等待空闲连接有上限、连接可随调用取消的连接池类"""
+    class CountingConnectionPool(base):
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout=timeout)
+            stats.record_checkout()
+            scope = current_cancel_scope()
+            if scope is not None:
+                try:
+                    scope.attach(conn)
+                except RequestCancelled:
+                    # urlopen 出错时会把空位归还连接池
+                    conn.close()
+                    raise
+            return conn
+
+        def _put_conn(self, conn):
+            scope = current_cancel_scope()
+            if scope is not None and conn is not None:
+                scope.detach(conn)
+            stats.record_checkin()
+            super()._put_conn(conn)
+
+        def urlopen(self, *args, **kwargs):
+            # requests 不传 pool_timeout，连接池耗尽时会无限等待，忽略请求超时和截止时间
+            if kwargs.get("pool_timeout") is None:
+                kwargs["pool_timeout"] = pool_wait_timeout(kwargs.get("timeout"), max_wait)
+            return super().urlopen(*args, **kwargs)
+    return CountingConnectionPool
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """带连接计数和 TCP keep-alive 的 HTTP 适配器"""
+
+    def __init__(self, stats: ConnectionStats, tcp_keepalive: bool = True, pool_timeout: float = None, **kwargs):
+        self.stats = stats
+        self.tcp_keepalive = tcp_keepalive
+        self.pool_timeout = Config.BAIDU_POOL_TIMEOUT if pool_timeout is None else pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.tcp_keepalive:
+            # 开启 TCP keep-alive，避免空闲连接被中间设备静默断开
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats, self.pool_timeout),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats, self.pool_timeout)
+        }
+
+def default_pool_size() -> int:
+    """默认连接数：不少于 BAIDU_POOL_SIZE，并能容纳所有后台任务的并行阶段及其对冲请求"""
+    pipeline_calls = Config.JOB_MAX_WORKERS * Config.PIPELINE_MAX_WORKERS * 2
+    return concurrency_limit(max(Config.BAIDU_POOL_SIZE, pipeline_calls))
+
+def create_session(
+    pool_size: int = None,
+    tcp_keepalive: bool = None,
+    stats: ConnectionStats = None,
+    pool_timeout: float = None
+) -> requests.Session:
+    """创建使用连接池的 requests 会话
+
+    Args:
+        pool_size: 每个主机保持的最大连接数
+        tcp_keepalive: 是否开启 TCP keep-alive
+        stats: 连接统计对象，不传时新建
+        pool_timeout: 连接池耗尽时等待空闲连接的最长秒数，超时抛出 EmptyPoolError
+
+    Returns:
+        requests.Session: 会话对象，统计信息保存在 session.connection_stats，连接数保存在 session.pool_size
+    """
+    pool_size = pool_size or default_pool_size()
+    tcp_keepalive = Config.BAIDU_TCP_KEEPALIVE if tcp_keepalive is None else tcp_keepalive
+    stats = stats or ConnectionStats()
+
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(
+        stats,
+        tcp_keepalive=tcp_keepalive,
+        pool_timeout=pool_timeout,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        # 连接池耗尽时在请求超时内等待空闲连接，而不是临时新建连接后丢弃
+        pool_block=True
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    session.connection_stats = stats
+    session.pool_size = pool_size
+    return session
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session() -> requests.Session:
+    """获取进程内共享的连接池会话"""
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = create_session()
+    return _shared_session
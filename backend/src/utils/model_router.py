@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from typing import Dict, Optional
+from config import Config
+from storage.state_backend import StateBackend, get_state_backend
+from utils.resilience import LatencyTracker
+
+# 各模型的接口路径
+MODEL_URLS = {
+    'ERNIE-Bot': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions",
+    'ERNIE-Bot-4': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/completions_pro",
+    'ERNIE-Bot-8K': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/ernie_bot_8k",
+    'ERNIE-Bot-turbo': "/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/eb-instant"
+}
+
+# 可以配置路由的流水线阶段名和操作名
+ROUTE_NAMES = (
+    "mike", "emma", "bob", "alex", "david", "summary",
+    "completion", "code_completion", "code_review", "code_explanation",
+    "chat", "chat_summary", "prompt_summary"
+)
+
+# 运行时修改的路由保存在共享状态存储的这个命名空间，删除的路由保存为 {"deleted": true}
+ROUTES_NAMESPACE = "model_routes"
+
+def validate_route_name(name: str) -> None:
+    if name not in ROUTE_NAMES:
+        raise ValueError(f"未知的路由名: {name}，可选: {', '.join(ROUTE_NAMES)}")
+
+class ModelRoute:
+    """一个流水线阶段或操作使用的模型和采样参数，为空的字段使用调用方的默认值"""
+
+    def __init__(self, model: str = None, temperature: float = None, top_p: float = None):
+        if model is not None and model not in MODEL_URLS:
+            raise ValueError(f"不支持的模型: {model}，可选: {', '.join(MODEL_URLS)}")
+        for name, value in (("temperature", temperature), ("top_p", top_p)):
+            if value is not None and not 0 < float(value) <= 1:
+                raise ValueError(f"{name} 必须在 (0, 1] 范围内: {value}")
+        self.model = model
+        self.temperature = float(temperature) if temperature is not None else None
+        self.top_p = float(top_p) if top_p is not None else None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ModelRoute":
+        if not isinstance(data, dict):
+            raise ValueError("路由必须是 JSON 对象")
+        unknown = set(data) - {"model", "temperature", "top_p"}
+        if unknown:
+            raise ValueError(f"路由包含未知字段: {', '.join(sorted(unknown))}")
+        return cls(data.get("model"), data.get("temperature"), data.get("top_p"))
+
+    def to_dict(self) -> Dict:
+        return {"model": self.model, "temperature": self.temperature, "top_p": self.top_p}
+
+class ModelStats:
+    """单个模型的调用次数、错误数、耗时分位数和 token 用量"""
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def to_dict(self) -> Dict:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+def default_routes() -> Dict[str, ModelRoute]:
+    """默认路由：Mike 的需求分析和最终总结使用快速模型，Alex 的代码实现和代码补全使用强模型"""
+    routes = {
+        "mike": ModelRoute(Config.BAIDU_FAST_MODEL),
+        "summary": ModelRoute(Config.BAIDU_FAST_MODEL),
+        "alex": ModelRoute(Config.BAIDU_STRONG_MODEL, 0.2, 0.95),
+        "code_completion": ModelRoute(Config.BAIDU_STRONG_MODEL)
+    }
+    if Config.BAIDU_MODEL_ROUTES:
+        try:
+            overrides = json.loads(Config.BAIDU_MODEL_ROUTES)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"BAIDU_MODEL_ROUTES 不是有效的 JSON: {str(e)}")
+        if not isinstance(overrides, dict):
+            raise ValueError("BAIDU_MODEL_ROUTES 必须是 JSON 对象")
+        for name, data in overrides.items():
+            validate_route_name(name)
+            routes[name] = ModelRoute.from_dict(data)
+    return routes
+
+class ModelRouter:
+    """按流水线阶段名或操作名选择模型和采样参数
+
+    路由名为流水线阶段名（mike、emma、bob、alex、david、summary）或操作名
+    （completion、code_completion、code_review、code_explanation、chat、chat_summary、prompt_summary），
+    未配置路由时使用默认模型和调用方的采样参数。路由可以在运行时修改，
+    配置了共享状态存储时修改保存在存储中，所有工作进程在 MODEL_ROUTES_SYNC_INTERVAL 秒内生效；
+    未配置时只对当前进程生效。同时按模型统计调用耗时和 token 用量（每个进程单独统计）。
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, ModelRoute] = None,
+        default_model: str = None,
+        state: StateBackend = None
+    ):
+        """初始化路由表
+
+        Args:
+            routes: 路由名到模型路由的映射，为空时使用 default_routes()
+            default_model: 没有路由或路由未指定模型时使用的模型
+            state: 保存运行时修改的共享状态存储，为空时只修改本进程的路由表
+        """
+        self.default_model = default_model or Config.BAIDU_MODEL_NAME
+        self._routes = dict(default_routes() if routes is None else routes)
+        self.state = state
+        # 从共享存储读取的运行时修改，值为 None 表示该路由已删除
+        self._shared: Dict[str, Optional[ModelRoute]] = {}
+        self._synced_at: Optional[float] = None
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: str, temperature: float, top_p: float) -> ModelRoute:
+        """返回路由名对应的模型和采样参数
+
+        Args:
+            name: 流水线阶段名或操作名
+            temperature: 路由未指定时使用的 temperature
+            top_p: 路由未指定时使用的 top_p
+        """
+        route = self._current_routes().get(name)
+        if route is None:
+            return ModelRoute(self.default_model, temperature, top_p)
+        return ModelRoute(
+            route.model or self.default_model,
+            route.temperature if route.temperature is not None else temperature,
+            route.top_p if route.top_p is not None else top_p
+        )
+
+    def set_route(self, name: str, route: ModelRoute) -> None:
+        """设置路由，未知的路由名抛出 ValueError"""
+        validate_route_name(name)
+        if self.state is not None:
+            self.state.put(ROUTES_NAMESPACE, name, route.to_dict())
+            with self._lock:
+                self._shared[name] = route
+            return
+        with self._lock:
+            self._routes[name] = route
+
+    def remove_route(self, name: str) -> bool:
+        """删除路由，之后使用默认模型；路由不存在时返回 False"""
+        if name not in self._current_routes():
+            return False
+        if self.state is not None:
+            self.state.put(ROUTES_NAMESPACE, name, {"deleted": True})
+            with self._lock:
+                self._shared[name] = None
+            return True
+        with self._lock:
+            return self._routes.pop(name, None) is not None
+
+    def get_routes(self) -> Dict[str, Dict]:
+        return {name: route.to_dict() for name, route in self._current_routes().items()}
+
+    def _current_routes(self) -> Dict[str, ModelRoute]:
+        """启动时的路由合并共享存储中的运行时修改，共享存储每隔 MODEL_ROUTES_SYNC_INTERVAL 秒读取一次"""
+        if self.state is not None:
+            now = time.monotonic()
+            if self._synced_at is None or now - self._synced_at >= Config.MODEL_ROUTES_SYNC_INTERVAL:
+                shared = {
+                    name: None if data.get("deleted") else ModelRoute.from_dict(data)
+                    for name, data in self.state.items(ROUTES_NAMESPACE).items()
+                }
+                with self._lock:
+                    self._shared = shared
+                    self._synced_at = now
+        with self._lock:
+            routes = dict(self._routes)
+            for name, route in self._shared.items():
+                if route is None:
+                    routes.pop(name, None)
+                else:
+                    routes[name] = route
+        return routes
+
+    def record(
+        self,
+        model: str,
+        seconds: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        error: bool = False
+    ) -> None:
+        """记录一次上游调用，失败的调用只计入错误数"""
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.calls += 1
+            if error:
+                stats.errors += 1
+                return
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+        stats.latency.record(seconds)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            models = dict(self._stats)
+        return {
+            "default_model": self.default_model,
+            "routes": self.get_routes(),
+            "models": {model: stats.to_dict() for model, stats in models.items()}
+        }
+
+_shared_router: Optional[ModelRouter] = None
+_shared_router_lock = threading.Lock()
+
+def get_model_router() -> ModelRouter:
+    """获取进程内共享的模型路由表，运行时的修改对所有客户端生效"""
+    global _shared_router
+    if _shared_router is None:
+        with _shared_router_lock:
+            if _shared_router is None:
+                _shared_router = ModelRouter(state=get_state_backend())
+    return _shared_router
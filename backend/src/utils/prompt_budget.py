@@ -0,0 +1,157 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from config import Config
+
+# 中日韩文字与全角标点，按每字一个 token 估算
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+_CODE_BLOCK_PATTERN = re.compile(r'```.*?```', re.S)
+OMITTED_MARK = "……（内容过长，已省略）"
+
+def estimate_tokens(text: str) -> int:
+    """快速估算文本的 token 数
+
+    中文按每字一个 token，其余字符按每 4 个字符一个 token，
+    对中文为主的文本偏保守，保证估算结果不低于实际值太多。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """抽取式压缩：先省略代码块，再按行保留开头部分，直到满足 token 上限"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    text = _CODE_BLOCK_PATTERN.sub("[代码已省略]", text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens - estimate_tokens(OMITTED_MARK)
+    kept: List[str] = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            # 第一行就超出预算时按字符截断，保证至少保留部分内容
+            if not kept and budget > 0:
+                kept.append(_truncate_line(line, budget))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).rstrip() + OMITTED_MARK
+
+def _truncate_line(line: str, max_tokens: int) -> str:
+    """按字符截断单行文本"""
+    low, high = 0, len(line)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(line[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return line[:low]
+
+class PromptBudget:
+    """为流水线各阶段构造不超过 token 预算的提示词"""
+
+    def __init__(
+        self,
+        default_budget: int = None,
+        stage_budgets: Dict[str, int] = None,
+        summarize: Optional[Callable[[str, int], str]] = None,
+        mode: str = None
+    ):
+        """初始化提示词预算
+
+        Args:
+            default_budget: 默认的单阶段提示词 token 上限
+            stage_budgets: 按阶段名称覆盖的 token 上限
+            summarize: 摘要函数，参数为原文和目标 token 数，mode 为 summary 时使用
+            mode: 压缩方式，extractive 为抽取式截取，summary 为调用模型生成摘要
+        """
+        self.default_budget = default_budget or Config.PROMPT_STAGE_TOKEN_BUDGET
+        self.stage_budgets = stage_budgets or {}
+        self.summarize = summarize
+        self.mode = mode or Config.PROMPT_COMPRESSION_MODE
+
+    def get_budget(self, stage_name: str) -> int:
+        return self.stage_budgets.get(stage_name, self.default_budget)
+
+    def build_prompt(
+        self,
+        stage,
+        input_content: str,
+        outputs: Dict[str, str],
+        mode: str = None
+    ) -> Tuple[str, Dict]:
+        """构造提示词，超出预算时按比例压缩前序阶段的输出
+
+        Args:
+            stage: 流水线阶段
+            input_content: 用户输入
+            outputs: 已完成阶段的输出
+            mode: 本次使用的压缩方式，为空时使用初始化时的设置
+
+        Returns:
+            Tuple[str, Dict]: 提示词和提示词大小统计
+        """
+        budget = self.get_budget(stage.name)
+        mode = mode or self.mode
+        deps = {name: outputs[name] for name in stage.depends_on}
+        original_tokens = estimate_tokens(stage.build_prompt(input_content, deps))
+        stats = {
+            "budget": budget,
+            "mode": mode,
+            "original_tokens": original_tokens,
+            "final_tokens": original_tokens,
+            "compressed": []
+        }
+        if original_tokens <= budget:
+            return stage.build_prompt(input_content, deps), stats
+
+        # 模板本身占用的 token（不含用户输入和前序输出）
+        overhead = estimate_tokens(stage.build_prompt("", {name: "" for name in deps}))
+        # 用户输入最多占剩余预算的一半，其余留给前序输出
+        input_budget = max((budget - overhead) // 2, 0) if deps else max(budget - overhead, 0)
+        input_content = trim_to_tokens(input_content, input_budget)
+        available = budget - overhead - estimate_tokens(input_content)
+
+        compressed = self._allocate(deps, max(available, 0), mode)
+        stats["compressed"] = [name for name in deps if compressed[name] != deps[name]]
+        prompt = stage.build_prompt(input_content, compressed)
+        stats["final_tokens"] = estimate_tokens(prompt)
+        return prompt, stats
+
+    def _allocate(self, deps: Dict[str, str], available: int, mode: str) -> Dict[str, str]:
+        """在各前序输出之间分配预算，较短的输出原样保留，剩余预算均分给较长的输出"""
+        sizes = {name: estimate_tokens(text) for name, text in deps.items()}
+        result = {}
+        remaining = available
+        pending = sorted(deps, key=lambda name: sizes[name])
+        while pending:
+            share = remaining // len(pending)
+            name = pending.pop(0)
+            if sizes[name] <= share:
+                result[name] = deps[name]
+                remaining -= sizes[name]
+                continue
+            # 剩余的输出都比平均份额长，统一压缩到平均份额
+            for other in [name] + pending:
+                result[other] = self._compress(deps[other], share, mode)
+            break
+        return result
+
+    def _compress(self, text: str, max_tokens: int, mode: str) -> str:
+        """压缩单段文本到指定 token 数"""
+        if mode == "summary" and self.summarize:
+            try:
+                summary = self.summarize(text, max_tokens)
+                # 摘要仍可能超长，再做一次抽取式截取兜底
+                return trim_to_tokens(summary, max_tokens)
+            except Exception as e:
+                print(f"警告: 生成摘要失败，改用抽取式压缩: {str(e)}")
+        return trim_to_tokens(text, max_tokens)
@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional
+from config import Config
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.prompt_budget import estimate_tokens
+from utils.resilience import LatencyTracker
+
+# 优先级从高到低：用户正在等待的聊天请求，后台执行的流水线阶段、摘要等
+PRIORITIES = ("interactive", "background")
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    """估算一组对话消息占用的 token 数"""
+    return sum(estimate_tokens(message.get("content", "")) for message in messages)
+
+class TokenBucket:
+    """令牌桶，按固定速率补充，最多积累 capacity 个
+
+    单次取用超过容量时，等桶满后放行并允许余额为负，之后的请求等待补足欠额。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的数量
+            capacity: 桶的容量，即允许的突发量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """还需等待多少秒才能取出 amount 个"""
+        self._refill()
+        need = min(amount, self.capacity)
+        if self.level >= need:
+            return 0.0
+        return (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self) -> None:
+        """清空桶，之后的请求需要等待重新积累"""
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+class RateLimiter:
+    """进程内共享的出站限流器
+
+    按每分钟请求数和每分钟 token 数两个令牌桶限流，额度不足时排队等待而不是失败。
+    排队按优先级放行，交互式请求总是排在后台请求之前，同一优先级先到先得。
+    两个速率都为 0 时不限流。
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        burst_seconds: float = None
+    ):
+        """初始化限流器
+
+        Args:
+            requests_per_minute: 每分钟最多请求数，0 表示不限
+            tokens_per_minute: 每分钟最多 token 数（输入加输出），0 表示不限
+            burst_seconds: 桶容量对应的秒数，决定空闲后允许的突发量
+        """
+        self.requests_per_minute = Config.BAIDU_RATE_LIMIT_RPM if requests_per_minute is None else requests_per_minute
+        self.tokens_per_minute = Config.BAIDU_RATE_LIMIT_TPM if tokens_per_minute is None else tokens_per_minute
+        burst_seconds = burst_seconds or Config.BAIDU_RATE_LIMIT_BURST_SECONDS
+        self.request_bucket = self._make_bucket(self.requests_per_minute, burst_seconds)
+        self.token_bucket = self._make_bucket(self.tokens_per_minute, burst_seconds)
+        self._cond = threading.Condition()
+        self._waiting: List = []
+        self._seq = itertools.count()
+        self._wait_times = {priority: LatencyTracker() for priority in PRIORITIES}
+        self.stats = {
+            priority: {"acquired": 0, "queued": 0, "waiting": 0, "max_wait_ms": 0.0, "timeouts": 0}
+            for priority in PRIORITIES
+        }
+        self.rate_limited = 0
+
+    @staticmethod
+    def _make_bucket(per_minute: float, burst_seconds: float) -> Optional[TokenBucket]:
+        if not per_minute or per_minute <= 0:
+            return None
+        rate = per_minute / 60
+        return TokenBucket(rate, max(rate * burst_seconds, 1.0))
+
+    @property
+    def enabled(self) -> bool:
+        return self.request_bucket is not None or self.token_bucket is not None
+
+    def acquire(self, tokens: int = 0, priority: str = "background", deadline: Deadline = None) -> float:
+        """等待请求额度，返回等待的秒数
+
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+            priority: interactive 或 background
+            deadline: 所属请求的截止时间，等不到额度时抛出 DeadlineExceeded
+
+        Raises:
+            ValueError: 未知的优先级
+            DeadlineExceeded: 截止时间前拿不到额度
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"未知的限流优先级: {priority}")
+        if not self.enabled:
+            return 0.0
+
+        stats = self.stats[priority]
+        ticket = (PRIORITIES.index(priority), next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            stats["waiting"] += 1
+            # 新的高优先级请求可能插到队首，唤醒当前队首重新判断
+            self._cond.notify_all()
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == ticket:
+                        wait = self._time_until_available(tokens)
+                        if wait <= 0:
+                            self._take(tokens)
+                            break
+                    if deadline:
+                        remaining = deadline.remaining()
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            stats["timeouts"] += 1
+                            raise DeadlineExceeded(f"等待调用额度超时：已超过 {deadline.seconds:g} 秒的时间预算")
+                        wait = remaining if wait is None else wait
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                stats["waiting"] -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            stats["acquired"] += 1
+            if waited > 0.001:
+                stats["queued"] += 1
+            stats["max_wait_ms"] = max(stats["max_wait_ms"], round(waited * 1000, 1))
+        self._wait_times[priority].record(waited)
+        return waited
+
+    def settle(self, tokens: int) -> None:
+        """按实际用量修正 token 桶：tokens 为实际用量减去预计用量，可以为负"""
+        if self.token_bucket is None or not tokens:
+            return
+        with self._cond:
+            if tokens > 0:
+                self.token_bucket.take(tokens)
+            else:
+                self.token_bucket.give_back(-tokens)
+                self._cond.notify_all()
+
+    def refund(self, tokens: int) -> None:
+        """退还一次没有得到回复的尝试预留的 token，请求额度不退还"""
+        self.settle(-tokens)
+
+    def charge(self, tokens: int = 0) -> None:
+        """不排队直接扣除一次请求的额度，用于对冲请求等已经发出的调用，余额可以为负"""
+        if not self.enabled:
+            return
+        with self._cond:
+            self._take(tokens)
+
+    def penalize(self) -> None:
+        """上游返回限流错误时清空请求桶，让排队的请求一起放慢"""
+        with self._cond:
+            self.rate_limited += 1
+            if self.request_bucket is not None:
+                self.request_bucket.drain()
+
+    def _time_until_available(self, tokens: int) -> float:
+        waits = [0.0]
+        if self.request_bucket is not None:
+            waits.append(self.request_bucket.time_until(1))
+        if self.token_bucket is not None:
+            waits.append(self.token_bucket.time_until(tokens))
+        return max(waits)
+
+    def _take(self, tokens: int) -> None:
+        if self.request_bucket is not None:
+            self.request_bucket.take(1)
+        if self.token_bucket is not None:
+            self.token_bucket.take(tokens)
+
+    def to_dict(self) -> Dict:
+        with self._cond:
+            stats = {priority: dict(values) for priority, values in self.stats.items()}
+            queue_depth = len(self._waiting)
+            rate_limited = self.rate_limited
+        for priority, values in stats.items():
+            p50 = self._wait_times[priority].percentile(50)
+            p95 = self._wait_times[priority].percentile(95)
+            values["p50_wait_ms"] = round(p50 * 1000, 1) if p50 is not None else None
+            values["p95_wait_ms"] = round(p95 * 1000, 1) if p95 is not None else None
+        return {
+            "enabled": self.enabled,
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "queue_depth": queue_depth,
+            "rate_limited": rate_limited,
+            "priorities": stats
+        }
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限流器，所有 BaiduClient 共用同一份额度"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_limiter_lock:
+            if _shared_limiter is None:
+                _shared_limiter = RateLimiter()
+    return _shared_limiter
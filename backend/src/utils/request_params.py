@@ -0,0 +1,17 @@
+def parse_flag(value, name: str) -> bool:
+    """解析请求中的布尔开关，兼容 JSON 布尔值、0/1 以及 "true"/"false" 等字符串写法
+
+    Raises:
+        ValueError: 无法识别的取值，接口返回 400
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        if normalized in ('1', 'true', 'yes'):
+            return True
+        if normalized in ('0', 'false', 'no', ''):
+            return False
+    raise ValueError(f"{name} 必须是布尔值: {value}")
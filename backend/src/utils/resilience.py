@@ -0,0 +1,369 @@
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+import requests
+from config import Config
+from utils.http_pool import CancelScope, cancel_scope
+
+# 百度 API 返回的错误码：令牌无效或过期、可以重试的服务端错误和限流
+AUTH_ERROR_CODES = {110, 111}
+RETRYABLE_ERROR_CODES = {1, 2, 4, 18, 336100, 336501, 336502}
+# 其中表示超过 QPS、RPM 或 TPM 配额的错误码
+RATE_LIMIT_ERROR_CODES = {4, 18, 336501, 336502}
+
+class BaiduAPIError(Exception):
+    """百度 API 返回的业务错误"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"API 错误: {message}")
+        self.code = code
+
+class UpstreamError(Exception):
+    """上游 HTTP 错误，status_code 为空表示网络错误或超时"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求未发送"""
+
+def classify_error(error: Exception) -> str:
+    """对调用失败分类
+
+    Returns:
+        auth: 令牌失效，刷新令牌后重试
+        retryable: 网络错误、超时、限流和服务端错误，退避后重试，并计入熔断
+        fatal: 请求本身有误，不重试
+    """
+    if isinstance(error, BaiduAPIError):
+        if error.code in AUTH_ERROR_CODES:
+            return "auth"
+        return "retryable" if error.code in RETRYABLE_ERROR_CODES else "fatal"
+    status = None
+    if isinstance(error, UpstreamError):
+        status = error.status_code
+        if status is None:
+            return "retryable"
+    elif isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+    if status is not None:
+        if status == 401:
+            return "auth"
+        return "retryable" if status == 429 or status >= 500 else "fatal"
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return "retryable"
+    return "fatal"
+
+def is_rate_limited(error: Exception) -> bool:
+    """是否为上游的限流错误（HTTP 429 或配额错误码）"""
+    if isinstance(error, BaiduAPIError):
+        return error.code in RATE_LIMIT_ERROR_CODES
+    if isinstance(error, UpstreamError):
+        return error.status_code == 429
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429
+    return False
+
+class RetryPolicy:
+    """有上限的重试，间隔按指数增长并加入完全随机抖动"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None):
+        """初始化重试策略
+
+        Args:
+            max_attempts: 包括首次请求在内的最大尝试次数
+            base_delay: 第一次重试前的最大等待秒数
+            max_delay: 单次等待的上限
+        """
+        self.max_attempts = max_attempts or Config.BAIDU_RETRY_MAX_ATTEMPTS
+        self.base_delay = Config.BAIDU_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = Config.BAIDU_RETRY_MAX_DELAY if max_delay is None else max_delay
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次失败（从 1 开始）后的等待秒数"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """熔断器
+
+    连续 failure_threshold 次可重试的失败后打开，直接拒绝请求；
+    recovery_timeout 秒后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = None, recovery_timeout: float = None):
+        self.failure_threshold = failure_threshold or Config.BAIDU_BREAKER_FAILURE_THRESHOLD
+        self.recovery_timeout = Config.BAIDU_BREAKER_RECOVERY_TIMEOUT if recovery_timeout is None else recovery_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def allow(self) -> bool:
+        """是否允许发送请求，半开状态下同时只允许一个探测请求"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.stats["rejected"] += 1
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    self.stats["rejected"] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """请求因与上游无关的原因结束（如参数错误）时释放半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "state": self.state, "consecutive_failures": self._failures}
+
+class LatencyTracker:
+    """记录最近若干次成功调用的耗时，用于计算分位数"""
+
+    def __init__(self, window: int = 200):
+        self._window = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._window.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._window:
+                return None
+            ordered = sorted(self._window)
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+class _HedgeTimer:
+    """在到期时执行回调的单个后台线程，所有待发的对冲请求共用"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        self._thread = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> list:
+        with self._cond:
+            self._seq += 1
+            entry = [time.monotonic() + delay, self._seq, callback, False]
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="baidu-hedge-timer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return entry
+
+    def cancel(self, entry: list) -> None:
+        with self._cond:
+            entry[3] = True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][3]:
+                    if self._heap:
+                        heapq.heappop(self._heap)
+                    else:
+                        self._cond.wait()
+                due = self._heap[0][0] - time.monotonic()
+                if due > 0:
+                    self._cond.wait(due)
+                    continue
+                entry = heapq.heappop(self._heap)
+            try:
+                entry[2]()
+            except Exception as e:
+                print(f"发送对冲请求失败: {str(e)}")
+
+class _HedgedCall:
+    """一次可能被对冲的调用在主请求和对冲请求之间共享的状态"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.primary_scope = CancelScope()
+        self.hedge_scope = CancelScope()
+        self.hedge_done = threading.Event()
+        self.hedge_started = False
+        self.closed = False
+        self.winner = None
+        self.result = None
+
+class Hedger:
+    """对冲请求
+
+    主请求在调用方线程上执行，耗时超过近期 p95 仍未返回时在对冲线程池中再发送一个相同的请求，
+    采用先完成的结果并关闭落后请求的连接，用少量额外请求削减长尾延迟。
+    样本不足、对冲线程全部占用或连接池没有空闲连接时不对冲。
+    """
+
+    def __init__(
+        self,
+        percentile: float = None,
+        min_samples: int = None,
+        max_workers: int = None,
+        saturated: Callable[[], bool] = None
+    ):
+        """
+        Args:
+            percentile: 触发对冲的耗时分位数
+            min_samples: 开始对冲前需要的耗时样本数
+            max_workers: 同时进行的对冲请求上限
+            saturated: 返回 True 时跳过对冲，例如连接池已没有空闲连接
+        """
+        self.percentile = percentile or Config.BAIDU_HEDGE_PERCENTILE
+        self.min_samples = min_samples or Config.BAIDU_HEDGE_MIN_SAMPLES
+        self.max_workers = max_workers or Config.BAIDU_POOL_SIZE
+        self.saturated = saturated
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="baidu-hedge")
+        self._timer = _HedgeTimer()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"calls": 0, "hedged": 0, "skipped": 0, "hedge_wins": 0, "primary_wins": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latency) < self.min_samples:
+            return None
+        return self.latency.percentile(self.percentile)
+
+    def call(self, fn: Callable[[], str], on_hedge: Callable[[], None] = None) -> str:
+        """在当前线程执行 fn，超过对冲延迟仍未返回时并发执行第二次，返回先成功的结果
+
+        Args:
+            fn: 发送一次请求的函数
+            on_hedge: 发送对冲请求前调用，用于为第二次请求扣除限流额度
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+        delay = self.hedge_delay()
+        started = time.monotonic()
+        if delay is None:
+            result = fn()
+            self.latency.record(time.monotonic() - started)
+            return result
+
+        call = _HedgedCall()
+        timer = self._timer.schedule(delay, lambda: self._launch_hedge(call, fn, on_hedge))
+        error = None
+        try:
+            with cancel_scope(call.primary_scope):
+                result = fn()
+        except Exception as e:
+            error = e
+        finally:
+            self._timer.cancel(timer)
+
+        with call.lock:
+            call.closed = True
+            if error is None and call.winner is None:
+                call.winner = "primary"
+                call.result = result
+            hedge_started = call.hedge_started
+        if call.winner == "primary":
+            if hedge_started:
+                call.hedge_scope.cancel()
+                with self._lock:
+                    self.stats["primary_wins"] += 1
+            self.latency.record(time.monotonic() - started)
+            return call.result
+        if not hedge_started:
+            raise error
+        call.hedge_done.wait()
+        if call.winner != "hedge":
+            raise error
+        self.latency.record(time.monotonic() - started)
+        return call.result
+
+    def _launch_hedge(self, call: _HedgedCall, fn: Callable[[], str], on_hedge: Callable[[], None]) -> None:
+        """对冲延迟到期时由计时线程调用，主请求已结束或资源饱和时不发送"""
+        with call.lock:
+            if call.closed:
+                return
+            with self._lock:
+                if self._in_flight >= self.max_workers or (self.saturated and self.saturated()):
+                    self.stats["skipped"] += 1
+                    return
+                self._in_flight += 1
+                self.stats["hedged"] += 1
+            call.hedge_started = True
+        try:
+            if on_hedge:
+                on_hedge()
+            self._executor.submit(self._run_hedge, call, fn)
+        except Exception:
+            self._finish_hedge(call)
+            raise
+
+    def _run_hedge(self, call: _HedgedCall, fn: Callable[[], str]) -> None:
+        try:
+            try:
+                with cancel_scope(call.hedge_scope):
+                    result = fn()
+            except Exception:
+                return
+            with call.lock:
+                won = call.winner is None
+                if won:
+                    call.winner = "hedge"
+                    call.result = result
+            if won:
+                # 关闭主请求的连接，让调用方线程立即返回对冲结果
+                call.primary_scope.cancel()
+                with self._lock:
+                    self.stats["hedge_wins"] += 1
+        finally:
+            self._finish_hedge(call)
+
+    def _finish_hedge(self, call: _HedgedCall) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        call.hedge_done.set()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        hedged = stats["hedged"]
+        return {
+            **stats,
+            "hedge_rate": round(hedged / stats["calls"], 4) if stats["calls"] else 0.0,
+            "hedge_win_rate": round(stats["hedge_wins"] / hedged, 4) if hedged else 0.0,
+            "hedge_delay": self.hedge_delay(),
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95)
+        }
@@ -0,0 +1,80 @@
+import threading
+from typing import Callable, Dict, Optional, TypeVar
+from utils.deadline import Deadline, DeadlineExceeded
+
+T = TypeVar('T')
+
+class _Call:
+    """一次进行中的调用，等待者共享它的结果或异常"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """合并进行中的相同请求
+
+    同一个键同时只执行一次，期间到达的相同请求等待这次调用结束，
+    得到相同的结果或异常。调用结束后立即从表中移除，不缓存结果。
+    saved_calls 只统计拿到共享结果的等待者，waiting 为当前正在等待的调用数。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"executed": 0, "saved_calls": 0}
+        self._waiting = 0
+
+    def do(self, key: str, fn: Callable[[], T], deadline: Deadline = None) -> T:
+        """执行 fn，已有相同键的调用在进行时等待它的结果
+
+        Args:
+            key: 规范化后的请求键
+            fn: 实际发起请求的函数
+            deadline: 当前调用方的截止时间，等待超过剩余时间时抛出 DeadlineExceeded；
+                执行者因自己的截止时间失败时，时间还有剩余的等待者重新发起请求
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.stats["executed"] += 1
+                else:
+                    self._waiting += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+
+            try:
+                finished = call.done.wait(deadline.remaining() if deadline else None)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not finished:
+                raise DeadlineExceeded(f"等待相同请求的结果超时：已超过 {deadline.seconds:g} 秒的时间预算")
+            if call.error is None:
+                with self._lock:
+                    self.stats["saved_calls"] += 1
+                return call.result
+            if isinstance(call.error, DeadlineExceeded) and deadline and not deadline.expired():
+                continue
+            raise call.error
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+            stats["waiting"] = self._waiting
+        return stats
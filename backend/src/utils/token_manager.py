@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional
+from config import Config
+
+class TokenManager:
+    """访问令牌管理器
+
+    记录令牌的过期时间，在过期前后台刷新；并发请求共用同一次刷新；
+    令牌保存到本地文件，其他工作进程和重启后的进程可以直接复用。
+    """
+
+    def __init__(
+        self,
+        fetch_token: Callable[[], Dict],
+        cache_key: str,
+        cache_file: str = None,
+        refresh_margin: int = None
+    ):
+        """初始化令牌管理器
+
+        Args:
+            fetch_token: 获取新令牌的函数，返回包含 access_token 和 expires_in 的字典
+            cache_key: 区分不同凭证的缓存键
+            cache_file: 令牌缓存文件路径，为空字符串时不使用文件缓存
+            refresh_margin: 在过期前多少秒刷新令牌
+        """
+        self.fetch_token = fetch_token
+        self.cache_key = cache_key
+        self.cache_file = Config.BAIDU_TOKEN_CACHE_FILE if cache_file is None else cache_file
+        self.refresh_margin = Config.BAIDU_TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        # 被服务端拒绝的令牌，缓存文件中仍是这个令牌时不再加载
+        self._rejected: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.refresh_count = 0
+
+    def get_token(self) -> str:
+        """获取有效的访问令牌，必要时刷新"""
+        if self._is_valid():
+            return self._token
+
+        # 只有一个线程执行刷新，其余线程等待后直接使用新令牌
+        with self._refresh_lock:
+            if self._is_valid():
+                return self._token
+            if self._load_from_file():
+                return self._token
+            self._refresh()
+            return self._token
+
+    def invalidate(self, token: str = None) -> None:
+        """使令牌失效，传入 token 时仅在其仍为当前令牌时失效"""
+        with self._refresh_lock:
+            if token is None or token == self._token:
+                self._rejected = self._token
+                self._token = None
+                self._expires_at = 0.0
+
+    def stop(self) -> None:
+        """停止后台刷新"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "has_token": self._token is not None,
+            "expires_in": max(int(self._expires_at - time.time()), 0) if self._token else 0,
+            "refresh_count": self.refresh_count
+        }
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at
+
+    def _refresh(self) -> None:
+        """调用 OAuth 接口获取新令牌，调用方需持有刷新锁"""
+        result = self.fetch_token()
+        self._set_token(result['access_token'], time.time() + int(result.get('expires_in', 0)))
+        self.refresh_count += 1
+        self._save_to_file()
+
+    def _set_token(self, token: str, expires_at: float) -> None:
+        self._token = token
+        self._expires_at = expires_at
+        self._schedule_refresh()
+
+    def _schedule_refresh(self) -> None:
+        """在令牌过期前安排后台刷新"""
+        self.stop()
+        delay = self._expires_at - self.refresh_margin - time.time()
+        if delay <= 0:
+            return
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            with self._refresh_lock:
+                # 其他进程可能已经刷新并写入了文件
+                if not self._load_from_file(require_fresh=True):
+                    self._refresh()
+        except Exception as e:
+            print(f"警告: 后台刷新访问令牌失败: {str(e)}")
+
+    def _load_from_file(self, require_fresh: bool = False) -> bool:
+        """从缓存文件加载令牌
+
+        Args:
+            require_fresh: 为 True 时只接受未进入刷新窗口的令牌
+        """
+        if not self.cache_file:
+            return False
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(self.cache_key)
+        except (OSError, ValueError):
+            return False
+
+        if not entry:
+            return False
+        min_expires_at = time.time() + (self.refresh_margin if require_fresh else 0)
+        if entry.get('expires_at', 0) <= min_expires_at or entry.get('access_token') in (self._token, self._rejected):
+            return False
+
+        self._set_token(entry['access_token'], entry['expires_at'])
+        return True
+
+    def _save_to_file(self) -> None:
+        """将令牌写入缓存文件
+
+        缓存目录不存在时按 0700 创建；令牌先写入 mkstemp 在同一目录创建的临时文件
+        （随机文件名、O_EXCL、权限 0600，不会跟随预先放置的符号链接），再原子替换缓存文件。
+        """
+        if not self.cache_file:
+            return
+        tmp_file = None
+        try:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+
+            entries[self.cache_key] = {
+                'access_token': self._token,
+                'expires_at': self._expires_at
+            }
+            directory, name = os.path.split(os.path.abspath(self.cache_file))
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_file, self.cache_file)
+            tmp_file = None
+        except OSError as e:
+            print(f"警告: 写入访问令牌缓存失败: {str(e)}")
+        finally:
+            if tmp_file:
+                try:
+                    os.unlink(tmp_file)
+                except OSError:
+                    pass
+
+_managers: Dict[str, TokenManager] = {}
+_managers_lock = threading.Lock()
+
+def get_token_manager(api_key: str, fetch_token: Callable[[], Dict]) -> TokenManager:
+    """获取指定凭证在进程内共享的令牌管理器"""
+    # 缓存文件中只保存 API Key 的摘要
+    cache_key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    with _managers_lock:
+        manager = _managers.get(cache_key)
+        if manager is None:
+            manager = TokenManager(fetch_token, cache_key)
+            _managers[cache_key] = manager
+        return manager
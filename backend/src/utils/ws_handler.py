@@ -4,6 +4,8 @@ from datetime import datetime
 import time
 import json
 import logging
+from config import Config
+from utils.event_queue import OutboundEventQueue
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,6 +15,7 @@ class WebSocketMessageType:
     """WebSocket消息类型枚举"""
     USER_MESSAGE = 'user_message'
     AGENT_RESPONSE = 'agent_response'
+    AGENT_RESPONSE_DELTA = 'agent_response_delta'
     CONNECTION_UPDATE = 'connection_update'
     AGENT_STATUS = 'agent_status'
     CONVERSATION_UPDATE = 'conversation_update'
@@ -23,13 +26,36 @@ class WebSocketMessageType:
 class WebSocketHandler:
     """WebSocket处理器，用于发送消息到客户端"""
 
-    def __init__(self, socketio: Optional[SocketIO] = None):
+    # 同一节拍内只需发送最新一条的事件，以及队列满时可以丢弃的低优先级事件
+    COALESCED_EVENTS = {
+        WebSocketMessageType.AGENT_STATUS,
+        WebSocketMessageType.CONNECTION_UPDATE,
+        WebSocketMessageType.TASK_UPDATE
+    }
+    LOW_PRIORITY_EVENTS = {
+        WebSocketMessageType.AGENT_STATUS,
+        WebSocketMessageType.CONNECTION_UPDATE
+    }
+    # 队列满时可以在低优先级事件之后丢弃的事件：流式增量丢失后，最终的 agent_response 仍包含完整内容
+    DROPPABLE_EVENTS = {
+        WebSocketMessageType.AGENT_RESPONSE_DELTA
+    }
+
+    def __init__(self, socketio: Optional[SocketIO] = None, use_queue: bool = None):
         """初始化WebSocket处理器
         
         Args:
             socketio: Flask-SocketIO实例
+            use_queue: 是否通过后台出站队列发送事件，为空时读取 WS_EVENT_QUEUE_ENABLED
         """
         self.socketio = socketio
+        if use_queue is None:
+            use_queue = Config.WS_EVENT_QUEUE_ENABLED
+        self.event_queue = OutboundEventQueue(
+            self._emit_now,
+            tick=Config.WS_EVENT_TICK,
+            max_size=Config.WS_EVENT_QUEUE_SIZE
+        ) if use_queue else None
         
     def set_socketio(self, socketio: SocketIO) -> None:
         """设置SocketIO实例
@@ -64,13 +90,15 @@ class WebSocketHandler:
                 message_data['timestamp'] = self.get_timestamp()
                 
             message_type = message_data.get("type")
-            logger.info(f"发送WebSocket消息：类型={message_type}")
+            logger.debug(f"发送WebSocket消息：类型={message_type}")
             
             # 根据消息类型标准化消息格式
             if message_type == WebSocketMessageType.USER_MESSAGE:
                 self._emit_user_message(message_data)
             elif message_type == "ai_message" or message_type == WebSocketMessageType.AGENT_RESPONSE:
                 self._emit_agent_response(message_data)
+            elif message_type == WebSocketMessageType.AGENT_RESPONSE_DELTA:
+                self._emit_agent_response_delta(message_data)
             elif message_type == WebSocketMessageType.ERROR:
                 self._emit_error(message_data)
             elif message_type == WebSocketMessageType.CONNECTION_UPDATE:
@@ -85,39 +113,91 @@ class WebSocketHandler:
                 self._emit_artifact_update(message_data)
             else:
                 # 默认直接发送整个消息
-                self.socketio.emit(message_type, message_data)
+                self._emit(message_type, message_data, room=message_data.get("sessionId"))
                 
-            logger.info(f"WebSocket消息发送成功：{message_type}")
             return True
             
         except Exception as e:
             logger.error(f"发送WebSocket消息失败: {str(e)}", exc_info=True)
             return False
     
+    def flush(self, timeout: float = None) -> bool:
+        """等待出站队列中的事件全部发送"""
+        return self.event_queue.flush(timeout) if self.event_queue else True
+        
+    def _emit(self, event: str, data: Dict[str, Any], room: str = None) -> None:
+        """发送事件，启用出站队列时只入队，不在调用线程上执行网络IO"""
+        if not self.event_queue:
+            self._emit_now(event, data, room)
+            return
+        self.event_queue.put(
+            event,
+            data,
+            room=room,
+            coalesce_key=self._coalesce_key(event, data),
+            low_priority=event in self.LOW_PRIORITY_EVENTS,
+            droppable=event in self.DROPPABLE_EVENTS
+        )
+        
+    def _emit_now(self, event: str, data: Dict[str, Any], room: str = None) -> None:
+        if room:
+            self.socketio.emit(event, data, to=room)
+        else:
+            self.socketio.emit(event, data)
+            
+    def _coalesce_key(self, event: str, data: Dict[str, Any]) -> Optional[str]:
+        """状态类事件按对象合并，后一条会取代队列中尚未发送的前一条"""
+        if event not in self.COALESCED_EVENTS:
+            return None
+        if event == WebSocketMessageType.AGENT_STATUS:
+            return f"{event}:{','.join(a.get('name', '') for a in data.get('agents', []))}"
+        if event == WebSocketMessageType.CONNECTION_UPDATE:
+            return f"{event}:{data.get('from')}->{data.get('to')}"
+        task = data.get('task', {})
+        task_id = task.get('id') or task.get('task_id')
+        return f"{event}:{task_id}" if task_id else None
+        
     def _emit_user_message(self, message_data: Dict[str, Any]) -> None:
         """发送用户消息"""
-        self.socketio.emit(WebSocketMessageType.USER_MESSAGE, {
+        self._emit(WebSocketMessageType.USER_MESSAGE, {
             'message': message_data.get("message", {}),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.USER_MESSAGE,
             'sessionId': message_data.get("sessionId")
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_agent_response(self, message_data: Dict[str, Any]) -> None:
         """发送代理响应"""
         message = message_data.get("message", {})
         agent_name = message.get("agent", "")
         
-        self.socketio.emit(WebSocketMessageType.AGENT_RESPONSE, {
+        self._emit(WebSocketMessageType.AGENT_RESPONSE, {
             'message': {
                 'content': message.get("content", ""),
                 'agent': agent_name
             },
             'agentName': agent_name,  # 确保agentName字段与agent一致
+            'messageId': message.get("id"),
+            # 流式输出时，完整消息作为该消息的最终事件
+            'final': True,
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.AGENT_RESPONSE,
             'sessionId': message_data.get("sessionId")
-        })
+        }, room=message_data.get("sessionId"))
+    
+    def _emit_agent_response_delta(self, message_data: Dict[str, Any]) -> None:
+        """发送代理响应的增量片段"""
+        agent_name = message_data.get("agentName", "")
+        
+        self._emit(WebSocketMessageType.AGENT_RESPONSE_DELTA, {
+            'messageId': message_data.get("messageId"),
+            'seq': message_data.get("seq", 0),
+            'delta': message_data.get("delta", ""),
+            'agentName': agent_name,
+            'timestamp': message_data.get("timestamp", self.get_timestamp()),
+            'type': WebSocketMessageType.AGENT_RESPONSE_DELTA,
+            'sessionId': message_data.get("sessionId")
+        }, room=message_data.get("sessionId"))
     
     def _emit_error(self, message_data: Dict[str, Any]) -> None:
         """发送错误消息"""
@@ -129,24 +209,26 @@ class WebSocketHandler:
             error_content = error_message.get("content", "未知错误")
             error_code = error_message.get("code", "UNKNOWN_ERROR")
             
-        self.socketio.emit(WebSocketMessageType.ERROR, {
+        self._emit(WebSocketMessageType.ERROR, {
             'error': {
                 'code': error_code,
                 'message': error_content
             },
+            # 流式输出中途失败时携带消息ID，客户端据此丢弃已收到的增量
+            'messageId': message_data.get("messageId"),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.ERROR
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_connection_update(self, message_data: Dict[str, Any]) -> None:
         """发送连接更新"""
-        self.socketio.emit(WebSocketMessageType.CONNECTION_UPDATE, {
+        self._emit(WebSocketMessageType.CONNECTION_UPDATE, {
             'from': message_data.get("from", ""),
             'to': message_data.get("to", ""),
             'status': message_data.get("status", ""),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.CONNECTION_UPDATE
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_agent_status(self, message_data: Dict[str, Any]) -> None:
         """发送Agent状态更新"""
@@ -159,40 +241,46 @@ class WebSocketHandler:
                 'role': message_data.get("role", "")
             }]
             
-        self.socketio.emit(WebSocketMessageType.AGENT_STATUS, {
+        self._emit(WebSocketMessageType.AGENT_STATUS, {
             'agents': agents_data,
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.AGENT_STATUS
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_conversation_update(self, message_data: Dict[str, Any]) -> None:
         """发送对话更新"""
-        self.socketio.emit(WebSocketMessageType.CONVERSATION_UPDATE, {
+        self._emit(WebSocketMessageType.CONVERSATION_UPDATE, {
             'session': message_data.get("session", {}),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.CONVERSATION_UPDATE
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_task_update(self, message_data: Dict[str, Any]) -> None:
         """发送任务更新"""
-        self.socketio.emit(WebSocketMessageType.TASK_UPDATE, {
+        self._emit(WebSocketMessageType.TASK_UPDATE, {
             'task': message_data.get("task", {}),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.TASK_UPDATE
-        })
+        }, room=message_data.get("sessionId"))
     
     def _emit_artifact_update(self, message_data: Dict[str, Any]) -> None:
         """发送制品更新"""
-        self.socketio.emit(WebSocketMessageType.ARTIFACT_UPDATE, {
+        self._emit(WebSocketMessageType.ARTIFACT_UPDATE, {
             'artifact': message_data.get("artifact", {}),
             'timestamp': message_data.get("timestamp", self.get_timestamp()),
             'type': WebSocketMessageType.ARTIFACT_UPDATE
-        })
+        }, room=message_data.get("sessionId"))
         
     # 兼容方法
-    def emit_agent_response(self, agent_name: str, message: str, response_type: str = "message") -> bool:
+    def emit_agent_response(
+        self,
+        agent_name: str,
+        message: str,
+        response_type: str = "message",
+        session_id: str = None
+    ) -> bool:
         """发送代理响应（兼容方法）"""
-        logger.info(f"使用兼容方法emit_agent_response: {agent_name}")
+        logger.debug(f"使用兼容方法emit_agent_response: {agent_name}")
         return self.send_message({
             "type": WebSocketMessageType.AGENT_RESPONSE,
             "message": {
@@ -200,12 +288,31 @@ class WebSocketHandler:
                 "agent": agent_name,
                 "content": message,
                 "timestamp": int(time.time() * 1000)
-            }
+            },
+            "sessionId": session_id
+        })
+        
+    def emit_agent_response_delta(
+        self,
+        agent_name: str,
+        message_id: str,
+        seq: int,
+        delta: str,
+        session_id: str = None
+    ) -> bool:
+        """发送代理响应增量（兼容方法）"""
+        return self.send_message({
+            "type": WebSocketMessageType.AGENT_RESPONSE_DELTA,
+            "agentName": agent_name,
+            "messageId": message_id,
+            "seq": seq,
+            "delta": delta,
+            "sessionId": session_id
         })
         
     def emit_connection_update(self, from_agent: str, to_agent: str, status: str) -> bool:
         """发送连接更新（兼容方法）"""
-        logger.info(f"使用兼容方法emit_connection_update: {from_agent} -> {to_agent}")
+        logger.debug(f"使用兼容方法emit_connection_update: {from_agent} -> {to_agent}")
         return self.send_message({
             "type": WebSocketMessageType.CONNECTION_UPDATE,
             "from": from_agent,
@@ -213,14 +320,21 @@ class WebSocketHandler:
             "status": status
         })
         
-    def emit_agent_status(self, agent_name: str, status: str, data: Dict[str, Any] = None) -> bool:
+    def emit_agent_status(
+        self,
+        agent_name: str,
+        status: str,
+        data: Dict[str, Any] = None,
+        session_id: str = None
+    ) -> bool:
         """发送Agent状态更新（兼容方法）"""
-        logger.info(f"使用兼容方法emit_agent_status: {agent_name}")
+        logger.debug(f"使用兼容方法emit_agent_status: {agent_name}")
         return self.send_message({
             "type": WebSocketMessageType.AGENT_STATUS,
             "agentName": agent_name,
             "status": status,
-            "data": data
+            "data": data,
+            "sessionId": session_id
         })
         
     def emit_conversation_update(self, message: Dict[str, Any]) -> bool:
@@ -230,18 +344,20 @@ class WebSocketHandler:
             "session": message
         })
         
-    def emit_task_update(self, task: Dict[str, Any]) -> bool:
+    def emit_task_update(self, task: Dict[str, Any], session_id: str = None) -> bool:
         """发送任务更新（兼容方法）"""
         return self.send_message({
             "type": WebSocketMessageType.TASK_UPDATE,
-            "task": task
+            "task": task,
+            "sessionId": session_id
         })
         
-    def emit_artifact_update(self, artifact: Dict[str, Any]) -> bool:
+    def emit_artifact_update(self, artifact: Dict[str, Any], session_id: str = None) -> bool:
         """发送制品更新（兼容方法）"""
         return self.send_message({
             "type": WebSocketMessageType.ARTIFACT_UPDATE,
-            "artifact": artifact
+            "artifact": artifact,
+            "sessionId": session_id
         })
         
     def get_timestamp(self) -> str:
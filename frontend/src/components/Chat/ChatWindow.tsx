@@ -9,6 +9,7 @@ import { Loading } from '../ui/Loading';
 import { ScrollButtons } from './ScrollButtons';
 import { LoadMoreButton } from './LoadMoreButton';
 import { useScrollControl } from '@/hooks/useScrollControl';
+import { useWebSocket } from '@/hooks/useWebSocket';
 import { groupMessagesByDate } from '@/lib/messageUtils';
 
 export const ChatWindow = React.memo(() => {
@@ -20,6 +21,8 @@ export const ChatWindow = React.memo(() => {
     hasMoreMessages,
     isConnected
   } = useChatContext();
+  // 正在流式输出的代理消息，收到完整消息后由消息列表中的正式消息替换
+  const { streamingMessages } = useWebSocket();
 
   // 本地状态
   const [isLoading, setIsLoading] = useState(false);
@@ -74,10 +77,10 @@ export const ChatWindow = React.memo(() => {
 
   // 自动滚动到底部
   useEffect(() => {
-    if (autoScroll && currentSession?.messages?.length) {
+    if (autoScroll && (currentSession?.messages?.length || streamingMessages.length)) {
       scrollToBottom();
     }
-  }, [currentSession?.messages, autoScroll, scrollToBottom]);
+  }, [currentSession?.messages, streamingMessages, autoScroll, scrollToBottom]);
 
   if (!currentSession) {
     return (
@@ -119,6 +122,21 @@ export const ChatWindow = React.memo(() => {
           </TimeGroup>
         ))}
 
+        {/* 正在流式输出的消息 */}
+        {streamingMessages.map((streaming) => (
+          <Message
+            key={streaming.messageId}
+            message={{
+              id: streaming.messageId,
+              role: 'assistant',
+              content: streaming.content,
+              timestamp: new Date(streaming.timestamp),
+              agentName: streaming.agentName,
+              status: 'sending'
+            }}
+          />
+        ))}
+
         {isLoading && (
           <div className="p-4 bg-gray-800 rounded-lg my-2 animate-pulse">
             <Loading type="dots" />
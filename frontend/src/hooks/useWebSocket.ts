@@ -1,22 +1,65 @@
-import { useState, useEffect, useCallback } from 'react';
-import { socketService, AgentResponse } from '@/lib/socket';
+import { useState, useEffect, useCallback, useMemo, useRef } from 'react';
+import { socketService, AgentResponse, AgentResponseDelta } from '@/lib/socket';
+
+/**
+ * 正在流式输出的代理消息，收到同 messageId 的完整消息后移除
+ */
+export interface StreamingMessage {
+  messageId: string;
+  agentName: string;
+  content: string;
+  timestamp: string;
+}
+
+interface StreamBuffer {
+  agentName: string;
+  timestamp: string;
+  parts: Map<number, string>;
+}
 
 interface UseWebSocketOptions {
   onMessage?: (data: AgentResponse) => void;
+  onDelta?: (data: AgentResponseDelta) => void;
   onError?: (error: Error) => void;
   onConnect?: () => void;
   onDisconnect?: () => void;
 }
 
+/**
+ * 按 seq 拼接增量，只拼接从 0 开始连续的部分，乱序到达的片段等前面的片段到齐后再显示
+ */
+function assembleStream(buffer: StreamBuffer): string {
+  let content = '';
+  for (let seq = 0; buffer.parts.has(seq); seq++) {
+    content += buffer.parts.get(seq);
+  }
+  return content;
+}
+
 /**
  * 自定义WebSocket连接管理Hook
  * 
- * 统一管理WebSocket连接和消息处理，提供连接状态和事件回调
+ * 统一管理WebSocket连接和消息处理，提供连接状态和事件回调；
+ * 增量消息按 messageId 拼接为 streamingMessages，收到完整消息或出错时移除
  */
 export function useWebSocket(options: UseWebSocketOptions = {}) {
   const [isConnected, setIsConnected] = useState(false);
   const [lastMessage, setLastMessage] = useState<AgentResponse | null>(null);
   const [error, setError] = useState<Error | null>(null);
+  const [streams, setStreams] = useState<Map<string, StreamBuffer>>(new Map());
+  // 已结束的消息，之后迟到的增量不再显示
+  const finishedRef = useRef<Set<string>>(new Set());
+
+  const dropStream = useCallback((messageId?: string) => {
+    if (!messageId) return;
+    finishedRef.current.add(messageId);
+    setStreams(prev => {
+      if (!prev.has(messageId)) return prev;
+      const next = new Map(prev);
+      next.delete(messageId);
+      return next;
+    });
+  }, []);
 
   // 初始化WebSocket连接
   useEffect(() => {
@@ -35,10 +78,35 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
     
     // 消息监听
     const unsubMessage = socketService.onMessage((data) => {
+      // 完整消息是流式输出的最终事件，替换已拼接的增量
+      dropStream(data.messageId);
       setLastMessage(data);
       options.onMessage?.(data);
     });
     
+    // 增量消息监听
+    const unsubDelta = socketService.onDelta((data) => {
+      if (finishedRef.current.has(data.messageId)) return;
+      setStreams(prev => {
+        const next = new Map(prev);
+        const buffer = next.get(data.messageId) || {
+          // 与完整消息一致，代理名称统一为小写
+          agentName: (data.agentName || 'system').toLowerCase(),
+          timestamp: data.timestamp,
+          parts: new Map<number, string>()
+        };
+        next.set(data.messageId, {
+          ...buffer,
+          parts: new Map(buffer.parts).set(data.seq, data.delta)
+        });
+        return next;
+      });
+      options.onDelta?.(data);
+    });
+    
+    // 流式输出中途失败时丢弃已收到的增量
+    const unsubStreamError = socketService.onStreamError(dropStream);
+    
     // 错误监听
     const unsubError = socketService.onError((err) => {
       setError(err);
@@ -55,9 +123,21 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
       unsubConnected();
       unsubDisconnected();
       unsubMessage();
+      unsubDelta();
+      unsubStreamError();
       unsubError();
     };
-  }, [options.onMessage, options.onError, options.onConnect, options.onDisconnect]);
+  }, [options.onMessage, options.onDelta, options.onError, options.onConnect, options.onDisconnect, dropStream]);
+
+  const streamingMessages = useMemo<StreamingMessage[]>(
+    () => Array.from(streams.entries()).map(([messageId, buffer]) => ({
+      messageId,
+      agentName: buffer.agentName,
+      content: assembleStream(buffer),
+      timestamp: buffer.timestamp
+    })),
+    [streams]
+  );
 
   // 重新连接方法
   const reconnect = useCallback(() => {
@@ -80,6 +160,7 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
   return {
     isConnected,
     lastMessage,
+    streamingMessages,
     error,
     reconnect,
     checkHealth
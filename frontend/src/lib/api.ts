@@ -31,7 +31,7 @@ export class ApiService {
     throw lastError || new Error('请求失败，达到最大重试次数');
   }
 
-  static async analyzeRequest(message: string): Promise<AnalyzeResponse> {
+  static async analyzeRequest(message: string, sessionId?: string): Promise<AnalyzeResponse> {
     try {
       const response = await this.retryRequest(
         () =>
@@ -42,6 +42,7 @@ export class ApiService {
             },
             body: JSON.stringify({ 
               input: message,
+              session_id: sessionId,
               timestamp: new Date().toISOString()
             }),
             credentials: 'include',
@@ -1,19 +1,34 @@
 import { Socket as ClientSocket } from 'socket.io-client';
 import io from 'socket.io-client';
 
-interface AgentResponse {
+export interface AgentResponse {
   agentName?: string;
   agent?: string;
   message: string | { content: string; type: string };
   type: string;
   timestamp: string;
+  messageId?: string;
+}
+
+export interface AgentResponseDelta {
+  messageId: string;
+  seq: number;
+  delta: string;
+  agentName: string;
+  timestamp: string;
 }
 
 class SocketService {
   private socket: ReturnType<typeof io> | null = null;
   private messageHandlers: ((data: AgentResponse) => void)[] = [];
+  private deltaHandlers: ((data: AgentResponseDelta) => void)[] = [];
+  private streamErrorHandlers: ((messageId: string) => void)[] = [];
   private errorHandlers: ((error: Error) => void)[] = [];
+  private connectedHandlers: (() => void)[] = [];
+  private disconnectedHandlers: (() => void)[] = [];
   private connectionStatus: boolean = false;
+  // 当前订阅的会话，重连后自动重新加入对应房间
+  private subscribedSessionId: string | null = null;
 
   constructor() {
     this.initSocket();
@@ -42,12 +57,17 @@ class SocketService {
     this.socket.on('connect', () => {
       console.log('已连接到WebSocket服务器');
       this.connectionStatus = true;
+      this.connectedHandlers.forEach(handler => handler());
       this.socket?.emit('client_ready');
+      if (this.subscribedSessionId) {
+        this.socket?.emit('subscribe', { sessionId: this.subscribedSessionId });
+      }
     });
 
     this.socket.on('disconnect', () => {
       console.log('与WebSocket服务器断开连接');
       this.connectionStatus = false;
+      this.disconnectedHandlers.forEach(handler => handler());
     });
 
     this.socket.on('reconnect_attempt', (attemptNumber: number) => {
@@ -64,11 +84,26 @@ class SocketService {
       this.errorHandlers.forEach(handler => handler(error));
     });
 
-    this.socket.on('error', (error: Error) => {
+    this.socket.on('error', (error: any) => {
       console.error('WebSocket错误:', error);
+      // 流式输出中途失败，丢弃该消息已收到的增量
+      if (error && typeof error.messageId === 'string') {
+        this.streamErrorHandlers.forEach(handler => handler(error.messageId));
+      }
       this.errorHandlers.forEach(handler => handler(error));
     });
 
+    this.socket.on('agent_response_delta', (data: AgentResponseDelta) => {
+      if (!data || !data.messageId) return;
+      this.deltaHandlers.forEach(handler => {
+        try {
+          handler(data);
+        } catch (handlerError) {
+          console.error('增量消息处理程序执行出错:', handlerError);
+        }
+      });
+    });
+
     this.socket.on('agent_response', (data: any) => {
       try {
         // 确保data存在
@@ -150,11 +185,31 @@ class SocketService {
     return this.connectionStatus;
   }
 
+  public connect() {
+    this.initSocket();
+  }
+
   public reconnect() {
     this.disconnect();
     this.initSocket();
   }
 
+  // 只接收指定会话的消息
+  public subscribe(sessionId: string) {
+    if (this.subscribedSessionId && this.subscribedSessionId !== sessionId) {
+      this.socket?.emit('unsubscribe', { sessionId: this.subscribedSessionId });
+    }
+    this.subscribedSessionId = sessionId;
+    this.socket?.emit('subscribe', { sessionId });
+  }
+
+  public unsubscribe() {
+    if (this.subscribedSessionId) {
+      this.socket?.emit('unsubscribe', { sessionId: this.subscribedSessionId });
+      this.subscribedSessionId = null;
+    }
+  }
+
   public onMessage(handler: (data: AgentResponse) => void) {
     this.messageHandlers.push(handler);
     return () => {
@@ -162,6 +217,34 @@ class SocketService {
     };
   }
 
+  public onDelta(handler: (data: AgentResponseDelta) => void) {
+    this.deltaHandlers.push(handler);
+    return () => {
+      this.deltaHandlers = this.deltaHandlers.filter(h => h !== handler);
+    };
+  }
+
+  public onStreamError(handler: (messageId: string) => void) {
+    this.streamErrorHandlers.push(handler);
+    return () => {
+      this.streamErrorHandlers = this.streamErrorHandlers.filter(h => h !== handler);
+    };
+  }
+
+  public onConnected(handler: () => void) {
+    this.connectedHandlers.push(handler);
+    return () => {
+      this.connectedHandlers = this.connectedHandlers.filter(h => h !== handler);
+    };
+  }
+
+  public onDisconnected(handler: () => void) {
+    this.disconnectedHandlers.push(handler);
+    return () => {
+      this.disconnectedHandlers = this.disconnectedHandlers.filter(h => h !== handler);
+    };
+  }
+
   public onError(handler: (error: Error) => void) {
     this.errorHandlers.push(handler);
     return () => {
@@ -4,6 +4,7 @@
 export enum WebSocketMessageType {
   USER_MESSAGE = 'user_message',
   AGENT_RESPONSE = 'agent_response',
+  AGENT_RESPONSE_DELTA = 'agent_response_delta',
   CONNECTION_UPDATE = 'connection_update',
   AGENT_STATUS = 'agent_status',
   CONVERSATION_UPDATE = 'conversation_update',
@@ -30,6 +31,20 @@ export interface AgentResponse extends WebSocketMessage {
     agent: string;
   };
   agentName?: string;
+  messageId?: string;
+  final?: boolean;
+  sessionId?: string;
+}
+
+/**
+ * 代理响应增量消息，按seq顺序拼接，收到同messageId的AgentResponse后结束
+ */
+export interface AgentResponseDelta extends WebSocketMessage {
+  type: WebSocketMessageType.AGENT_RESPONSE_DELTA;
+  messageId: string;
+  seq: number;
+  delta: string;
+  agentName: string;
   sessionId?: string;
 }
 
@@ -119,6 +134,7 @@ export interface ErrorMessage extends WebSocketMessage {
  */
 export type AnyWebSocketMessage =
   | AgentResponse
+  | AgentResponseDelta
   | UserMessage
   | ConnectionUpdate
   | AgentStatus